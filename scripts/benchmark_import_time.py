@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+import re
+import statistics
+import subprocess
+import sys
+import time
+
+import click
+
+
+def import_time(module: str) -> float:
+    """Wall time of a fresh interpreter importing module, in seconds."""
+    t_start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", f"import {module}"], check=True)
+    return time.perf_counter() - t_start
+
+
+def slowest_imports(module: str, count: int) -> list[tuple[int, str]]:
+    """Modules with the largest cumulative import time in microseconds."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    entries = []
+    for line in result.stderr.splitlines():
+        m = re.match(r"import time:\s+\d+ \|\s+(\d+) \|(\s*)(\S+)", line)
+        if m:
+            entries.append((int(m.group(1)), m.group(2), m.group(3)))
+
+    # only report top-level dependencies of module
+    depth = min(len(indent) for _, indent, name in entries if name == module)
+    top = [(t, name) for t, indent, name in entries if len(indent) <= depth + 2]
+    return sorted(top, reverse=True)[:count]
+
+
+@click.command()
+@click.argument("modules", nargs=-1)
+@click.option("-n", "--repeat", default=5, help="number of interpreter starts")
+@click.option("--top", default=10, help="number of slowest dependencies to list")
+def main(modules, repeat, top):
+    """Measure the time it takes to import MODULES (default: cedalion)."""
+    baseline = statistics.median(import_time("sys") for _ in range(repeat))
+    print(f"interpreter startup: {baseline:.3f} s")
+
+    for module in modules or ["cedalion"]:
+        times = [import_time(module) - baseline for _ in range(repeat)]
+        print(
+            f"import {module}: median {statistics.median(times):.3f} s, "
+            f"min {min(times):.3f} s"
+        )
+        for cumulative, name in slowest_imports(module, top):
+            print(f"    {cumulative / 1e6:8.3f} s  {name}")
+
+
+if __name__ == "__main__":
+    main()
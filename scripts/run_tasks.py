@@ -1,9 +1,18 @@
 #!/usr/bin/env python
+import contextlib
+import glob
+import hashlib
+import importlib.metadata
 import inspect
+import os
+import time
 import typing
+from pathlib import Path
 
 import click
+import pandas as pd
 import yaml
+from pqdm.processes import pqdm
 
 import cedalion
 import cedalion.io
@@ -25,87 +34,302 @@ def is_list_of_quantities(origin, args):
     return (origin is list) and (len(args) == 1) and is_quantity(args[0])
 
 
+def parse_task(task_spec):
+    """Look up a task in the registry and parse its parameters from the config."""
+
+    if isinstance(task_spec, str):
+        if (task := cedalion.tasks.task_registry.get(task_spec, None)) is None:
+            raise ValueError(f"unknown task {task_spec}")
+
+        return task_spec, task, {}
+
+    if not isinstance(task_spec, dict):
+        raise ValueError("unexpected task spec.")
+
+    assert len(task_spec) == 1
+    task_name = next(iter(task_spec.keys()))
+    params = next(iter(task_spec.values()))
+
+    if (task := cedalion.tasks.task_registry.get(task_name, None)) is None:
+        raise ValueError(f"unknown task {task_name}")
+
+    task_signature = inspect.signature(task)
+    task_params = task_signature.parameters.keys()
+
+    param_type_hints = typing.get_type_hints(task, include_extras=True)
+
+    parsed_params = {}
+
+    for param in params:
+        assert len(param) == 1
+        param_name = next(iter(param.keys()))
+        param_value = next(iter(param.values()))
+
+        if param_name not in task_params:
+            raise ValueError(f"unknown param '{param}' for task {task_name}.")
+
+        if param_name not in param_type_hints:
+            parsed_params[param_name] = param_value
+            continue
+
+        param_hint = param_type_hints[param_name]
+        hint_origin = typing.get_origin(param_hint)
+        hint_args = typing.get_args(param_hint)
+
+        if is_quantity(param_hint):
+            # e.g. typing.Annotated[pint.Quantity, '[length]']
+            dimension = hint_args[1]
+            q = cedalion.Quantity(param_value)
+            q.check(dimension)
+
+        elif is_list_of_quantities(hint_origin, hint_args):
+            # e.g. list[typing.Annotated[pint.Quantity, '[concentration]']]
+            dimension = typing.get_args(hint_args[0])[1]
+            q = [cedalion.Quantity(v) for v in param_value]
+            for v in q:
+                v.check(dimension)
+
+        elif is_dict_of_quantities(hint_origin, hint_args):
+            # e.g. dict[float, typing.Annotated[pint.Quantity, '[time]']]
+            dimension = typing.get_args(hint_args[1])[1]
+            q = {k: cedalion.Quantity(v) for k, v in param_value.items()}
+            for v in q.values():
+                v.check(dimension)
+        else:
+            q = param_value
+
+        parsed_params[param_name] = q
+
+    return task_name, task, parsed_params
+
+
+def run_tasks(rec, tasks):
+    """Run parsed tasks on a recording and return the wall time of each task."""
+    timings = []
+    for task_name, task, params in tasks:
+        t_start = time.perf_counter()
+        task(rec, **params)
+        timings.append((task_name, time.perf_counter() - t_start))
+    return timings
+
+
+def config_input_hash(config, src):
+    """Hash of the task config, the cedalion version and the content of src."""
+    h = hashlib.sha1()
+    h.update(yaml.safe_dump(config, sort_keys=True).encode())
+    try:
+        h.update(importlib.metadata.version("cedalion").encode())
+    except importlib.metadata.PackageNotFoundError:
+        pass
+    with open(src, "rb") as fin:
+        for chunk in iter(lambda: fin.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def hash_file(dst):
+    return Path(str(dst) + ".hash")
+
+
+def is_up_to_date(dst, input_hash):
+    fname = hash_file(dst)
+    return Path(dst).exists() and fname.exists() and fname.read_text() == input_hash
+
+
+@contextlib.contextmanager
+def limit_memory(max_memory_mb):
+    """Limit the address space of the current process inside the context.
+
+    Only the soft limit is lowered, so that the previous limit is restored on exit and
+    the driver process is not affected when files are processed without a pool.
+    """
+    if max_memory_mb is None:
+        yield
+        return
+    import resource
+
+    soft, hard = resource.getrlimit(resource.RLIMIT_AS)
+    limit = int(max_memory_mb) * 1024**2
+    if hard != resource.RLIM_INFINITY:
+        limit = min(limit, hard)
+    resource.setrlimit(resource.RLIMIT_AS, (limit, hard))
+    try:
+        yield
+    finally:
+        resource.setrlimit(resource.RLIMIT_AS, (soft, hard))
+
+
+def process_file(config, src, dst, force=False, max_memory_mb=None):
+    """Run the configured tasks on all recordings in src and write them to dst.
+
+    Returns:
+        a list of report rows
+    """
+    input_hash = config_input_hash(config, src)
+    if not force and is_up_to_date(dst, input_hash):
+        return [{"src": str(src), "dst": str(dst), "status": "skipped"}]
+
+    with limit_memory(max_memory_mb):
+        return _process_file(config, src, dst, input_hash)
+
+
+def _process_file(config, src, dst, input_hash):
+    tasks = [parse_task(task_spec) for task_spec in config["tasks"]]
+
+    t_start = time.perf_counter()
+    recordings = cedalion.io.read_snirf(src)
+    rows = [
+        {
+            "src": str(src),
+            "dst": str(dst),
+            "status": "read",
+            "wall_time": time.perf_counter() - t_start,
+        }
+    ]
+
+    for i_rec, rec in enumerate(recordings):
+        for task_name, wall_time in run_tasks(rec, tasks):
+            rows.append(
+                {
+                    "src": str(src),
+                    "dst": str(dst),
+                    "recording": i_rec,
+                    "task": task_name,
+                    "status": "done",
+                    "wall_time": wall_time,
+                }
+            )
+
+    Path(dst).parent.mkdir(parents=True, exist_ok=True)
+    t_start = time.perf_counter()
+    cedalion.io.write_snirf(dst, recordings)
+    hash_file(dst).write_text(input_hash)
+    rows.append(
+        {
+            "src": str(src),
+            "dst": str(dst),
+            "status": "written",
+            "wall_time": time.perf_counter() - t_start,
+        }
+    )
+
+    return rows
+
+
+def _glob_root(pattern):
+    """Leading directories of a glob pattern that contain no wildcards."""
+    parts = Path(pattern).parts
+    for i, part in enumerate(parts):
+        if glob.has_magic(part):
+            return Path(*parts[:i])
+    return Path(pattern).parent
+
+
+def collect_inputs(sources, dst):
+    """Map input files to output files.
+
+    Each source may be a snirf file, a glob pattern or a directory, e.g. the root of a
+    BIDS dataset, which is searched recursively for snirf files. A single input file
+    is written to dst. Otherwise dst is a directory and the outputs mirror the paths
+    of the inputs relative to their source directory or to the leading directories of
+    their glob pattern.
+    """
+    pairs = []
+    for source in sources:
+        if os.path.isdir(source):
+            root = Path(source)
+            files = sorted(root.rglob("*.snirf"))
+            pairs.extend((f, root, True) for f in files)
+        else:
+            root = _glob_root(source)
+            files = sorted(Path(f) for f in glob.glob(source, recursive=True))
+            if not files:
+                raise ValueError(f"no input files match '{source}'.")
+            pairs.extend((f, root, False) for f in files)
+
+    if len(pairs) == 1 and not pairs[0][2] and not os.path.isdir(dst):
+        return [(pairs[0][0], Path(dst))]
+
+    result = [(f, Path(dst) / f.relative_to(root)) for f, root, _ in pairs]
+
+    outputs = {}
+    for f, out in result:
+        if out in outputs:
+            raise ValueError(
+                f"inputs '{outputs[out]}' and '{f}' would both be written to '{out}'."
+            )
+        outputs[out] = f
+
+    return result
+
+
 @click.command()
 @click.argument("config", type=click.File("r"), required=True)
-@click.argument("src", type=click.Path(exists=True), required=True)
+@click.argument("src", nargs=-1, required=True)
 @click.argument("dst", required=True)
-def main(config, src, dst):
+@click.option("-j", "--jobs", default=1, help="number of worker processes")
+@click.option(
+    "--max-memory", type=int, default=None, help="memory limit per worker in MB"
+)
+@click.option("--force", is_flag=True, help="reprocess up-to-date outputs")
+@click.option(
+    "--report", type=click.Path(), default=None, help="csv file for the timing report"
+)
+def main(config, src, dst, jobs, max_memory, force, report):
+    """Run the tasks in CONFIG on the snirf files SRC and write them to DST.
+
+    SRC can be files, glob patterns or directories such as a BIDS dataset root.
+    """
     config = yaml.safe_load(config)
 
+    # fail early on invalid configs
+    for task_spec in config["tasks"]:
+        parse_task(task_spec)
+
+    pairs = collect_inputs(src, dst)
+    args = [(config, s, d, force, max_memory) for s, d in pairs]
 
-    rec = cedalion.io.read_snirf(src)[0]
-
-    for task in config["tasks"]:
-        if isinstance(task, str):
-            print(f"task '{task}' without parameters")
-            
-            if (task := cedalion.tasks.task_registry.get(task, None)) is None:
-                raise ValueError(f"unknown task {task}")
-            
-            task(rec)
-        elif isinstance(task, dict):
-            assert len(task) == 1
-            task_name = next(iter(task.keys()))
-            params = next(iter(task.values()))
-            print(f"task '{task_name}' with parameters '{params}'")
-
-            if (task := cedalion.tasks.task_registry.get(task_name, None)) is None:
-                raise ValueError(f"unknown task {task_name}")
-
-            task_signature = inspect.signature(task)
-            task_params = task_signature.parameters.keys()
-
-            param_type_hints = typing.get_type_hints(task, include_extras=True)
-
-            parsed_params = {}
-
-            for param in params:
-                assert len(param) == 1
-                param_name = next(iter(param.keys()))
-                param_value = next(iter(param.values()))
-
-                if param_name not in task_params:
-                    raise ValueError(f"unknown param '{param}' for task {task_name}.")
-
-                if param_name not in param_type_hints:
-                    parsed_params[param_name] = param_value
-                    continue
-
-                param_hint = param_type_hints[param_name]
-                hint_origin = typing.get_origin(param_hint)
-                hint_args = typing.get_args(param_hint)
-
-                if is_quantity(param_hint):
-                    # e.g. typing.Annotated[pint.Quantity, '[length]']
-                    dimension = hint_args[1]
-                    q = cedalion.Quantity(param_value)
-                    q.check(dimension)
-
-                elif is_list_of_quantities(hint_origin, hint_args):
-                    # e.g. list[typing.Annotated[pint.Quantity, '[concentration]']]
-                    dimension = typing.get_args(hint_args[0])[1]
-                    q = [cedalion.Quantity(v) for v in param_value]
-                    for v in q:
-                        v.check(dimension)
-
-                elif is_dict_of_quantities(hint_origin, hint_args):
-                    # e.g. dict[float, typing.Annotated[pint.Quantity, '[time]']]
-                    dimension = typing.get_args(hint_args[1])[1]
-                    q = {k: cedalion.Quantity(v) for k, v in param_value.items()}
-                    for v in q.values():
-                        v.check(dimension)
-                else:
-                    q = param_value
-
-                parsed_params[param_name] = q
-
-                # if isinstance(v, typing._AnnotatedAlias):
-            
-            task(rec, **parsed_params)
+    if jobs == 1:
+        results = []
+        for a in args:
+            try:
+                results.append(process_file(*a))
+            except Exception as e:
+                results.append(e)
+    else:
+        results = pqdm(
+            args,
+            process_file,
+            n_jobs=jobs,
+            argument_type="args",
+            exception_behaviour="ignore",
+            disable=True,
+        )
+
+    rows = []
+    for (s, d), result in zip(pairs, results):
+        if isinstance(result, Exception):
+            print(f"failed to process '{s}': {result!r}")
+            rows.append(
+                {
+                    "src": str(s),
+                    "dst": str(d),
+                    "status": "failed",
+                    "error": repr(result),
+                }
+            )
         else:
-            raise ValueError("unexpected task spec.")
+            rows.extend(result)
+
+    report_df = pd.DataFrame(rows)
+    status = report_df.groupby("src")["status"].last().value_counts()
+    print(f"processed {len(pairs)} files: {status.to_dict()}")
+
+    if "task" in report_df:
+        print(report_df.groupby("task")["wall_time"].agg(["count", "mean", "sum"]))
 
-    cedalion.io.write_snirf(dst, rec)
+    if report is not None:
+        report_df.to_csv(report, index=False)
 
 
 if __name__ == "__main__":
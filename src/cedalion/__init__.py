@@ -1,7 +1,21 @@
+import importlib
+
 from .physunits import Quantity, units
 
 import cedalion.dataclasses
 import cedalion.dataclasses.accessors
-import cedalion.io
-import cedalion.nirs
 import cedalion.tasks
+
+# Submodules with heavy dependencies are imported on first access (PEP 562), e.g.
+# cedalion.io pulls in h5py, nibabel and trimesh.
+_LAZY_SUBMODULES = {"io", "nirs"}
+
+
+def __getattr__(name):
+    if name in _LAZY_SUBMODULES:
+        return importlib.import_module(f"{__name__}.{name}")
+    raise AttributeError(f"module '{__name__}' has no attribute '{name}'")
+
+
+def __dir__():
+    return sorted(set(globals()) | _LAZY_SUBMODULES)
@@ -16,5 +16,7 @@ from .schemas import (
     build_timeseries,
     validate_schemas,
     build_stim_dataframe,
+    set_validation_enabled,
+    validation_disabled,
 )
 from .recording import Recording
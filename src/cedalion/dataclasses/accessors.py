@@ -8,7 +8,6 @@ from numpy.typing import ArrayLike
 import cedalion.dataclasses as cdc
 import cedalion.typing as cdt
 from cedalion import Quantity, units
-from cedalion.sigproc.frequency import freq_filter
 
 
 @xr.register_dataarray_accessor("cd")
@@ -105,6 +104,9 @@ class CedalionAccessor:
         Returns:
             result (xarray.DataArray): The filtered time series.
         """
+        # imported here because scipy.signal is slow to import
+        from cedalion.sigproc.frequency import freq_filter
+
         array = self._obj
 
         # FIXME accept unit-less parameters and interpret them as Hz
@@ -1,23 +1,26 @@
+from __future__ import annotations
+
 from abc import ABC, abstractmethod
 from dataclasses import dataclass
 from enum import Enum
 from functools import total_ordering
-from typing import Any
+from typing import TYPE_CHECKING, Any
 
 import numpy as np
 import pint
-import trimesh
-import vtk
-import mne
 import xarray as xr
 from scipy.spatial import KDTree
 from scipy import sparse
-from vtk.util.numpy_support import vtk_to_numpy
-import pyvista as pv
 
 import cedalion
 import cedalion.typing as cdt
-from cedalion.vtktutils import trimesh_to_vtk_polydata, pyvista_polydata_to_trimesh
+from cedalion.geometry.geodesics import GeodesicEngine
+
+# trimesh, vtk, pyvista and mne take long to import. They are imported in the methods
+# that need them, so that importing cedalion stays fast.
+if TYPE_CHECKING:
+    import trimesh
+    import vtk
 
 
 @total_ordering
@@ -215,6 +218,9 @@ class TrimeshSurface(Surface):
             The surface with a decimated mesh
         """
 
+        import mne
+        import trimesh
+
         vertices, faces = mne.decimate_surface(
             self.mesh.vertices, self.mesh.faces, face_count, method="quadric"
         )
@@ -225,6 +231,8 @@ class TrimeshSurface(Surface):
     def smooth(self, lamb: float) -> "TrimeshSurface":
         """Apply a Taubin filter to smooth this surface."""
 
+        import trimesh
+
         smoothed = trimesh.smoothing.filter_taubin(self.mesh, lamb=lamb)
         return TrimeshSurface(smoothed, self.crs, self.units)
 
@@ -244,6 +252,8 @@ class TrimeshSurface(Surface):
         )
 
     def fix_vertex_normals(self):
+        import trimesh
+
         mesh = self.mesh
         # again make sure, that normals face outside
         cog2vert = mesh.vertices - np.mean(mesh.vertices, axis=0)
@@ -258,6 +268,10 @@ class TrimeshSurface(Surface):
 
     @classmethod
     def from_vtksurface(cls, vtk_surface: "VTKSurface"):
+        import pyvista as pv
+
+        from cedalion.vtktutils import pyvista_polydata_to_trimesh
+
         vtk_polydata = vtk_surface.mesh
         pyvista_polydata = pv.wrap(vtk_polydata)
         mesh = pyvista_polydata_to_trimesh(pyvista_polydata)
@@ -271,6 +285,8 @@ class VTKSurface(Surface):
 
     @property
     def vertices(self) -> cdt.LabeledPointCloud:
+        from vtk.util.numpy_support import vtk_to_numpy
+
         vertices = vtk_to_numpy(self.mesh.GetPoints().GetData())
         result = xr.DataArray(
             vertices,
@@ -298,6 +314,8 @@ class VTKSurface(Surface):
 
     @classmethod
     def from_trimeshsurface(cls, tri_mesh: TrimeshSurface):
+        from cedalion.vtktutils import trimesh_to_vtk_polydata
+
         mesh = tri_mesh.mesh
         vtk_mesh = trimesh_to_vtk_polydata(mesh)
 
@@ -315,6 +333,8 @@ class VTKSurface(Surface):
             The surface with a decimated mesh
         """
 
+        import pyvista as pv
+
         pyvista_polydata = pv.wrap(self.mesh)
         decimated = pyvista_polydata.decimate_pro(reduction, **kwargs)
 
@@ -344,8 +364,6 @@ class PycortexSurface(Surface):
     def __init__(self, mesh: SimpleMesh, crs: str, units: pint.Unit):
         super().__init__(mesh, crs, units)
         self._cache = dict()
-        self._rlfac_solvers = dict()
-        self._nLC_solvers = dict()
 
     @property
     def vertices(self) -> cdt.LabeledPointCloud:
@@ -624,7 +642,7 @@ class PycortexSurface(Surface):
         return fe12, fe23, fe31
 
 
-    def geodesic_distance(self, verts, m=1.0, fem=False):
+    def geodesic_distance(self, verts, m=1.0, fem=False, cache_dir=None):
         """Calcualte the inimum mesh geodesic distance (in mm).
 
         The geodesic distance is calculated from each vertex in surface to any vertex in
@@ -637,9 +655,11 @@ class PycortexSurface(Surface):
         computation. Smaller values of `m` will roughen and will usually increase error
         in the distance computation. The default value of 1.0 is probably pretty good.
 
-        This function caches some data (sparse LU factorizations of the laplace-beltrami
-        operator and the weighted adjacency matrix), so it will be much faster on
-        subsequent runs.
+        The sparse LU factorizations of the laplace-beltrami operator and the weighted
+        adjacency matrix are cached per mesh by
+        :class:`cedalion.geometry.geodesics.GeodesicEngine`, so subsequent runs are much
+        faster, also for other PycortexSurface instances of the same mesh. To compute
+        distances from many vertex sets at once, use the engine directly.
 
         The time taken by this function is independent of the number of vertices in
         verts.
@@ -655,76 +675,17 @@ class PycortexSurface(Surface):
             fem : bool, optional
                 Whether to use Finite Element Method lumped mass matrix. Wasn't used in
                 Crane 2012 paper. Doesn't seem to help any.
+            cache_dir : str, optional
+                If given, the assembled systems are also stored in this directory and
+                reused across processes, which only factorize them again.
 
         Returns:
             1D ndarray, shape (total_verts,)
             Geodesic distance (in mm) from each vertex in the surface to the closest
             vertex in `verts`.
         """
-        npt = len(self.mesh.pts)
-        if m not in self._rlfac_solvers or m not in self._nLC_solvers:
-            B, D, W, V = self.laplace_operator
-            nLC = W - V  # negative laplace matrix
-            if not fem:
-                # lumped mass matrix
-                spD = sparse.dia_matrix((D, [0]), (npt, npt)).tocsr()
-            else:
-                spD = B
-
-            t = m * self.avg_edge_length**2  # time of heat evolution
-            lfac = spD - t * nLC  # backward Euler matrix
-
-            # Exclude rows with zero weight (these break the sparse LU)
-            goodrows = np.nonzero(~np.array(lfac.sum(0) == 0).ravel())[0]
-            self._goodrows = goodrows
-            self._rlfac_solvers[m] = sparse.linalg.factorized(
-                lfac[goodrows][:, goodrows]
-            )
-            self._nLC_solvers[m] = sparse.linalg.factorized(
-                nLC[goodrows][:, goodrows]
-            )
-
-        # I. "Integrate the heat flow ̇u = ∆u for some fixed time t"
-        # ---------------------------------------------------------
-
-        # Solve system to get u, the heat values
-        u0 = np.zeros((npt,))  # initial heat values
-        u0[verts] = 1.0
-        goodu = self._rlfac_solvers[m](u0[self._goodrows])
-        u = np.zeros((npt,))
-        u[self._goodrows] = goodu
-
-        # II. "Evaluate the vector field X = − ∇u / |∇u|"
-        # -----------------------------------------------
-
-        # Compute grad u at each face
-        gradu = self.surface_gradient(u, at_verts=False)
-
-        # Compute X (normalized grad u)
-        gusum = np.sum(gradu ** 2, axis=1)
-        X = np.nan_to_num((-gradu.T / np.sqrt(gusum)).T)
-
-        # III. "Solve the Poisson equation ∆φ = ∇·X"
-        # ------------------------------------------
-
-        # Compute integrated divergence of X at each vertex
-        c32, c13, c21 = self._cot_edge
-        x1 = 0.5 * (c32 * X).sum(1)
-        x2 = 0.5 * (c13 * X).sum(1)
-        x3 = 0.5 * (c21 * X).sum(1)
-
-        conn1, conn2, conn3 = self._polyconn
-        divx = conn1.dot(x1) + conn2.dot(x2) + conn3.dot(x3)
-
-        # Compute phi (distance)
-        goodphi = self._nLC_solvers[m](divx[self._goodrows])
-        phi = np.zeros((npt,))
-        phi[self._goodrows] = goodphi - goodphi.min()
-
-        # Ensure that distance is zero for selected verts
-        phi[verts] = 0.0
-
-        return phi
+        engine = GeodesicEngine.for_surface(self, m=m, fem=fem, cache_dir=cache_dir)
+        return engine.distances([verts])[0]
 
 
     def geodesic_path(self, a, b, max_len=1000, d=None, **kwargs):
@@ -747,8 +708,9 @@ class PycortexSurface(Surface):
                 array of geodesic distances, will be computed if not provided
 
             max_len : int, optional, default=1000
-                Maximum path length before the function quits. Sometimes it can get
-                stuck in loops, causing infinite paths.
+                Maximum path length before the function quits. If the distances have a
+                local minimum the path would loop. In that case the path ends where it
+                enters the loop.
             m : float, optional
                 Reverse Euler step length. The optimal value is likely between 0.5 and
                 1.5. Default is 1.0, which should be fine for most cases.
@@ -762,15 +724,43 @@ class PycortexSurface(Surface):
             path : list
                 List of the vertices in the path from a to b
         """
-        path = [a]
+        engine = GeodesicEngine.for_surface(self, **kwargs)
         if d is None:
-            d = self.geodesic_distance([b], **kwargs)
-        while path[-1] != b:
-            n = np.array([v for v in self.graph.neighbors(path[-1])])
-            path.append(n[d[n].argmin()])
-            if len(path) > max_len:
-                return path
-        return path
+            d = engine.distances([[b]])[0]
+        paths, _ = engine.trace_paths(np.asarray(d), [a], b, max_len=max_len)
+        return paths[0].tolist()
+
+    def geodesic_paths(
+        self, pairs, method="heat", fallback=True, max_len=1000, **kwargs
+    ) -> list[np.ndarray]:
+        """Finds the shortest paths between many pairs of vertices.
+
+        Pairs with the same end vertex share one distance field and all paths are
+        traced together. See
+        :meth:`cedalion.geometry.geodesics.GeodesicEngine.geodesic_paths`.
+
+        Args:
+            pairs : list of (int, int)
+                Start and end vertex of each path.
+            method : str, optional
+                "heat" descends heat method distances. "dijkstra" returns exact
+                shortest paths along the mesh edges.
+            fallback : bool, optional
+                If True, paths that do not reach their end vertex on the heat method
+                distances are recomputed with "dijkstra".
+            max_len : int, optional, default=1000
+                Maximum length of a heat method path.
+            kwargs: other arugments (m, fem, cache_dir) are passed to
+                self.geodesic_distance
+
+        Returns:
+            paths : list
+                For each pair an array of the vertices in the path.
+        """
+        engine = GeodesicEngine.for_surface(self, **kwargs)
+        return engine.geodesic_paths(
+            pairs, method=method, fallback=fallback, max_len=max_len
+        )
 
     @property
     def _cot_edge(self):
@@ -807,6 +797,8 @@ class PycortexSurface(Surface):
 
     @classmethod
     def from_vtksurface(cls, vtk_surface: VTKSurface):
+        from vtk.util.numpy_support import vtk_to_numpy
+
         pts = vtk_to_numpy(vtk_surface.mesh.GetPoints().GetData())
         polys = vtk_to_numpy(vtk_surface.mesh.GetPolys().GetData()).reshape(-1, 4)[
             :, 1:
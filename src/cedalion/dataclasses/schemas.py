@@ -1,5 +1,7 @@
+import contextlib
 import functools
 import inspect
+import os
 import typing
 from dataclasses import dataclass
 from typing import List, Optional
@@ -22,7 +24,36 @@ class DataArraySchema:
     dims: tuple[str]
     coords: tuple[tuple[str, tuple[str]]]
 
+    @functools.cached_property
+    def _required_dims(self) -> frozenset[str]:
+        return frozenset(self.dims)
+
+    @functools.cached_property
+    def _required_coords(self) -> tuple[tuple[str, str], ...]:
+        return tuple(
+            (name, dim) for dim, coordinate_names in self.coords
+            for name in coordinate_names
+        )
+
+    def is_valid(self, data_array) -> bool:
+        """Check the data array without building error messages."""
+        if not isinstance(data_array, xr.DataArray):
+            return False
+        if not self._required_dims.issubset(data_array.dims):
+            return False
+
+        # Variables avoid the construction of a DataArray for each coordinate
+        variables = data_array.coords.variables
+        for name, dim in self._required_coords:
+            coords = variables.get(name)
+            if coords is None or coords.dims[:1] != (dim,):
+                return False
+        return True
+
     def validate(self, data_array: xr.DataArray):
+        if self.is_valid(data_array):
+            return
+
         if not isinstance(data_array, xr.DataArray):
             raise ValidationError("object is not a xr.DataArray")
 
@@ -46,24 +77,100 @@ class DataArraySchema:
                     )
 
 
+# Validation can be switched off globally, e.g. in batch runs of tested pipelines,
+# with set_validation_enabled, temporarily with the validation_disabled context or
+# by setting the environment variable CEDALION_DISABLE_VALIDATION=1.
+_validation_enabled = os.environ.get("CEDALION_DISABLE_VALIDATION", "0") in ("", "0")
+
+
+def set_validation_enabled(enabled: bool):
+    """Enable or disable the checks of all functions decorated with validate_schemas."""
+    global _validation_enabled
+    _validation_enabled = bool(enabled)
+
+
+def is_validation_enabled() -> bool:
+    return _validation_enabled
+
+
+@contextlib.contextmanager
+def validation_disabled():
+    """Disable schema validation inside the context."""
+    global _validation_enabled
+    previous = _validation_enabled
+    _validation_enabled = False
+    try:
+        yield
+    finally:
+        _validation_enabled = previous
+
+
+def _schema_checks(func, signature):
+    """List the annotated parameters of func that are validated.
+
+    Returns:
+        a list of tuples (name, position, default, schemas). The position is None for
+        keyword-only parameters, default is inspect.Parameter.empty if there is none.
+    """
+    hints = typing.get_type_hints(func, include_extras=True)
+
+    checks = []
+    for position, (arg_name, param) in enumerate(signature.parameters.items()):
+        hint = hints.get(arg_name)
+        if not isinstance(hint, typing._AnnotatedAlias):
+            continue
+
+        schemas = tuple(
+            md for md in hint.__metadata__ if isinstance(md, DataArraySchema)
+        )
+        if not schemas:
+            continue
+
+        if param.kind == param.KEYWORD_ONLY:
+            position = None
+        elif param.kind != param.POSITIONAL_OR_KEYWORD:
+            raise TypeError(
+                f"cannot validate {param.kind.description} parameter '{arg_name}'."
+            )
+
+        checks.append((arg_name, position, param.default, schemas))
+
+    return checks
+
+
 # FIXME better location?
 def validate_schemas(func):
-    @functools.wraps(func)
-    def wrapper(*args, **kwargs):
-        ba = inspect.signature(func).bind(*args, **kwargs)
-        ba.apply_defaults()
-
-        hints = typing.get_type_hints(func, include_extras=True)
-        for arg_name, hint in hints.items():
-            if not isinstance(hint, typing._AnnotatedAlias):
-                continue
+    """Validate the DataArraySchemas annotated to the parameters of func.
 
-            if arg_name == "return":
-                continue
+    The signature and the list of schemas are resolved once on the first call.
+    """
+    signature = inspect.signature(func)
+    checks = None
 
-            for md in hint.__metadata__:
-                if isinstance(md, DataArraySchema):
-                    md.validate(ba.arguments[arg_name])
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        nonlocal checks
+
+        if not _validation_enabled:
+            return func(*args, **kwargs)
+
+        if checks is None:
+            # type hints are resolved lazily so that forward references work
+            checks = _schema_checks(func, signature)
+
+        for arg_name, position, default, schemas in checks:
+            if position is not None and position < len(args):
+                value = args[position]
+            elif arg_name in kwargs:
+                value = kwargs[arg_name]
+            elif default is not inspect.Parameter.empty:
+                value = default
+            else:
+                # let the function raise the TypeError for the missing argument
+                break
+
+            for schema in schemas:
+                schema.validate(value)
 
         return func(*args, **kwargs)
 
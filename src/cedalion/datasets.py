@@ -4,14 +4,12 @@ import os.path
 import pickle
 from gzip import GzipFile
 from pathlib import Path
-from cedalion.imagereco.forward_model import TwoSurfaceHeadModel
 
 import pooch
 import xarray as xr
 
 import cedalion.dataclasses as cdc
 import cedalion.io
-from cedalion.io.forward_model import load_fluence
 
 DATASETS = pooch.create(
     path=pooch.os_cache("cedalion"),
@@ -67,9 +65,18 @@ def get_colin27_segmentation(downsampled=False):
 
 def get_colin27_headmodel():
     """Retrieves the Colin27 headmodel, based on :cite:t:`Holmes1998`."""
+    from cedalion.imagereco.forward_model import TwoSurfaceHeadModel
+
     fnames = DATASETS.fetch("colin2SHM.zip", processor=pooch.Unzip())
     directory = Path(fnames[0]).parent
-    head_model = TwoSurfaceHeadModel.load(directory)
+
+    # the folder format is slow to parse. Convert it once into a binary bundle.
+    bundle_fname = directory / "colin27_headmodel_bundle.npz"
+    if bundle_fname.exists():
+        head_model = TwoSurfaceHeadModel.load_bundle(bundle_fname)
+    else:
+        head_model = TwoSurfaceHeadModel.load(directory)
+        head_model.save_bundle(bundle_fname)
     head_model.brain.units = cedalion.units.mm
     head_model.scalp.units = cedalion.units.mm
     return head_model
@@ -185,6 +192,8 @@ def get_precomputed_fluence(
     if head_model not in ["colin27", "icbm152"]:
         raise ValueError(f"unknown head_model {head_model}")
 
+    from cedalion.io.forward_model import load_fluence
+
     fname = DATASETS.fetch(f"fluence_{dataset}_{head_model}.h5")
 
     return load_fluence(fname)
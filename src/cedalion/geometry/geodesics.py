@@ -0,0 +1,468 @@
+"""Batched geodesic distances on triangle meshes with cached solvers.
+
+The heat method (see 'Geodesics in Heat', Crane et al, 2012) needs two sparse linear
+systems that only depend on the mesh: the backward Euler step of the heat equation and
+the Poisson equation. Their factorizations dominate the cost of a distance query.
+
+:class:`GeodesicEngine` factorizes both systems once per mesh and solves for many
+source sets at once by passing matrix right-hand sides to the triangular solves.
+Engines are kept in a process-wide registry keyed by a hash of the mesh, so that
+independent :class:`cedalion.dataclasses.PycortexSurface` instances of the same mesh
+share them. With a cache directory the assembled systems are also stored on disk and
+reused by other processes, which only need to factorize them. The factors themselves
+are not stored: they are about 20 times larger than the systems and, outside of
+SuperLU, can only be applied with considerably slower generic triangular solves.
+
+Shortest paths are traced by descending a distance field along the edges of the mesh.
+Because every vertex has a fixed successor for a given field, the successors of all
+vertices are computed at once from the CSR adjacency and many paths are traced
+together. Where the heat method distances are too noisy for the descent to reach the
+target, exact graph distances from :func:`scipy.sparse.csgraph.dijkstra` are used.
+"""
+
+from __future__ import annotations
+
+import functools
+import hashlib
+import os
+from collections import OrderedDict
+from typing import Iterable, Optional, Sequence
+
+import numpy as np
+from scipy import sparse
+from scipy.sparse import csgraph
+from scipy.sparse import linalg as sla
+
+# process-wide registry of engines, keyed by (mesh hash, m, fem)
+_ENGINES: OrderedDict = OrderedDict()
+_MAX_ENGINES = 8
+
+
+def mesh_hash(pts: np.ndarray, polys: np.ndarray) -> str:
+    """Calculate a hash of the vertex positions and faces of a mesh.
+
+    Args:
+        pts: Vertex positions of shape (nvertices, 3).
+        polys: Vertex indices of the faces of shape (nfaces, 3).
+
+    Returns:
+        The sha256 hex digest.
+    """
+    pts = np.ascontiguousarray(pts, dtype=np.float64)
+    polys = np.ascontiguousarray(polys, dtype=np.int64)
+
+    h = hashlib.sha256()
+    h.update(repr((pts.shape, polys.shape)).encode())
+    h.update(pts.tobytes())
+    h.update(polys.tobytes())
+    return h.hexdigest()
+
+
+class GeodesicEngine:
+    """Heat method geodesic distances for one mesh with precomputed operators.
+
+    Use :meth:`for_surface` to obtain an engine. It returns a cached instance if the
+    same mesh was seen before.
+
+    Args:
+        surface: A :class:`cedalion.dataclasses.PycortexSurface` that provides the
+            Laplace-Beltrami operator and the face geometry.
+        m: Reverse Euler step length. See
+            :meth:`cedalion.dataclasses.PycortexSurface.geodesic_distance`.
+        fem: Whether to use the FEM mass matrix instead of the lumped mass matrix.
+        operators: Previously assembled systems as returned by :meth:`_operators`. If
+            None, both systems are assembled from the surface.
+    """
+
+    def __init__(self, surface, m: float = 1.0, fem: bool = False, operators=None):
+        self.m = m
+        self.fem = fem
+
+        self.pts = np.asarray(surface.mesh.pts)
+        self.polys = np.asarray(surface.mesh.polys)
+        self.npt = len(self.pts)
+
+        # quantities needed for the gradient and the divergence
+        self._fe12, self._fe23, self._fe31 = surface._facenorm_cross_edge
+        self._face_areas = surface.face_areas
+        self._c32, self._c13, self._c21 = surface._cot_edge
+        self._polyconn = surface._polyconn
+
+        if operators is None:
+            B, D, W, V = surface.laplace_operator
+            nLC = W - V  # negative laplace matrix
+            if not fem:
+                # lumped mass matrix
+                spD = sparse.dia_matrix((D, [0]), (self.npt, self.npt)).tocsr()
+            else:
+                spD = B
+
+            t = m * surface.avg_edge_length**2  # time of heat evolution
+            lfac = spD - t * nLC  # backward Euler matrix
+
+            # Exclude rows with zero weight (these break the sparse LU)
+            goodrows = np.nonzero(~np.array(lfac.sum(0) == 0).ravel())[0]
+            operators = {
+                "goodrows": goodrows,
+                "heat": sparse.csc_matrix(lfac[goodrows][:, goodrows]),
+                "poisson": sparse.csc_matrix(nLC[goodrows][:, goodrows]),
+            }
+
+        self.goodrows = np.asarray(operators["goodrows"])
+        self._heat_operator = sparse.csc_matrix(operators["heat"])
+        self._poisson_operator = sparse.csc_matrix(operators["poisson"])
+        self._heat_solver = sla.splu(self._heat_operator)
+        self._poisson_solver = sla.splu(self._poisson_operator)
+
+    @classmethod
+    def for_surface(
+        cls,
+        surface,
+        m: float = 1.0,
+        fem: bool = False,
+        cache_dir: Optional[str] = None,
+    ) -> "GeodesicEngine":
+        """Return the engine for a surface, reusing cached factorizations.
+
+        Args:
+            surface: A :class:`cedalion.dataclasses.PycortexSurface`.
+            m: Reverse Euler step length.
+            fem: Whether to use the FEM mass matrix.
+            cache_dir: If given, the assembled systems are stored in this directory
+                keyed by the mesh hash and loaded from there by later calls, also from
+                other processes. Loaded systems are factorized again.
+
+        Returns:
+            The engine for this mesh and parameters.
+        """
+        key = (mesh_hash(surface.mesh.pts, surface.mesh.polys), float(m), bool(fem))
+
+        if key in _ENGINES:
+            _ENGINES.move_to_end(key)
+            return _ENGINES[key]
+
+        engine = None
+        if cache_dir is not None:
+            cache_fn = os.path.join(
+                cache_dir, f"geodesic_ops_{key[0]}_m{key[1]:g}_fem{int(key[2])}.npz"
+            )
+            if os.path.exists(cache_fn):
+                engine = cls(surface, m, fem, operators=_load_operators(cache_fn))
+            else:
+                engine = cls(surface, m, fem)
+                os.makedirs(cache_dir, exist_ok=True)
+                # write to a temporary file first, so that concurrent workers never
+                # see a partial file
+                tmp_fn = f"{cache_fn}.{os.getpid()}.tmp.npz"
+                _save_operators(tmp_fn, engine._operators())
+                os.replace(tmp_fn, cache_fn)
+        else:
+            engine = cls(surface, m, fem)
+
+        _ENGINES[key] = engine
+        while len(_ENGINES) > _MAX_ENGINES:
+            _ENGINES.popitem(last=False)
+
+        return engine
+
+    def _operators(self) -> dict:
+        """Return the assembled systems as a dict of arrays and sparse matrices."""
+        return {
+            "goodrows": self.goodrows,
+            "heat": self._heat_operator,
+            "poisson": self._poisson_operator,
+        }
+
+    def _gradient(self, U: np.ndarray) -> np.ndarray:
+        """Gradient of the columns of U at each face, shape (nfaces, 3, ncolumns)."""
+        pu1, pu2, pu3 = [U[self.polys[:, i]][:, None, :] for i in range(3)]
+        gradu = (
+            self._fe12[:, :, None] * pu3
+            + self._fe23[:, :, None] * pu1
+            + self._fe31[:, :, None] * pu2
+        ) / (2 * self._face_areas[:, None, None])
+        return np.nan_to_num(gradu)
+
+    def _divergence(self, X: np.ndarray) -> np.ndarray:
+        """Integrated divergence of the face vector fields X at each vertex."""
+        x1 = 0.5 * np.einsum("fd,fdk->fk", self._c32, X)
+        x2 = 0.5 * np.einsum("fd,fdk->fk", self._c13, X)
+        x3 = 0.5 * np.einsum("fd,fdk->fk", self._c21, X)
+        conn1, conn2, conn3 = self._polyconn
+        return conn1.dot(x1) + conn2.dot(x2) + conn3.dot(x3)
+
+    def _solve(self, source_sets: Sequence[Sequence[int]]) -> np.ndarray:
+        npt = self.npt
+        k = len(source_sets)
+
+        # I. integrate the heat flow for all source sets at once
+        u0 = np.zeros((npt, k))
+        for i, verts in enumerate(source_sets):
+            u0[np.asarray(verts, dtype=int), i] = 1.0
+        u = np.zeros((npt, k))
+        u[self.goodrows] = self._heat_solver.solve(u0[self.goodrows])
+
+        # II. evaluate the normalized vector field X = -grad u / |grad u|
+        gradu = self._gradient(u)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            X = np.nan_to_num(-gradu / np.sqrt((gradu**2).sum(axis=1, keepdims=True)))
+
+        # III. solve the Poisson equation
+        divx = self._divergence(X)
+        goodphi = self._poisson_solver.solve(divx[self.goodrows])
+
+        phi = np.zeros((npt, k))
+        phi[self.goodrows] = goodphi - goodphi.min(axis=0)
+
+        # Ensure that distance is zero for selected verts
+        for i, verts in enumerate(source_sets):
+            phi[np.asarray(verts, dtype=int), i] = 0.0
+
+        return phi.T
+
+    def distances(
+        self, source_sets: Iterable[Sequence[int]], batch_size: int = 64
+    ) -> np.ndarray:
+        """Calculate geodesic distances from many source sets.
+
+        Args:
+            source_sets: For each query a sequence of vertex indices. The distance of
+                each vertex to the closest vertex of the set is computed.
+            batch_size: Number of queries that are solved together. Larger batches are
+                faster but need memory proportional to batch_size * nfaces.
+
+        Returns:
+            Array of shape (nqueries, nvertices) with the distances.
+        """
+        source_sets = list(source_sets)
+        if len(source_sets) == 0:
+            return np.zeros((0, self.npt))
+
+        return np.vstack(
+            [
+                self._solve(source_sets[i : i + batch_size])
+                for i in range(0, len(source_sets), batch_size)
+            ]
+        )
+
+    @functools.cached_property
+    def edge_graph(self) -> sparse.csr_matrix:
+        """Symmetric CSR adjacency matrix of the mesh weighted by edge lengths."""
+        edges = np.vstack(
+            [self.polys[:, [0, 1]], self.polys[:, [1, 2]], self.polys[:, [2, 0]]]
+        )
+        edges = np.unique(np.sort(edges, axis=1), axis=0)
+        lengths = np.linalg.norm(
+            self.pts[edges[:, 0]] - self.pts[edges[:, 1]], axis=1
+        )
+        graph = sparse.coo_matrix(
+            (lengths, (edges[:, 0], edges[:, 1])), (self.npt, self.npt)
+        ).tocsr()
+        graph = (graph + graph.T).tocsr()
+        graph.sort_indices()
+        return graph
+
+    def successors(self, d: np.ndarray) -> np.ndarray:
+        """Find for each vertex the neighbor with the smallest value in d.
+
+        Args:
+            d: Distance field of shape (nvertices,).
+
+        Returns:
+            Array of shape (nvertices,) with the index of the successor of each vertex.
+            Isolated vertices are their own successors.
+        """
+        graph = self.edge_graph
+        degree = np.diff(graph.indptr)
+        rows = np.repeat(np.arange(self.npt), degree)
+
+        # sort the neighbors of each vertex by their distance and pick the first
+        order = np.lexsort((d[graph.indices], rows))
+        nxt = np.arange(self.npt)
+        has_neighbors = degree > 0
+        nxt[has_neighbors] = graph.indices[order[graph.indptr[:-1][has_neighbors]]]
+        return nxt
+
+    def trace_paths(
+        self, d: np.ndarray, starts: Sequence[int], target: int, max_len: int = 1000
+    ) -> tuple[list[np.ndarray], np.ndarray]:
+        """Trace paths from many start vertices to a target along a distance field.
+
+        Each path repeatedly steps to the neighbor with the smallest distance to the
+        target. The successors of all vertices are determined once and the walks are
+        advanced together. By pointer doubling on the successor map, walks that run
+        into a cycle are identified before tracing.
+
+        Args:
+            d: Distance field to the target, shape (nvertices,).
+            starts: Start vertices.
+            target: Target vertex.
+            max_len: Maximum number of vertices in a path.
+
+        Returns:
+            A tuple (paths, reached). paths contains for each start vertex the traced
+            vertices. reached is a boolean array which is False for paths that ran
+            into a cycle or exceeded max_len. Such paths end at the first vertex of the
+            cycle or after max_len vertices.
+        """
+        starts = np.asarray(starts, dtype=int)
+        nxt = self.successors(d)
+        nxt[target] = target
+
+        # after ceil(log2(npt)) doublings every vertex has been advanced by at least
+        # npt steps, i.e. it either arrived at the absorbing target or is in a cycle
+        jump = nxt.copy()
+        for _ in range(int(np.ceil(np.log2(max(self.npt, 2))))):
+            jump = jump[jump]
+        reaches_target = jump == target
+
+        # vertices on cycles, starting from one vertex of each cycle
+        on_cycle = np.zeros(self.npt, dtype=bool)
+        frontier = np.unique(jump[~reaches_target])
+        while len(frontier) > 0:
+            on_cycle[frontier] = True
+            frontier = nxt[frontier]
+            frontier = frontier[~on_cycle[frontier]]
+
+        steps = [starts]
+        active = (starts != target) & ~on_cycle[starts]
+        cur = starts
+        while active.any() and len(steps) < max_len:
+            cur = np.where(active, nxt[cur], cur)
+            steps.append(cur)
+            active &= (cur != target) & ~on_cycle[cur]
+        steps = np.vstack(steps)
+
+        # finished walks are padded with their last vertex, which does not occur
+        # earlier in the walk
+        lengths = np.argmax(steps == steps[-1], axis=0) + 1
+        paths = [steps[:n, i] for i, n in enumerate(lengths)]
+        reached = steps[-1] == target
+
+        return paths, reached
+
+    def geodesic_paths(
+        self,
+        pairs: Iterable[tuple[int, int]],
+        method: str = "heat",
+        fallback: bool = True,
+        max_len: int = 1000,
+        batch_size: int = 64,
+    ) -> list[np.ndarray]:
+        """Find the shortest paths between many pairs of vertices.
+
+        Pairs with the same end vertex share one distance field.
+
+        Args:
+            pairs: Pairs (a, b) of start and end vertex.
+            method: "heat" descends heat method distances. "dijkstra" returns exact
+                shortest paths along the mesh edges.
+            fallback: If True, pairs for which the descent on the heat method distances
+                does not reach the end vertex are traced with "dijkstra".
+            max_len: Maximum number of vertices in a heat method path.
+            batch_size: Number of distance fields that are solved together.
+
+        Returns:
+            For each pair the vertices of the path, including a and b.
+        """
+        pairs = [(int(a), int(b)) for a, b in pairs]
+        if method not in ["heat", "dijkstra"]:
+            raise ValueError(f"unknown method '{method}'.")
+
+        paths = [None] * len(pairs)
+        targets = sorted({b for _, b in pairs})
+
+        if method == "heat":
+            dists = self.distances([[b] for b in targets], batch_size=batch_size)
+            failed = []
+            for b, d in zip(targets, dists):
+                idx = [i for i, (_, bb) in enumerate(pairs) if bb == b]
+                traced, reached = self.trace_paths(
+                    d, [pairs[i][0] for i in idx], b, max_len
+                )
+                for i, path, ok in zip(idx, traced, reached):
+                    paths[i] = path
+                    if not ok:
+                        failed.append(i)
+            if not fallback:
+                return paths
+            redo = failed
+        else:
+            redo = list(range(len(pairs)))
+
+        if len(redo) > 0:
+            targets = sorted({pairs[i][1] for i in redo})
+            _, predecessors = csgraph.dijkstra(
+                self.edge_graph, indices=targets, return_predecessors=True
+            )
+            for i in redo:
+                a, b = pairs[i]
+                pred = predecessors[targets.index(b)]
+                path = [a]
+                while path[-1] != b:
+                    if pred[path[-1]] < 0:
+                        raise ValueError(f"vertices {a} and {b} are not connected.")
+                    path.append(pred[path[-1]])
+                paths[i] = np.asarray(path)
+
+        return paths
+
+    def pairwise_distances(
+        self, vertices: Sequence[int], symmetric: bool = True, batch_size: int = 64
+    ) -> np.ndarray:
+        """Calculate the table of geodesic distances between a subset of vertices.
+
+        Args:
+            vertices: Indices of the vertices.
+            symmetric: The heat method does not yield exactly symmetric distances. If
+                True, the table is symmetrized by averaging it with its transpose.
+            batch_size: Number of vertices whose distance fields are solved together.
+
+        Returns:
+            Array of shape (nvertices_subset, nvertices_subset). Entry (i, j) is the
+            distance between vertices[i] and vertices[j].
+        """
+        vertices = np.asarray(vertices, dtype=int)
+        table = np.vstack(
+            [
+                self._solve([[v] for v in vertices[i : i + batch_size]])[:, vertices]
+                for i in range(0, len(vertices), batch_size)
+            ]
+        )
+        if symmetric:
+            table = (table + table.T) / 2
+        return table
+
+
+def _save_operators(fn: str, operators: dict):
+    arrays = {}
+    for k, v in operators.items():
+        if sparse.issparse(v):
+            v = sparse.csr_matrix(v)
+            arrays[f"{k}_data"] = v.data
+            arrays[f"{k}_indices"] = v.indices
+            arrays[f"{k}_indptr"] = v.indptr
+            arrays[f"{k}_shape"] = np.asarray(v.shape)
+        else:
+            arrays[k] = np.asarray(v)
+    np.savez(fn, **arrays)
+
+
+def _load_operators(fn: str) -> dict:
+    operators = {}
+    with np.load(fn) as npz:
+        for k in npz.files:
+            if k.endswith("_data"):
+                name = k[: -len("_data")]
+                operators[name] = sparse.csr_matrix(
+                    (npz[k], npz[f"{name}_indices"], npz[f"{name}_indptr"]),
+                    shape=tuple(npz[f"{name}_shape"]),
+                )
+            elif not k.endswith(("_indices", "_indptr", "_shape")):
+                operators[k] = npz[k]
+    return operators
+
+
+def clear_cache():
+    """Remove all engines from the in-process registry."""
+    _ENGINES.clear()
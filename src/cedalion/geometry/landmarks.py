@@ -6,6 +6,7 @@ import vtk
 import vtk.util.numpy_support as vnp
 import xarray as xr
 import pyvista as pv
+from pqdm.processes import pqdm
 
 import cedalion.plots
 from cedalion.dataclasses import (
@@ -313,6 +314,390 @@ class LandmarksBuilder1010:
         plt.show()
 
 
+def _mesh_arrays(surface: Surface) -> tuple[np.ndarray, np.ndarray]:
+    """Return the vertices and triangular faces of a surface as numpy arrays."""
+    if isinstance(surface, TrimeshSurface):
+        return np.asarray(surface.mesh.vertices), np.asarray(surface.mesh.faces)
+    elif isinstance(surface, VTKSurface):
+        vertices = vnp.vtk_to_numpy(surface.mesh.GetPoints().GetData())
+        faces = vnp.vtk_to_numpy(surface.mesh.GetPolys().GetData()).reshape(-1, 4)
+        return vertices, faces[:, 1:]
+    else:
+        raise ValueError(f"unsupported surface type '{type(surface)}'.")
+
+
+class _MeshPlaneCutter:
+    """Intersects a triangle mesh with several planes at once.
+
+    The unique edges of the mesh are computed once. For each plane the signed vertex
+    distances are evaluated in one matrix product and every edge whose end points lie
+    on different sides of the plane contributes one point of the intersection line.
+    """
+
+    def __init__(self, vertices: np.ndarray, faces: np.ndarray):
+        self.vertices = np.asarray(vertices, dtype=float)
+        edges = np.vstack([faces[:, [0, 1]], faces[:, [1, 2]], faces[:, [2, 0]]])
+        self.edges = np.unique(np.sort(edges, axis=1), axis=0)
+
+    def lines(self, triangles: np.ndarray) -> list[np.ndarray]:
+        """Find the lines along the mesh through the points of several triangles.
+
+        Like :func:`_intersect_mesh_with_triangle`, the mesh is intersected with the
+        plane of each triangle (p0, p1, p2) and only points above the p0-p2-line are
+        kept.
+
+        Args:
+            triangles: Array of shape (ntriangles, 3, 3) with the points p0, p1, p2.
+
+        Returns:
+            For each triangle the intersection points, sorted from p0 to p2.
+        """
+        p0, p1, p2 = triangles[:, 0], triangles[:, 1], triangles[:, 2]
+        p0p2 = p2 - p0
+        origin = p0 + 0.5 * p0p2
+
+        normal_cut = np.cross(p0p2, p1 - p0)
+        normal_clip = np.cross(normal_cut, p0p2)
+
+        # signed distances of all vertices to all planes
+        sdist = self.vertices @ normal_cut.T - np.sum(origin * normal_cut, axis=1)
+        s0 = sdist[self.edges[:, 0]]
+        s1 = sdist[self.edges[:, 1]]
+
+        i_edge, i_plane = np.nonzero((s0 >= 0) != (s1 >= 0))
+        s0 = s0[i_edge, i_plane]
+        s1 = s1[i_edge, i_plane]
+        v0 = self.vertices[self.edges[i_edge, 0]]
+        v1 = self.vertices[self.edges[i_edge, 1]]
+        points = v0 + (s0 / (s0 - s1))[:, None] * (v1 - v0)
+
+        # parametrize the points by their angle around the midpoint of p0-p2. Points
+        # above the p0-p2-line have angles between 0 (at p0) and pi (at p2).
+        rel = points - origin[i_plane]
+        e1 = p0 - origin
+        e1 /= np.linalg.norm(e1, axis=1, keepdims=True)
+        e2 = normal_clip / np.linalg.norm(normal_clip, axis=1, keepdims=True)
+        angle = np.arctan2(
+            np.sum(rel * e2[i_plane], axis=1), np.sum(rel * e1[i_plane], axis=1)
+        )
+        angle = np.where(angle < -np.pi / 2, angle + 2 * np.pi, angle)
+
+        order = np.lexsort((angle, i_plane))
+        bounds = np.searchsorted(i_plane[order], np.arange(len(triangles) + 1))
+
+        lines = []
+        for i in range(len(triangles)):
+            a = angle[order[bounds[i] : bounds[i + 1]]]
+            pts = points[order[bounds[i] : bounds[i + 1]]]
+
+            # clip the line to the area above p0-p2 and, like vtkClipPolyData, end it
+            # with the points where it crosses the p0-p2-line
+            inside = (a > 0) & (a < np.pi)
+            first, last = np.argmax(inside), len(a) - np.argmax(inside[::-1]) - 1
+            line = [pts[first : last + 1]]
+            if first > 0:
+                w = a[first] / (a[first] - a[first - 1])
+                line.insert(0, (pts[first] + w * (pts[first - 1] - pts[first]))[None])
+            if last < len(a) - 1:
+                w = (np.pi - a[last]) / (a[last + 1] - a[last])
+                line.append((pts[last] + w * (pts[last + 1] - pts[last]))[None])
+            lines.append(np.vstack(line))
+
+        return lines
+
+
+def _positions_along_line(
+    p0: np.ndarray, points: np.ndarray, fractions: List[float]
+) -> np.ndarray:
+    """Interpolate positions at fractions of the length of a line.
+
+    As in :func:`_sort_line_points` the length is measured from p0 to the last point.
+    """
+    segments = np.linalg.norm(np.diff(points, axis=0), axis=1)
+    dists = np.cumsum(np.r_[np.linalg.norm(points[0] - p0), segments])
+    dists /= dists[-1]
+
+    return np.stack(
+        [np.interp(fractions, dists, points[:, i]) for i in range(3)], axis=1
+    )
+
+
+def _row_labels(left: str, right: str, prefix: str, density: str):
+    """Labels and fractions along a coronal row of the 10-10 or 10-5 system."""
+    labels = {
+        1: f"{left}h",
+        2: f"{prefix}5",
+        3: f"{prefix}5h",
+        4: f"{prefix}3",
+        5: f"{prefix}3h",
+        6: f"{prefix}1",
+        7: f"{prefix}1h",
+        9: f"{prefix}2h",
+        10: f"{prefix}2",
+        11: f"{prefix}4h",
+        12: f"{prefix}4",
+        13: f"{prefix}6h",
+        14: f"{prefix}6",
+        15: f"{right}h",
+    }
+    if density == "10-10":
+        labels = {k: v for k, v in labels.items() if k % 2 == 0}
+    return list(labels.values()), [k / 16 for k in labels]
+
+
+# midline and circumference positions with their fractions of the line length. The
+# last entry of each tuple is True for positions that only belong to the 10-5 system.
+_MIDLINE = [
+    ("Fpz", 0.10, False), ("AFpz", 0.15, True), ("AFz", 0.20, False),
+    ("AFFz", 0.25, True), ("Fz", 0.30, False), ("FFCz", 0.35, True),
+    ("FCz", 0.40, False), ("FCCz", 0.45, True), ("CCPz", 0.55, True),
+    ("CPz", 0.60, False), ("CPPz", 0.65, True), ("Pz", 0.70, False),
+    ("PPOz", 0.75, True), ("POz", 0.80, False), ("POOz", 0.85, True),
+    ("Oz", 0.90, False), ("OIz", 0.95, True),
+]  # fmt: skip
+
+_CIRCUMFERENCE = [
+    ("Fp1h", "Fp2h", 0.05, True), ("Fp1", "Fp2", 0.10, False),
+    ("AFp7", "AFp8", 0.15, True), ("AF7", "AF8", 0.20, False),
+    ("AFF7", "AFF8", 0.25, True), ("F7", "F8", 0.30, False),
+    ("FFT7", "FFT8", 0.35, True), ("FT7", "FT8", 0.40, False),
+    ("FTT7", "FTT8", 0.45, True), ("TTP7", "TTP8", 0.55, True),
+    ("TP7", "TP8", 0.60, False), ("TPP7", "TPP8", 0.65, True),
+    ("P7", "P8", 0.70, False), ("PPO7", "PPO8", 0.75, True),
+    ("PO7", "PO8", 0.80, False), ("POO7", "POO8", 0.85, True),
+    ("O1", "O2", 0.90, False), ("O1h", "O2h", 0.95, True),
+]  # fmt: skip
+
+# coronal rows: end points on the circumference, point on the midline, label prefix
+_ROWS = [
+    ("T", "Cz", "C", False),
+    ("FT", "FCz", "FC", False),
+    ("F", "Fz", "F", False),
+    ("AF", "AFz", "AF", False),
+    ("TP", "CPz", "CP", False),
+    ("P", "Pz", "P", False),
+    ("PO", "POz", "PO", False),
+    ("AFp", "AFpz", "AFp", True),
+    ("AFF", "AFFz", "AFF", True),
+    ("FFT", "FFCz", "FFC", True),
+    ("FTT", "FCCz", "FCC", True),
+    ("TTP", "CCPz", "CCP", True),
+    ("TPP", "CPPz", "CPP", True),
+    ("PPO", "PPOz", "PPO", True),
+    ("POO", "POOz", "POO", True),
+]
+
+
+def _build_landmarks(
+    vertices: np.ndarray,
+    faces: np.ndarray,
+    landmarks: dict[str, np.ndarray],
+    density: str,
+) -> dict[str, np.ndarray]:
+    """Construct 10-10 or 10-5 positions on a mesh given in plain arrays.
+
+    Args:
+        vertices: Mesh vertices in mm.
+        faces: Triangle vertex indices.
+        landmarks: Positions of "Nz", "Iz", "LPA", "RPA" and optionally "Cz".
+        density: "10-10" or "10-5".
+
+    Returns:
+        The positions of all constructed landmarks, in the order of construction.
+    """
+    cutter = _MeshPlaneCutter(vertices, faces)
+    lm = dict(landmarks)
+    new = {}
+
+    def add(labels, positions):
+        for label, pos in zip(labels, positions):
+            lm[label] = pos
+            new[label] = pos
+
+    def cut(triangle_labels):
+        triangles = np.array([[lm[label] for label in t] for t in triangle_labels])
+        return triangles, cutter.lines(triangles)
+
+    # cranial vertex, see LandmarksBuilder1010._estimate_cranial_vertex_from_lines
+    if "Cz" in lm:
+        cz1 = lm["Cz"]
+    else:
+        highest = cutter.vertices[:, 2] == cutter.vertices[:, 2].max()
+        cz1 = cutter.vertices[highest].mean(axis=0)
+
+    lm["cz1"] = cz1
+    _, [points_a] = cut([["Nz", "cz1", "Iz"]])
+    lm["cz2"] = _positions_along_line(lm["Nz"], points_a, [0.5])[0]
+    _, [points_r] = cut([["LPA", "cz2", "RPA"]])
+    del lm["cz1"], lm["cz2"]
+
+    # find the closest points of both lines around their centers
+    fractions = np.linspace(0.4, 0.6, 401)
+    candidates_a = _positions_along_line(lm["Nz"], points_a, fractions)
+    candidates_r = _positions_along_line(lm["LPA"], points_r, fractions)
+    dists = np.linalg.norm(candidates_r[:, None, :] - candidates_a[None, :, :], axis=2)
+    idx_r, idx_a = np.unravel_index(np.argmin(dists), dists.shape)
+    cz = np.vstack((candidates_r[idx_r], candidates_a[idx_a])).mean(axis=0)
+    add(["Cz"], [cz])
+
+    # midline and preauricular line
+    midline = [m for m in _MIDLINE if density == "10-5" or not m[2]]
+    triangles, (points_m, points_t) = cut([["Nz", "Cz", "Iz"], ["LPA", "Cz", "RPA"]])
+    add([m[0] for m in midline], _positions_along_line(
+        triangles[0, 0], points_m, [m[1] for m in midline]
+    ))
+    add(["T7", "T8"], _positions_along_line(triangles[1, 0], points_t, [0.1, 0.9]))
+
+    # circumference through Fpz, T7/T8 and Oz
+    circumference = [c for c in _CIRCUMFERENCE if density == "10-5" or not c[3]]
+    triangles, lines = cut([["Fpz", "T7", "Oz"], ["Fpz", "T8", "Oz"]])
+    for side, triangle, points in zip([0, 1], triangles, lines):
+        positions = _positions_along_line(
+            triangle[0], points, [c[2] for c in circumference]
+        )
+        add([c[side] for c in circumference], positions)
+
+    # coronal rows
+    rows = [r for r in _ROWS if density == "10-5" or not r[3]]
+    triangles, lines = cut([[f"{r[0]}7", r[1], f"{r[0]}8"] for r in rows])
+    for (end, _, prefix, _), triangle, points in zip(rows, triangles, lines):
+        labels, fractions = _row_labels(f"{end}7", f"{end}8", prefix, density)
+        add(labels, _positions_along_line(triangle[0], points, fractions))
+
+    return new
+
+
+class LandmarksBuilder:
+    """Construct the 10-10 or 10-5 system on a scalp surface.
+
+    This builder places the same positions as :class:`LandmarksBuilder1010`, but
+    instead of running a VTK pipeline for each line, it intersects the scalp mesh with
+    all planes that do not depend on each other at once in numpy. Positions along the
+    lines are interpolated at the exact fractions of the line length. With density
+    "10-5" the half positions of :cite:t:`Oostenveld2001` above the T7-T8 plane are
+    added, using the labels of the standard_1005 montage.
+
+    Attributes:
+        scalp_surface (Surface): a triangle-mesh representing the scalp
+        landmarks_mm (LabeledPointCloud): positions of all landmarks in mm
+        density (str): "10-10" or "10-5"
+    """
+
+    @validate_schemas
+    def __init__(
+        self,
+        scalp_surface: Surface,
+        landmarks: LabeledPointCloud,
+        density: str = "10-10",
+    ):
+        """Initialize the LandmarksBuilder.
+
+        Args:
+            scalp_surface (Surface): a triangle-mesh representing the scalp
+            landmarks (LabeledPointCloud): positions of "Nz", "Iz", "LPA", "RPA"
+            density (str): "10-10" or "10-5"
+        """
+        if density not in ["10-10", "10-5"]:
+            raise ValueError(f"unsupported density '{density}'.")
+
+        required_landmarks = ["Nz", "Iz", "LPA", "RPA"]
+        for label in required_landmarks:
+            assert label in landmarks.label
+
+        self.scalp_surface = scalp_surface
+        self.landmarks_mm = landmarks.pint.to("mm").pint.dequantify()
+        self.density = density
+
+    def build(self) -> LabeledPointCloud:
+        """Construct the landmarks on the scalp surface.
+
+        Returns:
+            The given landmarks together with the constructed ones.
+        """
+        vertices, faces = _mesh_arrays(self.scalp_surface)
+        landmarks = {
+            label: self.landmarks_mm.loc[label].values
+            for label in self.landmarks_mm.label.values
+        }
+        new = _build_landmarks(vertices, faces, landmarks, self.density)
+
+        crs = self.landmarks_mm.points.crs
+        tmp = xr.DataArray(
+            np.array(list(new.values())),
+            dims=["label", crs],
+            coords={
+                "label": ("label", list(new.keys())),
+                "type": ("label", [PointType.LANDMARK] * len(new)),
+            },
+            attrs={"units": "mm"},
+        )
+
+        # a given Cz is replaced by the constructed one
+        landmarks_mm = self.landmarks_mm.drop_sel(
+            label=[label for label in new if label in self.landmarks_mm.label]
+        )
+        self.landmarks_mm = xr.concat((landmarks_mm, tmp), dim="label")
+
+        return self.landmarks_mm.pint.quantify()
+
+
+def _build_worker(args):
+    scalp_surface, landmarks, density = args
+    landmarks = landmarks.pint.quantify()
+    return LandmarksBuilder(scalp_surface, landmarks, density).build()
+
+
+def build_landmarks(
+    scalp_surfaces: List[Surface],
+    landmarks: List[LabeledPointCloud],
+    density: str = "10-10",
+    max_jobs: int = 1,
+    subjects: Optional[List[str]] = None,
+) -> LabeledPointCloud:
+    """Construct the 10-10 or 10-5 system for several head models.
+
+    Args:
+        scalp_surfaces: Scalp surface of each head model.
+        landmarks: Positions of "Nz", "Iz", "LPA", "RPA" for each head model.
+        density: "10-10" or "10-5".
+        max_jobs: Number of processes that build head models in parallel.
+        subjects: Labels of the head models. Defaults to 0, 1, ...
+
+    Returns:
+        The landmarks of all head models, stacked along a new dimension "subject".
+    """
+    if len(scalp_surfaces) != len(landmarks):
+        raise ValueError("number of scalp surfaces and landmarks differ.")
+    if subjects is None:
+        subjects = list(range(len(scalp_surfaces)))
+
+    # VTK meshes cannot be sent to other processes
+    scalp_surfaces = [
+        TrimeshSurface.from_vtksurface(s) if isinstance(s, VTKSurface) else s
+        for s in scalp_surfaces
+    ]
+    args_list = [
+        (s, lm.pint.dequantify(), density) for s, lm in zip(scalp_surfaces, landmarks)
+    ]
+
+    if max_jobs == 1:
+        results = [_build_worker(args) for args in args_list]
+    else:
+        results = pqdm(
+            args_list,
+            _build_worker,
+            n_jobs=max_jobs,
+            exception_behaviour="immediate",
+            disable=True,
+        )
+
+    results = [r.pint.dequantify() for r in results]
+    result = xr.concat(results, dim="subject", join="outer")
+    result = result.assign_coords(subject=subjects)
+
+    return result.pint.quantify()
+
+
 def order_ref_points_6(landmarks: xr.DataArray, twoPoints: str) -> xr.DataArray:
     """Reorder a set of six landmarks based on spatial relationships and give labels.
 
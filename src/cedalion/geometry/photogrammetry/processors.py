@@ -1,13 +1,12 @@
 """Vertex classifiers."""
 
-import colorsys
 from abc import ABC, abstractmethod
 from dataclasses import dataclass
 import logging
-from cv2 import minEnclosingCircle
 import matplotlib.pyplot as p
 import numpy as np
 import xarray as xr
+from pqdm.threads import pqdm
 from sklearn.cluster import DBSCAN
 
 import cedalion.dataclasses as cdc
@@ -31,6 +30,66 @@ class ScanProcessor(ABC):
         raise NotImplementedError()
 
 
+def rgb_to_hsv(rgb: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Convert RGB to HSV colors like :func:`colorsys.rgb_to_hsv` for many colors.
+
+    Args:
+        rgb: Array of shape (ncolors, 3) with red, green and blue values.
+
+    Returns:
+        Arrays h, s, v of shape (ncolors,). h and s are in [0, 1], v has the range of
+        the input.
+    """
+    rgb = np.asarray(rgb, dtype=float)
+    r, g, b = rgb[:, 0], rgb[:, 1], rgb[:, 2]
+
+    maxc = rgb.max(axis=1)
+    minc = rgb.min(axis=1)
+    rangec = maxc - minc
+    gray = rangec == 0
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        s = np.where(gray, 0.0, rangec / maxc)
+        rc = (maxc - r) / rangec
+        gc = (maxc - g) / rangec
+        bc = (maxc - b) / rangec
+
+    h = np.where(
+        r == maxc, bc - gc, np.where(g == maxc, 2.0 + rc - bc, 4.0 + gc - rc)
+    )
+    h = np.where(gray, 0.0, (h / 6.0) % 1.0)
+
+    return h, s, maxc
+
+
+def voxel_downsample(
+    vertices: np.ndarray, voxel_size: float
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Replace the vertices in each cell of a regular grid by their mean.
+
+    Args:
+        vertices: Array of shape (nvertices, 3).
+        voxel_size: Edge length of the grid cells.
+
+    Returns:
+        A tuple (centroids, counts, inverse). centroids contains the mean position of
+        the vertices in each occupied cell, counts the number of vertices per cell and
+        inverse the cell index of each vertex.
+    """
+    cells = np.floor(vertices / voxel_size).astype(np.int64)
+    _, inverse, counts = np.unique(
+        cells, axis=0, return_inverse=True, return_counts=True
+    )
+    inverse = inverse.reshape(-1)
+
+    centroids = np.stack(
+        [np.bincount(inverse, weights=vertices[:, i]) for i in range(3)], axis=1
+    )
+    centroids /= counts[:, None]
+
+    return centroids, counts, inverse
+
+
 def pca(vertices: np.ndarray):
     eigenvalues, eigenvecs = np.linalg.eigh(np.cov(vertices.T))
 
@@ -42,6 +101,36 @@ def pca(vertices: np.ndarray):
     return eigenvalues, eigenvecs
 
 
+def batched_pca(vertices: np.ndarray, cluster: np.ndarray, nclusters: int):
+    """Principal component analysis of many point clusters at once.
+
+    Args:
+        vertices: Array of shape (nvertices, 3).
+        cluster: Cluster index of each vertex.
+        nclusters: Number of clusters.
+
+    Returns:
+        Eigenvalues of shape (nclusters, 3) in increasing order and the corresponding
+        eigenvectors of shape (nclusters, 3, 3) in the columns, as returned by
+        :func:`pca` for each cluster.
+    """
+    counts = np.bincount(cluster, minlength=nclusters)
+    mean = np.stack(
+        [np.bincount(cluster, vertices[:, i], nclusters) for i in range(3)], axis=1
+    ) / counts[:, None]
+
+    rel = vertices - mean[cluster]
+    outer = rel[:, :, None] * rel[:, None, :]
+    cov = np.stack(
+        [np.bincount(cluster, outer[:, i, j], nclusters)
+         for i in range(3) for j in range(3)],
+        axis=1,
+    ).reshape(nclusters, 3, 3) / (counts - 1)[:, None, None]  # fmt: skip
+
+    # eigh returns the eigenvalues in ascending order
+    return np.linalg.eigh(cov)
+
+
 @dataclass
 class ColoredStickerProcessorDetails:
     cluster_coords: list[np.ndarray]
@@ -154,6 +243,8 @@ class ColoredStickerProcessor(ScanProcessor):
         # value_threshold: float = 150 / 255.0,
         sticker_radius: Quantity = 6.5 * units.mm,
         min_nvertices: int = 50,
+        voxel_size: Quantity | None = None,
+        max_jobs: int = 1,
     ):
         """Initiliaze the classifier by specifying colors and classnames.
 
@@ -163,6 +254,10 @@ class ColoredStickerProcessor(ScanProcessor):
             #value_threshold: minimum value to still be classified
             sticker_radius: the radius of the colored stickers
             min_nvertices: minimum number of vertices during clustering
+            voxel_size: before clustering, the vertices of each color group are
+                replaced by the mean of the vertices in each cell of a grid with this
+                spacing, e.g. 0.5 mm. None (default) clusters all vertices.
+            max_jobs: number of threads that cluster the color groups in parallel
 
         """
         self.colors = colors
@@ -170,6 +265,29 @@ class ColoredStickerProcessor(ScanProcessor):
         # self.value_threshold = value_threshold
         self.sticker_radius = sticker_radius
         self.min_nvertices = min_nvertices
+        self.voxel_size = voxel_size
+        self.max_jobs = max_jobs
+
+    def _cluster(self, vertices: np.ndarray) -> np.ndarray:
+        """Run DBSCAN on the vertices of one color group.
+
+        Returns:
+            The cluster label of each vertex. -1 denotes vertices in no cluster.
+        """
+        radius_mm = float(self.sticker_radius.to("mm").magnitude)
+        dbscan = DBSCAN(eps=0.2 * radius_mm)
+
+        if len(vertices) == 0:
+            return np.zeros(0, dtype=int)
+
+        if self.voxel_size is None:
+            return dbscan.fit_predict(vertices)
+
+        # cluster the voxel centroids, weighted by the number of vertices they
+        # represent, and assign the label of its voxel to each vertex
+        voxel_size = float(self.voxel_size.to("mm").magnitude)
+        centroids, counts, inverse = voxel_downsample(vertices, voxel_size)
+        return dbscan.fit_predict(centroids, sample_weight=counts)[inverse]
 
     def process(
         self, surface: cdc.TrimeshSurface, details: bool = False
@@ -188,175 +306,211 @@ class ColoredStickerProcessor(ScanProcessor):
             surface normal vectors
             aux. detail object if detail == True
         """
-        assert surface.units == units.mm  # FIXME Einstar yields mm. Allow other units.
+        from cv2 import minEnclosingCircle
 
-        vertex_colors = surface.mesh.visual.to_color().vertex_colors
+        assert surface.units == units.mm  # FIXME Einstar yields mm. Allow other units.
 
-        rgb_to_hsv = np.vectorize(colorsys.rgb_to_hsv)
+        visual = surface.mesh.visual
+        if hasattr(visual, "to_color"):  # textured scans
+            visual = visual.to_color()
+        vertex_colors = visual.vertex_colors
+        mesh_vertices = np.asarray(surface.mesh.vertices)
 
         # vertex colors as float HSV values. h,s in [0,1.] v in [0,255]
-        h, s, v = rgb_to_hsv(
-            vertex_colors[:, 0],
-            vertex_colors[:, 1],
-            vertex_colors[:, 2],
-        )
+        h, s, v = rgb_to_hsv(vertex_colors[:, :3])
         v = v / 255.0
 
-        head_cog = np.mean(surface.mesh.vertices, axis=0)
+        head_cog = np.mean(mesh_vertices, axis=0)
         radius_mm = float(self.sticker_radius.to("mm").magnitude)
 
-        sticker_centers = []
-        sticker_normals = []
-        groups = []
-        labels = []
-        types = []
-
-        detail_coords = []
-        detail_circles = []
-        detail_colors = []
-
+        group_masks = []
         for group_name, (h_min, h_max, v_min, v_max) in self.colors.items():
-            group_counter = 1
             group_mask = (v_min <= v) & (v <= v_max)
             group_mask &= (h_min <= h) & (h <= h_max)
             group_mask &= 0.6 <= s
+            group_masks.append(group_mask)
 
-            class_vertices = surface.mesh.vertices[group_mask]  # shape=(nvertices, 3)
-
-            print(surface.mesh.vertices)
-            print(class_vertices)
-            print(group_name, (h_min, h_max, v_min, v_max))
+            logger.debug(
+                f"{group_name} {(h_min, h_max, v_min, v_max)}: "
+                f"{group_mask.sum()} vertices"
+            )
 
-            cluster_labels = DBSCAN(eps=0.2 * radius_mm).fit_predict(class_vertices)
+        group_vertices = [mesh_vertices[mask] for mask in group_masks]
+        if self.max_jobs == 1:
+            group_labels = [self._cluster(vertices) for vertices in group_vertices]
+        else:
+            group_labels = pqdm(
+                group_vertices,
+                self._cluster,
+                n_jobs=self.max_jobs,
+                exception_behaviour="immediate",
+                disable=True,
+            )
 
+        # collect the vertex indices of all clusters
+        cluster_groups = []
+        cluster_indices = []
+        for group_name, group_mask, cluster_labels in zip(
+            self.colors, group_masks, group_labels
+        ):
+            group_indices = np.flatnonzero(group_mask)
             for label in np.unique(cluster_labels):
-                cluster_mask = cluster_labels == label
-                cluster_vertices = class_vertices[cluster_mask]
-                cluster_colors = vertex_colors[group_mask][cluster_mask]
-                nverts = len(cluster_vertices)
+                indices = group_indices[cluster_labels == label]
+                nverts = len(indices)
 
                 if label == -1:  # vertices assigned to no cluster
-                    logging.debug(f"{nverts} vertices belong to no cluster.")
+                    logger.debug(f"{nverts} vertices belong to no cluster.")
                     continue
 
-                if len(cluster_vertices) < self.min_nvertices:
-                    logging.debug(
+                if nverts < self.min_nvertices:
+                    logger.debug(
                         f"skipping cluster {label} because of too few vertices "
                         f"({nverts} < {self.min_nvertices})."
                     )
                     continue
 
-                logging.debug(f"{group_name} - {label}: {nverts} vertices")
-
-                # tentative center. the stickers are not always uniformly sampled
-                # and the cog is not necessarily at the sticker center.
-                tentative_center = cluster_vertices.mean(axis=0)
-
-                # select vertices in the proximity of the tentative center. At the edge
-                # of the optode 'cluster_vertices' may leave the plane but in the
-                # proximity of the center they should be flat
-                rel_verts = cluster_vertices - tentative_center
-                rel_dists = np.linalg.norm(rel_verts, axis=1)
-                proximity_mask = rel_dists < 0.66 * radius_mm
-
-                hopefully_flat_verts = cluster_vertices[proximity_mask]
+                logger.debug(f"{group_name} - {label}: {nverts} vertices")
+                cluster_groups.append(group_name)
+                cluster_indices.append(indices)
+
+        nclusters = len(cluster_indices)
+        cluster_id = np.repeat(np.arange(nclusters), [len(i) for i in cluster_indices])
+        all_indices = np.concatenate(cluster_indices or [[]]).astype(int)
+        all_vertices = mesh_vertices[all_indices]
+
+        # tentative centers. the stickers are not always uniformly sampled
+        # and the cog is not necessarily at the sticker center.
+        counts = np.bincount(cluster_id, minlength=nclusters)
+        tentative_centers = np.stack(
+            [np.bincount(cluster_id, all_vertices[:, i], nclusters) for i in range(3)],
+            axis=1,
+        ) / np.maximum(counts, 1)[:, None]
+
+        # select vertices in the proximity of the tentative center. At the edge
+        # of the optode 'cluster_vertices' may leave the plane but in the
+        # proximity of the center they should be flat
+        rel_verts = all_vertices - tentative_centers[cluster_id]
+        proximity_mask = np.linalg.norm(rel_verts, axis=1) < 0.66 * radius_mm
+        nflat = np.bincount(cluster_id[proximity_mask], minlength=nclusters)
+
+        # the eigenvector corresponding to the smallest eigenvalue denotes the
+        # direction of the smallest extent of the vertices. For circular
+        # stickers this corresponds to the surface normal. The other two
+        # eigenvectors span the plan in which the vertices should lie.
+        # Clusters with less than two vertices close to the tentative center are
+        # skipped below.
+        valid = nflat >= 2
+        eigenvecs = np.full((nclusters, 3, 3), np.nan)
+        if valid.any():
+            batch_id = np.cumsum(valid) - 1
+            flat_mask = proximity_mask & valid[cluster_id]
+            _, eigenvecs[valid] = batched_pca(
+                rel_verts[flat_mask], batch_id[cluster_id[flat_mask]], valid.sum()
+            )
 
-                if len(hopefully_flat_verts) == 0:
-                    logging.info(
-                        f"skipping cluster {label} because there are no "
-                        f"vertices close to the tentative center."
-                    )
-                    continue
+        # FIXME? add a criterion based on the magnitude of eigenvalues[0].
+        # too large eigenvalues indicate non-flat vertices.
 
-                # the eigenvector corresponding to the smallest eigenvalue denotes the
-                # direction of the smallest extent of the vertices. For circular
-                # stickers this corresponds to the surface normal. The other two
-                # eigenvectors span the plan in which the vertices should lie.
-                eigenvalues, eigenvecs = pca(hopefully_flat_verts)
+        # calculate coords relative to eigenvector basis
+        # coords[:,1] and coords[:;2] are in the tentative plane of the sticker
+        all_coords = np.einsum("ni,nij->nj", rel_verts, eigenvecs[cluster_id])
+        bounds = np.r_[0, np.cumsum(counts)]
 
-                # FIXME? add a criterion based on the magnitude of eigenvalues[0].
-                # too large eigenvalues indicate non-flat vertices.
+        sticker_centers = []
+        sticker_normals = []
+        groups = []
+        labels = []
+        types = []
 
-                normal = eigenvecs[:, 0]
+        detail_coords = []
+        detail_circles = []
+        detail_colors = []
 
-                # calculate coords relative to eigenvector basis
-                # coords[:,1] and coords[:;2] are in the tentative plane of the sticker
-                coords = np.vstack(
-                    [eigenvecs[:, i][None, :] @ (rel_verts).T for i in range(3)]
-                ).T
+        group_counter = {group_name: 1 for group_name in self.colors}
 
-                # since stickers are circular the standard deviation of the relative
-                # coordinates in both directions should be similar close to ~68% of the
-                # sticker radius. Skip clusters with small extent in either dimension.
-                # FIXME this breaks when stickers of very different sizes are used.
-                std_x = np.std(coords[:, 1])
-                std_y = np.std(coords[:, 2])
-                std_threshold = 0.25 * radius_mm
-                if (std_x < std_threshold) or (std_y < std_threshold):
-                    logger.debug(f"skipping non-circuluar cluster {label}")
-                    # continue
-
-                # find the minimum enclosing circle to find the sticker center.
-                # cv2 expects integer coordinates with shape
-                # (npoints, 1, 2). Upscale float coords by 100 to avoid rounding errors.
-                coords *= 100
-
-                # First pass. The center (a,b) should be closer to the real sticker
-                # center. It could still be affected by outlier vertices, though.
-                (a, b), r = minEnclosingCircle(
-                    coords[:, 1:][:, None, :].astype(np.int32)
+        for i_cluster, (group_name, indices) in enumerate(
+            zip(cluster_groups, cluster_indices)
+        ):
+            if not valid[i_cluster]:
+                logger.info(
+                    f"skipping cluster {i_cluster} because there are no "
+                    f"vertices close to the tentative center."
                 )
+                continue
+
+            coords = all_coords[bounds[i_cluster] : bounds[i_cluster + 1]].copy()
+            normal = eigenvecs[i_cluster, :, 0].copy()
+            cluster_colors = vertex_colors[indices]
+
+            # since stickers are circular the standard deviation of the relative
+            # coordinates in both directions should be similar close to ~68% of the
+            # sticker radius. Skip clusters with small extent in either dimension.
+            # FIXME this breaks when stickers of very different sizes are used.
+            std_x = np.std(coords[:, 1])
+            std_y = np.std(coords[:, 2])
+            std_threshold = 0.25 * radius_mm
+            if (std_x < std_threshold) or (std_y < std_threshold):
+                logger.debug(f"skipping non-circuluar cluster {i_cluster}")
+                # continue
+
+            # find the minimum enclosing circle to find the sticker center.
+            # cv2 expects integer coordinates with shape
+            # (npoints, 1, 2). Upscale float coords by 100 to avoid rounding errors.
+            coords *= 100
+
+            # First pass. The center (a,b) should be closer to the real sticker
+            # center. It could still be affected by outlier vertices, though.
+            (a, b), r = minEnclosingCircle(coords[:, 1:][:, None, :].astype(np.int32))
+
+            # Second pass. Calculate distances to new center and get rid of the N
+            # most distant vertices to remove remaining outlier vertices not in the
+            # sticker circle.
+            skip_to_N = 20
+            rel_dists = np.linalg.norm(coords[:, 1:] - [a, b], axis=1)
+            indices = np.argsort(rel_dists)[:-skip_to_N]
+            coords2 = coords[indices]
+
+            (a, b), r = minEnclosingCircle(coords2[:, 1:][:, None, :].astype(np.int32))
+
+            # scale back coordinates
+            a /= 100
+            b /= 100
+            coords /= 100
+            r /= 100
+
+            center = (
+                tentative_centers[i_cluster]
+                + a * eigenvecs[i_cluster, :, 1]
+                + b * eigenvecs[i_cluster, :, 2]
+            )
 
-                # Second pass. Calculate distances to new center and get rid of the N
-                # most distant vertices to remove remaining outlier vertices not in the
-                # sticker circle.
-                skip_to_N = 20
-                rel_dists = np.linalg.norm(coords[:, 1:] - [a, b], axis=1)
-                indices = np.argsort(rel_dists)[:-skip_to_N]
-                coords2 = coords[indices]
+            detail_coords.append(coords)
+            detail_circles.append((a, b, r))
+            detail_colors.append(cluster_colors / 255.0)
 
-                (a, b), r = minEnclosingCircle(
-                    coords2[:, 1:][:, None, :].astype(np.int32)
-                )
+            # FIXME? add a check that cluster_vertices fill the sphere
+            # FIXME? select all vertices in found cylinder volume to catch vertices
+            # missed by the color criterion.
 
-                # scale back coordinates
-                a /= 100
-                b /= 100
-                coords /= 100
-                r /= 100
-
-                center = tentative_center + a * eigenvecs[:, 1] + b * eigenvecs[:, 2]
-
-                detail_coords.append(coords)
-                detail_circles.append((a, b, r))
-                detail_colors.append(cluster_colors / 255.0)
-
-                # FIXME? add a check that cluster_vertices fill the sphere
-                # FIXME? select all vertices in found cylinder volume to catch vertices
-                # missed by the color criterion.
-
-                # make sure that normal points away from the head's center
-                if np.dot(center - head_cog, normal) < 0:
-                    normal *= -1
-
-                sticker_centers.append(center)
-                sticker_normals.append(normal)
-                groups.append(group_name)
-                labels.append(f"{group_name}-{group_counter:02d}")
-                types.append(
-                    cdc.PointType.LANDMARK
-                    if group_name == "L"
-                    else cdc.PointType.UNKNOWN
-                )
-                group_counter += 1
+            # make sure that normal points away from the head's center
+            if np.dot(center - head_cog, normal) < 0:
+                normal *= -1
+
+            sticker_centers.append(center)
+            sticker_normals.append(normal)
+            groups.append(group_name)
+            labels.append(f"{group_name}-{group_counter[group_name]:02d}")
+            types.append(
+                cdc.PointType.LANDMARK if group_name == "L" else cdc.PointType.UNKNOWN
+            )
+            group_counter[group_name] += 1
 
         radii = np.array([circle[2] for circle in detail_circles])
         mean_radius = np.mean(radii)
 
         # Calculate the absolute differences from the mean radius
         differences_from_mean = np.abs(radii - mean_radius)
-        print(differences_from_mean)
-        print(mean_radius)
+        logger.debug(f"mean sticker radius: {mean_radius}")
         sorted_indices = np.argsort(differences_from_mean)
 
         # sorted_indices = sorted_indices[:46]
@@ -389,8 +543,6 @@ class ColoredStickerProcessor(ScanProcessor):
             },
         ).pint.quantify("1")
 
-        print("surface.crs", surface.crs)
-
         if details:
             csdetails = ColoredStickerProcessorDetails(
                 detail_coords,
@@ -4,6 +4,7 @@ import numpy as np
 from numpy.linalg import pinv
 from scipy.optimize import linear_sum_assignment, minimize
 from scipy.spatial import KDTree
+from pqdm.threads import pqdm
 import xarray as xr
 
 import cedalion
@@ -336,6 +337,234 @@ def register_icp(
     # idx_best = np.argmin(losses)
     return losses, trafos
 
+def _fit_similarity(
+    src: np.ndarray,
+    dst: np.ndarray,
+    weights: np.ndarray,
+    scaling: str | None = "iso",
+    ninner: int = 10,
+) -> np.ndarray:
+    """Closed-form fit of dst ~ R S src + t with weighted least squares.
+
+    For scaling None or "iso" the solution is given by the SVD of the weighted cross
+    covariance (Umeyama, 1991). For anisotropic scaling, the rotation and the three
+    scaling factors are updated alternately, each in closed form.
+
+    Args:
+        src: Source points of shape (n, 3).
+        dst: Target points of shape (n, 3).
+        weights: Non-negative weight of each point pair.
+        scaling: None (rigid), "iso" (one scaling factor) or "aniso" (one scaling
+            factor per axis, applied before the rotation).
+        ninner: Number of alternating updates for anisotropic scaling.
+
+    Returns:
+        The 4x4 affine transformation matrix.
+    """
+    w = weights / weights.sum()
+    mu_src = w @ src
+    mu_dst = w @ dst
+    x = src - mu_src
+    y = dst - mu_dst
+
+    def rotation(x, y):
+        cov = (y * w[:, None]).T @ x
+        U, D, Vt = np.linalg.svd(cov)
+        E = np.ones(3)
+        if np.linalg.det(U) * np.linalg.det(Vt) < 0:
+            E[2] = -1
+        return (U * E) @ Vt, D, E
+
+    scale = np.ones(3)
+    R, D, E = rotation(x, y)
+    if scaling == "iso":
+        scale[:] = np.sum(D * E) / np.sum(w @ (x**2))
+    elif scaling == "aniso":
+        for _ in range(ninner):
+            scale = np.sum(w[:, None] * x * (y @ R), axis=0) / (w @ (x**2))
+            R, _, _ = rotation(x * scale, y)
+    elif scaling is not None:
+        raise ValueError(f"unsupported scaling '{scaling}'.")
+
+    M = np.eye(4)
+    M[:3, :3] = R * scale
+    M[:3, 3] = mu_dst - M[:3, :3] @ mu_src
+    return M
+
+
+def _icp(
+    kdtree: KDTree,
+    vertices: np.ndarray,
+    src_landmarks: np.ndarray,
+    dst_landmarks: np.ndarray,
+    points: np.ndarray,
+    M0: np.ndarray,
+    landmark_weight: float,
+    scaling: str | None,
+    max_iterations: int,
+    tolerance: float,
+) -> tuple[np.ndarray, float, int]:
+    """Run ICP from one initial transformation.
+
+    Returns:
+        The transformation, the mean squared distance of the points to their closest
+        vertices and the number of iterations.
+    """
+    src = np.vstack((src_landmarks, points))
+    weights = np.r_[
+        np.full(len(src_landmarks), landmark_weight), np.ones(len(points))
+    ]
+    nlm = len(src_landmarks)
+
+    M = M0
+    last_mse = np.inf
+    iteration = 0
+    for iteration in range(1, max_iterations + 1):
+        transformed = points @ M[:3, :3].T + M[:3, 3]
+        dists, idx = kdtree.query(transformed)
+        mse = np.mean(dists**2)
+
+        # early stopping on the relative improvement of the mean squared distance
+        if np.isfinite(last_mse) and last_mse - mse <= tolerance * last_mse:
+            break
+        last_mse = mse
+
+        dst = np.vstack((dst_landmarks, vertices[idx]))
+        M = _fit_similarity(src, dst, weights, scaling)
+
+    transformed = points @ M[:3, :3].T + M[:3, 3]
+    dists, _ = kdtree.query(transformed)
+    mse = np.mean(dists**2)
+    if nlm > 0:
+        # include the landmark residuals with their weight
+        tlm = src_landmarks @ M[:3, :3].T + M[:3, 3]
+        sse_lm = landmark_weight * np.sum((tlm - dst_landmarks) ** 2)
+        mse = (mse * len(points) + sse_lm) / (len(points) + landmark_weight * nlm)
+
+    return M, mse, iteration
+
+
+@cdc.validate_schemas
+def register_icp_svd(
+    surface: cdc.Surface,
+    landmarks: cdt.LabeledPointCloud,
+    geo3d: cdt.LabeledPointCloud,
+    scaling: str | None = "iso",
+    max_iterations: int = 100,
+    tolerance: float = 1e-6,
+    nrestarts: int = 8,
+    restart_angle: float = 0.2,
+    landmark_weight: float = 1.0,
+    max_jobs: int = 1,
+    seed: int | None = None,
+) -> tuple[cdt.AffineTransform, float]:
+    """Iterative Closest Point registration with closed-form updates.
+
+    In contrast to :func:`register_icp`, each iteration solves the least squares
+    problem for the transformation in closed form (see :func:`_fit_similarity`)
+    instead of running a numerical optimizer. All points of geo3d that are not
+    landmarks are matched to their closest surface vertex, using a KD-tree that is
+    built once. The landmarks that geo3d and landmarks have in common are used as
+    fixed correspondences. Iterations stop when the mean squared distance improves by
+    less than a relative tolerance.
+
+    The first run starts from the landmark-based alignment. Additional runs start
+    from random rotations of it around the center of the transformed points. The
+    transformation with the smallest residual is returned.
+
+    Args:
+        surface: Surface mesh to which to register the points.
+        landmarks: Landmarks on the surface.
+        geo3d: Points to register to the surface. Needs at least 3 landmarks in common
+            with `landmarks`.
+        scaling: None (rigid), "iso" (isotropic scaling) or "aniso" (one scaling
+            factor per axis).
+        max_iterations: Maximum number of iterations per run.
+        tolerance: Relative improvement of the mean squared distance below which a
+            run stops.
+        nrestarts: Total number of runs.
+        restart_angle: Standard deviation in radians of the random rotation angles of
+            the additional runs.
+        landmark_weight: Weight of each landmark correspondence relative to a point
+            matched to the surface.
+        max_jobs: Number of threads that execute runs in parallel.
+        seed: Seed for the random initial rotations.
+
+    Returns:
+        A tuple of the affine transformation from the coordinate system of geo3d to
+        the one of the landmarks and the root mean squared residual distance in mm.
+    """
+    units = "mm"
+    landmarks_mm = landmarks.pint.to(units).pint.dequantify()
+    geo3d_mm = geo3d.pint.to(units).pint.dequantify()
+    vertices_mm = surface.vertices.pint.to(units).pint.dequantify().values
+
+    common_labels = landmarks_mm.points.common_labels(geo3d_mm)
+    if len(common_labels) < 3:
+        raise ValueError("less than 3 common coordinates found")
+
+    src_landmarks = geo3d_mm.sel(label=common_labels).values
+    dst_landmarks = landmarks_mm.sel(label=common_labels).values
+    is_landmark = np.isin(geo3d_mm.label.values, common_labels)
+    points = geo3d_mm.values[~is_landmark]
+
+    kdtree = KDTree(vertices_mm)
+
+    M_lm = _fit_similarity(
+        src_landmarks, dst_landmarks, np.ones(len(src_landmarks)), scaling
+    )
+
+    # draw all initial transformations up front, so that the result does not depend
+    # on the number of jobs
+    rng = np.random.default_rng(seed)
+    center = np.vstack((src_landmarks, points)) @ M_lm[:3, :3].T + M_lm[:3, 3]
+    center = center.mean(axis=0)
+    M0s = [M_lm]
+    for _ in range(nrestarts - 1):
+        angles = rng.normal(scale=restart_angle, size=3)
+        M0s.append(m_trans(center) @ m_rot(angles) @ m_trans(-center) @ M_lm)
+
+    def run(M0):
+        return _icp(
+            kdtree,
+            vertices_mm,
+            src_landmarks,
+            dst_landmarks,
+            points,
+            M0,
+            landmark_weight,
+            scaling,
+            max_iterations,
+            tolerance,
+        )
+
+    if max_jobs == 1:
+        results = [run(M0) for M0 in M0s]
+    else:
+        results = pqdm(
+            M0s, run, n_jobs=max_jobs, exception_behaviour="immediate", disable=True
+        )
+
+    M, mse, _ = min(results, key=lambda r: r[1])
+
+    # convert from the units of geo3d to the units of the landmarks
+    from_units = geo3d.pint.units
+    to_units = landmarks.pint.units
+    f_from = float((1 * from_units).to(units).magnitude)
+    f_to = float((1 * to_units).to(units).magnitude)
+    M = m_scale1([1 / f_to]) @ M @ m_scale1([f_from])
+
+    trafo = cdc.affine_transform_from_numpy(
+        M,
+        from_crs=geo3d.points.crs,
+        to_crs=landmarks.points.crs,
+        from_units=from_units,
+        to_units=to_units,
+    )
+
+    return trafo, float(np.sqrt(mse))
+
+
 #FIXME: returns only indices?
 def icp_with_full_transform(
     opt_centers: cdt.LabeledPointCloud,
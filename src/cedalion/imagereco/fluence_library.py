@@ -0,0 +1,106 @@
+"""On-disk library of single-optode fluence simulations."""
+
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+
+class FluenceLibrary:
+    """Store of MCX fluence volumes that can be shared between probes.
+
+    The fluence caused by one optode depends only on the head volume, the tissue
+    properties, the optode's voxel and direction and the number of simulated photons.
+    Probes that place optodes at the same positions on the same head model can
+    therefore reuse simulations. Each entry is stored as a separate .npy file named
+    after the hash of these inputs.
+
+    Args:
+        directory: Directory in which the fluence volumes are stored. It is created
+            if it does not exist.
+        mmap: If True, fluence volumes are memory-mapped read-only when loaded.
+    """
+
+    def __init__(self, directory: str | Path, mmap: bool = True):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.mmap = mmap
+
+    @staticmethod
+    def key(
+        head_model_hash: str,
+        position: np.ndarray,
+        direction: np.ndarray,
+        tissue_properties: np.ndarray,
+        nphoton: int,
+    ) -> str:
+        """Derive the library key of a single-optode simulation.
+
+        Args:
+            head_model_hash: Hash of the labeled head volume and its voxel geometry.
+            position: Optode position in voxel coordinates (snapped to a voxel).
+            direction: Optode direction in voxel coordinates.
+            tissue_properties: Tissue property table passed to MCX.
+            nphoton: Number of simulated photons.
+
+        Returns:
+            The hex digest identifying the simulation.
+        """
+
+        inputs = {
+            "head_model": head_model_hash,
+            # round to suppress floating point noise from coordinate transforms
+            "position": np.round(np.asarray(position, dtype=float), 6).tolist(),
+            "direction": np.round(np.asarray(direction, dtype=float), 6).tolist(),
+            "tissue_properties": hashlib.sha256(
+                np.ascontiguousarray(tissue_properties, dtype=float)
+            ).hexdigest(),
+            "nphoton": int(nphoton),
+        }
+
+        serialized = json.dumps(inputs, sort_keys=True).encode()
+        return hashlib.sha256(serialized).hexdigest()[:32]
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}.npy"
+
+    def __contains__(self, key: str) -> bool:
+        return self._path(key).exists()
+
+    def __len__(self) -> int:
+        return len(list(self.directory.glob("*.npy")))
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        """Load a fluence volume.
+
+        Args:
+            key: Library key as returned by :meth:`key`.
+
+        Returns:
+            The fluence volume or None if the library contains no entry for key.
+        """
+
+        fname = self._path(key)
+        if not fname.exists():
+            return None
+
+        return np.load(fname, mmap_mode="r" if self.mmap else None)
+
+    def put(self, key: str, fluence: np.ndarray):
+        """Add a fluence volume to the library.
+
+        Args:
+            key: Library key as returned by :meth:`key`.
+            fluence: Fluence volume of one optode.
+        """
+
+        fname = self._path(key)
+        # write to a temporary file first so that concurrent workers never read
+        # an incomplete entry
+        tmp_fname = fname.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp_fname, "wb") as fout:
+            np.save(fout, np.asarray(fluence))
+        os.replace(tmp_fname, fname)
@@ -1,8 +1,13 @@
 from dataclasses import dataclass
+import functools
+import hashlib
+import json
 import logging
 from typing import Optional
 import os.path
+import struct
 import sys
+import zipfile
 
 import numpy as np
 import pandas as pd
@@ -16,7 +21,13 @@ import cedalion.dataclasses as cdc
 from cedalion.geometry.registration import register_trans_rot_isoscale
 import cedalion.typing as cdt
 import cedalion.xrutils as xrutils
-from cedalion.geometry.segmentation import surface_from_segmentation
+from cedalion.geometry.segmentation import (
+    surface_from_segmentation,
+    voxels_from_segmentation,
+)
+from cedalion.imagereco.fluence_library import FluenceLibrary
+from cedalion.imagereco.operators import StackedSensitivityOperator
+from cedalion.imagereco.sparse import SparseAdot
 from cedalion.imagereco.utils import map_segmentation_mask_to_surface
 
 from .tissue_properties import get_tissue_properties
@@ -95,6 +106,7 @@ class TwoSurfaceHeadModel:
         brain_face_count: Optional[int] = 180000,
         scalp_face_count: Optional[int] = 60000,
         fill_holes: bool = False,
+        cache_dir: Optional[str] = None,
     ) -> "TwoSurfaceHeadModel":
         """Constructor from binary masks as gained from segmented MRI scans.
 
@@ -112,8 +124,50 @@ class TwoSurfaceHeadModel:
             brain_face_count (Optional[int]): Number of faces for the brain surface.
             scalp_face_count (Optional[int]): Number of faces for the scalp surface.
             fill_holes (bool): Whether to fill holes in the segmentation masks.
+            cache_dir (Optional[str]): If given, the head model is stored in this
+                directory as a bundle (see :meth:`save_bundle`) keyed by the hashes of
+                the input files and all parameters. Subsequent calls with the same
+                inputs load the bundle instead of rebuilding the head model.
         """
 
+        if cache_dir is not None:
+            cache_key = _head_model_cache_key(
+                segmentation_dir,
+                mask_files,
+                landmarks_ras_file,
+                brain_seg_types=brain_seg_types,
+                scalp_seg_types=scalp_seg_types,
+                smoothing=smoothing,
+                brain_face_count=brain_face_count,
+                scalp_face_count=scalp_face_count,
+                fill_holes=fill_holes,
+            )
+            cache_fn = os.path.join(cache_dir, f"headmodel_{cache_key}.npz")
+
+            if os.path.exists(cache_fn):
+                return cls.load_bundle(cache_fn)
+
+            head_model = cls.from_segmentation(
+                segmentation_dir,
+                mask_files,
+                landmarks_ras_file,
+                brain_seg_types,
+                scalp_seg_types,
+                smoothing,
+                brain_face_count,
+                scalp_face_count,
+                fill_holes,
+            )
+
+            os.makedirs(cache_dir, exist_ok=True)
+            # write to a temporary file first so that concurrent workers never read
+            # an incomplete bundle
+            tmp_fn = f"{cache_fn}.{os.getpid()}.tmp"
+            head_model.save_bundle(tmp_fn)
+            os.replace(tmp_fn, cache_fn)
+
+            return head_model
+
         # load segmentation mask
         segmentation_masks, t_ijk2ras = cedalion.io.read_segmentation_masks(
             segmentation_dir, mask_files
@@ -469,6 +523,189 @@ class TwoSurfaceHeadModel:
         )
 
 
+    def save_bundle(self, fn: str):
+        """Save the head model into a single uncompressed npz file.
+
+        Other than :meth:`save`, all attributes are stored as plain numpy arrays in
+        one file. The arrays are not compressed so that :meth:`load_bundle` can
+        memory-map the segmentation masks.
+
+        Args:
+            fn (str): File name of the bundle.
+
+        Returns:
+            None
+        """
+
+        masks = self.segmentation_masks
+        if isinstance(masks, xr.Dataset):
+            masks = masks.to_dataarray()[0]
+        masks = masks.transpose("segmentation_type", "i", "j", "k")
+
+        arrays = {
+            "segmentation_masks": np.ascontiguousarray(masks.values),
+            "segmentation_type": masks.segmentation_type.values.astype(str),
+            "t_ijk2ras": self.t_ijk2ras.pint.dequantify().values,
+            "t_ijk2ras_dims": np.array(self.t_ijk2ras.dims, dtype=str),
+            "t_ijk2ras_units": np.array(str(self.t_ijk2ras.pint.units)),
+        }
+
+        for name, surface in [("brain", self.brain), ("scalp", self.scalp)]:
+            arrays[f"{name}_vertices"] = np.asarray(surface.mesh.vertices)
+            arrays[f"{name}_faces"] = np.asarray(surface.mesh.faces)
+            arrays[f"{name}_vertex_normals"] = np.asarray(surface.mesh.vertex_normals)
+            arrays[f"{name}_crs"] = np.array(surface.crs)
+            arrays[f"{name}_units"] = np.array(str(surface.units))
+
+        for name, m in [
+            ("voxel_to_vertex_brain", self.voxel_to_vertex_brain),
+            ("voxel_to_vertex_scalp", self.voxel_to_vertex_scalp),
+        ]:
+            m = scipy.sparse.coo_array(m)
+            arrays[f"{name}_data"] = m.data
+            arrays[f"{name}_row"] = m.row
+            arrays[f"{name}_col"] = m.col
+            arrays[f"{name}_shape"] = np.array(m.shape)
+
+        if self.landmarks is not None:
+            landmarks = self.landmarks
+            arrays["landmarks"] = landmarks.pint.dequantify().values
+            arrays["landmarks_label"] = landmarks.label.values.astype(str)
+            arrays["landmarks_type"] = np.array(
+                [t.value for t in landmarks.type.values]
+            )
+            arrays["landmarks_crs"] = np.array(landmarks.points.crs)
+            landmarks_units = landmarks.pint.units
+            if landmarks_units is None:
+                landmarks_units = landmarks.attrs.get("units", "1")
+            arrays["landmarks_units"] = np.array(str(landmarks_units))
+
+        with open(fn, "wb") as fout:
+            np.savez(fout, **arrays)
+
+    @classmethod
+    def load_bundle(cls, fn: str, mmap: bool = True) -> "TwoSurfaceHeadModel":
+        """Load a head model that was saved with :meth:`save_bundle`.
+
+        Args:
+            fn (str): File name of the bundle.
+            mmap (bool): If True, the segmentation masks are memory-mapped read-only
+                instead of being read into memory.
+
+        Returns:
+            TwoSurfaceHeadModel: Loaded head model.
+        """
+
+        with np.load(fn, allow_pickle=False) as npz:
+            arrays = {
+                k: npz[k]
+                for k in npz.files
+                if not (mmap and k == "segmentation_masks")
+            }
+
+        if mmap:
+            masks = _memmap_npz_member(fn, "segmentation_masks")
+        else:
+            masks = arrays["segmentation_masks"]
+
+        segmentation_masks = xr.DataArray(
+            masks,
+            dims=["segmentation_type", "i", "j", "k"],
+            coords={"segmentation_type": arrays["segmentation_type"]},
+        )
+
+        surfaces = {}
+        for name in ["brain", "scalp"]:
+            mesh = trimesh.Trimesh(
+                arrays[f"{name}_vertices"],
+                arrays[f"{name}_faces"],
+                vertex_normals=arrays[f"{name}_vertex_normals"],
+                process=False,
+            )
+            surfaces[name] = cdc.TrimeshSurface(
+                mesh,
+                str(arrays[f"{name}_crs"]),
+                cedalion.units.Unit(str(arrays[f"{name}_units"])),
+            )
+
+        voxel_to_vertex = {}
+        for name in ["voxel_to_vertex_brain", "voxel_to_vertex_scalp"]:
+            voxel_to_vertex[name] = scipy.sparse.coo_array(
+                (
+                    arrays[f"{name}_data"],
+                    (arrays[f"{name}_row"], arrays[f"{name}_col"]),
+                ),
+                shape=tuple(arrays[f"{name}_shape"]),
+            )
+
+        to_crs, from_crs = arrays["t_ijk2ras_dims"]
+        t_ijk2ras = xr.DataArray(
+            arrays["t_ijk2ras"], dims=[str(to_crs), str(from_crs)]
+        ).pint.quantify(str(arrays["t_ijk2ras_units"]))
+        t_ras2ijk = xrutils.pinv(t_ijk2ras)
+
+        if "landmarks" in arrays:
+            landmarks = cdc.build_labeled_points(
+                arrays["landmarks"],
+                crs=str(arrays["landmarks_crs"]),
+                units=str(arrays["landmarks_units"]),
+                labels=list(arrays["landmarks_label"]),
+                types=[cdc.PointType(t) for t in arrays["landmarks_type"]],
+            )
+        else:
+            landmarks = None
+
+        return cls(
+            segmentation_masks=segmentation_masks,
+            brain=surfaces["brain"],
+            scalp=surfaces["scalp"],
+            landmarks=landmarks,
+            t_ijk2ras=t_ijk2ras,
+            t_ras2ijk=t_ras2ijk,
+            voxel_to_vertex_brain=voxel_to_vertex["voxel_to_vertex_brain"],
+            voxel_to_vertex_scalp=voxel_to_vertex["voxel_to_vertex_scalp"],
+        )
+
+    @property
+    def _volume_shape(self) -> tuple[int, int, int]:
+        sizes = self.segmentation_masks.sizes
+        return sizes["i"], sizes["j"], sizes["k"]
+
+    @functools.cached_property
+    def _vertex_to_voxel_scalp(self) -> scipy.sparse.csr_array:
+        """Inverse of voxel_to_vertex_scalp with one CSR row per scalp vertex."""
+        m = scipy.sparse.csr_array(scipy.sparse.coo_array(self.voxel_to_vertex_scalp).T)
+        m.sort_indices()
+        return m
+
+    @functools.cached_property
+    def _scalp_voxel_kdtree(self) -> tuple[np.ndarray, KDTree]:
+        """Coordinates of all scalp voxels and a KDTree over them."""
+        masks = self.segmentation_masks
+        if isinstance(masks, xr.Dataset):
+            masks = masks.to_dataarray()[0]
+        voxels = voxels_from_segmentation(masks, ["scalp"]).voxels
+        return voxels, KDTree(voxels)
+
+    @functools.cached_property
+    def _mcx_inputs(self) -> tuple[np.ndarray, np.ndarray, str]:
+        """Labeled volume, tissue properties and a hash of the simulation geometry.
+
+        These depend only on the head model and are shared by all forward models built
+        on it.
+        """
+
+        volume = self.segmentation_masks.sum("segmentation_type")
+        volume = volume.values.astype(np.uint8)
+        tissue_properties = get_tissue_properties(self.segmentation_masks)
+
+        h = hashlib.sha256()
+        h.update(np.array(volume.shape).tobytes())
+        h.update(np.ascontiguousarray(volume))
+        h.update(np.ascontiguousarray(self.t_ijk2ras.pint.dequantify().values))
+
+        return volume, tissue_properties, h.hexdigest()
+
     # FIXME maybe this should not be in this class, especially since the
     # algorithm is not good.
     @cdc.validate_schemas
@@ -508,61 +745,45 @@ class TwoSurfaceHeadModel:
             cdt.LabeledPointCloud: Points aligned and snapped to the closest scalp
                 voxel.
         """
-        # Align to scalp surface
-        aligned = self.scalp.snap(points)
+        if self.scalp.crs != points.points.crs:
+            raise ValueError("CRS mismatch")
+
+        if self.scalp.units != points.pint.units:
+            raise ValueError("units mismatch")
+
+        points_dq = points.pint.dequantify()
+        _, vertex_indices = self.scalp.kdtree.query(points_dq.values, workers=-1)
+        vertex_pos = self.scalp.mesh.vertices[vertex_indices]
+
+        # Gather the voxels mapping to each snapped scalp vertex from the CSR rows
+        # of the inverse map.
+        vertex_to_voxel = self._vertex_to_voxel_scalp
+        starts = vertex_to_voxel.indptr[vertex_indices]
+        counts = vertex_to_voxel.indptr[vertex_indices + 1] - starts
+
+        owner = np.repeat(np.arange(len(vertex_indices)), counts)
+        offsets = np.arange(counts.sum()) - np.repeat(
+            np.cumsum(counts) - counts, counts
+        )
+        voxel_idx = vertex_to_voxel.indices[np.repeat(starts, counts) + offsets]
+        voxels = np.column_stack(np.unravel_index(voxel_idx, self._volume_shape))
+
+        # Choose the closest voxel for each point. Sorting by (owner, distance) puts
+        # the closest voxel of each point first in its group.
+        dist = np.linalg.norm(voxels - vertex_pos[owner], axis=1)
+        order = np.lexsort((dist, owner))
+        has_voxels = counts > 0
+        first = np.cumsum(counts) - counts
 
-        # Snap to closest scalp voxel
         snapped = np.zeros(points.shape)
-        for i, a in enumerate(aligned):
-
-            # Get index of scalp surface vertex "a"
-            idx = np.argwhere(self.scalp.mesh.vertices == \
-                              np.array(a.pint.dequantify()))
-
-            # Reduce to indices with repitition of 3 (so all coordinates match)
-            if len(idx) > 3:
-                r = [rep[n] for rep in [{}] for i,n in enumerate(idx[:,0]) \
-                           if rep.setdefault(n,[]).append(i) or len(rep[n])==3]
-                idx = idx[r[0]]
-
-            # Make sure only one vertex is found
-            assert len(idx) == 3
-            assert idx[0,0] == idx[1,0] == idx[2,0]
-
-            # Get voxel indices mapping to this scalp vertex
-            vec = np.zeros(self.scalp.nvertices)
-            vec[idx[0,0]] = 1
-            voxel_idx = np.argwhere(self.voxel_to_vertex_scalp @ vec == 1)[:,0]
-
-            if len(voxel_idx) > 0:
-                # Get voxel coordinates from voxel indices
-                try: 
-                    shape = self.segmentation_masks.shape[-3:]
-                except:
-                    shape = self.segmentation_masks.to_dataarray().shape[-3:]
-                voxels = np.array(np.unravel_index(voxel_idx, shape)).T
-
-                # Choose the closest voxel
-                dist = np.linalg.norm(voxels - np.array(a.pint.dequantify()), axis=1)
-                voxel_idx = np.argmin(dist)
+        snapped[has_voxels] = voxels[order[first[has_voxels]]]
 
-            else:
-                # If no voxel maps to that scalp surface vertex, 
-                # simply choose the closest of all scalp voxels
-                voxels = voxels_from_segmentation(self.segmentation_masks, ["scalp"]).voxels
-                if len(voxels) == 0:
-                    try:
-                        scalp_mask = self.segmentation_masks.sel(segmentation_type="scalp").to_dataarray()
-                    except:
-                        scalp_mask = self.segmentation_masks.sel(segmentation_type="scalp")
-                    voxels = np.argwhere(np.array(scalp_mask)[0] > 0.99)
-
-                kdtree = KDTree(voxels)
-                dist, voxel_idx = kdtree.query(self.scalp.mesh.vertices[idx[0,0]],
-                                               workers=-1)
-
-            # Snap to closest scalp voxel 
-            snapped[i] = voxels[voxel_idx]
+        # If no voxel maps to that scalp surface vertex,
+        # simply choose the closest of all scalp voxels
+        if not has_voxels.all():
+            scalp_voxels, kdtree = self._scalp_voxel_kdtree
+            _, nearest = kdtree.query(vertex_pos[~has_voxels], workers=-1)
+            snapped[~has_voxels] = scalp_voxels[nearest]
 
         points.values = snapped
         return points
@@ -625,12 +846,11 @@ class ForwardModel:
         self.optode_pos = self.optode_pos.pint.dequantify()
         self.optode_dir = self.optode_dir.pint.dequantify()
 
-        self.tissue_properties = get_tissue_properties(
-            self.head_model.segmentation_masks
-        )
-
-        self.volume = self.head_model.segmentation_masks.sum("segmentation_type")
-        self.volume = self.volume.values.astype(np.uint8)
+        (
+            self.volume,
+            self.tissue_properties,
+            self._head_model_hash,
+        ) = self.head_model._mcx_inputs
         self.unitinmm = self._get_unitinmm()
 
         self.measurement_list = measurement_list
@@ -722,11 +942,17 @@ class ForwardModel:
 
         return result
 
-    def compute_fluence_mcx(self, nphoton: int = 1e8):
+    def compute_fluence_mcx(
+        self, nphoton: int = 1e8, fluence_library: Optional[FluenceLibrary] = None
+    ):
         """Compute fluence for each channel and wavelength using MCX package.
 
         Args:
             nphoton (int): Number of photons to simulate.
+            fluence_library (Optional[FluenceLibrary]): If given, fluence volumes of
+                optodes that were already simulated at the same voxel and direction on
+                the same head model are taken from the library. Only missing optodes
+                are simulated and added to the library.
 
         Returns:
             xr.DataArray: Fluence in each voxel for each channel and wavelength.
@@ -761,11 +987,29 @@ class ForwardModel:
 
         for i_opt in range(n_optodes):
             label = self.optode_pos.label.values[i_opt]
-            print(f"simulating fluence for {label}. {i_opt+1} / {n_optodes}")
 
-            # run MCX
-            # shape: [i,j,k]
-            fluence = self._get_fluence_from_mcx(i_opt, nphoton=nphoton)
+            fluence = None
+            if fluence_library is not None:
+                key = fluence_library.key(
+                    self._head_model_hash,
+                    self.optode_pos.values[i_opt],
+                    self.optode_dir.values[i_opt],
+                    self.tissue_properties,
+                    nphoton,
+                )
+                fluence = fluence_library.get(key)
+
+            if fluence is None:
+                print(f"simulating fluence for {label}. {i_opt+1} / {n_optodes}")
+
+                # run MCX
+                # shape: [i,j,k]
+                fluence = self._get_fluence_from_mcx(i_opt, nphoton=nphoton)
+
+                if fluence_library is not None:
+                    fluence_library.put(key, fluence)
+            else:
+                print(f"reusing fluence for {label}. {i_opt+1} / {n_optodes}")
 
             # FIXME shortcut: currently tissue props are wavelength independent -> copy
             for i_wl in range(n_wavelength):
@@ -998,13 +1242,22 @@ class ForwardModel:
         )
 
 
-    def compute_sensitivity(self, fluence_all, fluence_at_optodes):
+    def compute_sensitivity(
+        self,
+        fluence_all,
+        fluence_at_optodes,
+        sparse_rtol: Optional[float] = None,
+    ):
         """Compute sensitivity matrix from fluence.
 
         Args:
             fluence_all (xr.DataArray): Fluence in each voxel for each wavelength.
             fluence_at_optodes (xr.DataArray): Fluence at all optode positions for each
                 wavelength.
+            sparse_rtol (Optional[float]): If given, each row of the sensitivity matrix
+                is thresholded right after it was computed and a
+                :class:`cedalion.imagereco.sparse.SparseAdot` is returned. The dense
+                matrix is never materialized. See SparseAdot for the error bound.
 
         Returns:
             xr.DataArray: Sensitivity matrix for each channel, vertex and wavelength.
@@ -1017,6 +1270,44 @@ class ForwardModel:
 
         n_brain = self.head_model.brain.nvertices
         n_scalp = self.head_model.scalp.nvertices
+
+        is_brain = np.zeros((n_brain + n_scalp), dtype=bool)
+        is_brain[:n_brain] = True
+
+        if sparse_rtol is not None:
+
+            def rows():
+                # rows are computed lazily and thresholded one at a time by from_rows
+                for _, r in self.measurement_list.iterrows():
+                    pertubation = (
+                        fluence_all.loc[r.source, r.wavelength]
+                        * fluence_all.loc[r.detector, r.wavelength]
+                    )
+                    pertubation = pertubation.values.flatten()
+                    normfactor = (
+                        fluence_at_optodes.loc[
+                            r.source, r.detector, r.wavelength
+                        ].values
+                        + fluence_at_optodes.loc[
+                            r.detector, r.source, r.wavelength
+                        ].values
+                    ) / 2
+
+                    i_wl = wavelengths.index(r.wavelength)
+                    i_ch = channels.index(r.channel)
+
+                    row = np.concatenate(
+                        [
+                            pertubation @ self.head_model.voxel_to_vertex_brain,
+                            pertubation @ self.head_model.voxel_to_vertex_scalp,
+                        ]
+                    ) / normfactor
+                    yield (i_wl, i_ch), row
+
+            return SparseAdot.from_rows(
+                rows(), channels, wavelengths, is_brain, rtol=sparse_rtol
+            )
+
         Adot_brain = np.zeros((n_channel, n_brain, n_wavelength))
         Adot_scalp = np.zeros((n_channel, n_scalp, n_wavelength))
 
@@ -1044,9 +1335,6 @@ class ForwardModel:
                 pertubation @ self.head_model.voxel_to_vertex_scalp / normfactor
             )
 
-        is_brain = np.zeros((n_brain + n_scalp), dtype=bool)
-        is_brain[:n_brain] = True
-
         # shape [nchannel, nvertices, nwavelength]
         Adot = np.concatenate([Adot_brain, Adot_scalp], axis=1)
 
@@ -1061,37 +1349,133 @@ class ForwardModel:
         )
 
     # FIXME: better name for Adot * ext. coeffs
-    # FIXME: hardcoded for 2 chromophores (HbO and HbR) and wavelengths
     @staticmethod
-    def compute_stacked_sensitivity(sensitivity: xr.DataArray):
-        """Compute stacked HbO and HbR sensitivity matrices from fluence.
+    def compute_stacked_sensitivity(
+        sensitivity: xr.DataArray | SparseAdot,
+        ec: Optional[xr.DataArray] = None,
+    ):
+        """Compute stacked chromophore sensitivity matrices from fluence.
+
+        The stacked matrix has shape (nwavelength * nchannel, nchromo * nvertex). Rows
+        are ordered wavelength-major, columns chromophore-major.
 
         Args:
-            sensitivity (xr.DataArray): Sensitivity matrix for each vertex and
-                wavelength.
+            sensitivity (xr.DataArray | SparseAdot): Sensitivity matrix for each vertex
+                and wavelength.
+            ec (Optional[xr.DataArray]): Extinction coefficients with dimensions
+                (chromo, wavelength). Defaults to the Prahl spectrum for HbO and HbR at
+                the wavelengths of the sensitivity matrix.
 
         Returns:
-            xr.DataArray: Stacked sensitivity matrix for each channel and vertex.
+            xr.DataArray: Stacked sensitivity matrix for each channel and vertex. For
+            a SparseAdot input a scipy.sparse.csr_array with the same layout is
+            returned.
         """
 
+        if ec is None:
+            ec = _prahl_extinction_coefficients(sensitivity)
+
+        if isinstance(sensitivity, SparseAdot):
+            return sensitivity.stacked(ec)
+
         assert "wavelength" in sensitivity.dims
+
+        return StackedSensitivityOperator(sensitivity, ec).to_dense()
+
+    @staticmethod
+    def stacked_sensitivity_operator(
+        sensitivity: xr.DataArray | SparseAdot,
+        ec: Optional[xr.DataArray] = None,
+    ) -> StackedSensitivityOperator:
+        """Matrix-free variant of :meth:`compute_stacked_sensitivity`.
+
+        Args:
+            sensitivity (xr.DataArray | SparseAdot): Sensitivity matrix for each vertex
+                and wavelength.
+            ec (Optional[xr.DataArray]): Extinction coefficients with dimensions
+                (chromo, wavelength). Defaults to the Prahl spectrum for HbO and HbR.
+
+        Returns:
+            StackedSensitivityOperator: A scipy LinearOperator that computes products
+            with the stacked matrix without forming it.
+        """
+
+        if ec is None:
+            ec = _prahl_extinction_coefficients(sensitivity)
+
+        return StackedSensitivityOperator(sensitivity, ec)
+
+
+def _prahl_extinction_coefficients(sensitivity: xr.DataArray | SparseAdot):
+    """HbO and HbR extinction coefficients at the wavelengths of Adot."""
+    if isinstance(sensitivity, SparseAdot):
+        wavelengths = sensitivity.wavelength
+    else:
         wavelengths = sensitivity.wavelength.values
-        assert len(wavelengths) == 2
 
-        ec = cedalion.nirs.get_extinction_coefficients("prahl", wavelengths)
+    return cedalion.nirs.get_extinction_coefficients("prahl", wavelengths)
+
 
-        nchannel = sensitivity.sizes["channel"]
-        nvertices = sensitivity.sizes["vertex"]
-        A = np.zeros((2 * nchannel, 2 * nvertices))
+def _file_sha256(fname: str) -> str:
+    h = hashlib.sha256()
+    with open(fname, "rb") as fin:
+        for chunk in iter(lambda: fin.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
 
-        wl1, wl2 = wavelengths
-        # fmt: off
-        A[:nchannel, :nvertices] = ec.sel(chromo="HbO", wavelength=wl1).values * sensitivity.sel(wavelength=wl1) # noqa: E501
-        A[:nchannel, nvertices:] = ec.sel(chromo="HbR", wavelength=wl1).values * sensitivity.sel(wavelength=wl1) # noqa: E501
-        A[nchannel:, :nvertices] = ec.sel(chromo="HbO", wavelength=wl2).values * sensitivity.sel(wavelength=wl2) # noqa: E501
-        A[nchannel:, nvertices:] = ec.sel(chromo="HbR", wavelength=wl2).values * sensitivity.sel(wavelength=wl2) # noqa: E501
-        # fmt: on
 
-        A = xr.DataArray(A, dims=("flat_channel", "flat_vertex"))
+def _head_model_cache_key(
+    segmentation_dir: str,
+    mask_files: dict[str, str],
+    landmarks_ras_file: Optional[str],
+    **params,
+) -> str:
+    """Hash the contents of all input files and the build parameters."""
+
+    inputs = {
+        "masks": {
+            seg_type: _file_sha256(os.path.join(segmentation_dir, fname))
+            for seg_type, fname in mask_files.items()
+        },
+        "params": {k: str(v) for k, v in params.items()},
+    }
+
+    if landmarks_ras_file is not None:
+        if not os.path.isabs(landmarks_ras_file):
+            landmarks_ras_file = os.path.join(segmentation_dir, landmarks_ras_file)
+        inputs["landmarks"] = _file_sha256(landmarks_ras_file)
 
-        return A
+    serialized = json.dumps(inputs, sort_keys=True).encode()
+    return hashlib.sha256(serialized).hexdigest()[:32]
+
+
+def _memmap_npz_member(fname: str, name: str) -> np.memmap:
+    """Memory-map an array stored uncompressed in an npz file."""
+
+    with zipfile.ZipFile(fname) as zf:
+        info = zf.getinfo(f"{name}.npy")
+        if info.compress_type != zipfile.ZIP_STORED:
+            raise ValueError(f"array '{name}' is compressed and cannot be mapped.")
+
+    with open(fname, "rb") as fin:
+        # skip the zip local file header to reach the .npy payload
+        fin.seek(info.header_offset)
+        header = fin.read(30)
+        fname_len, extra_len = struct.unpack("<HH", header[26:30])
+        fin.seek(info.header_offset + 30 + fname_len + extra_len)
+
+        version = np.lib.format.read_magic(fin)
+        if version == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(fin)
+        else:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(fin)
+        offset = fin.tell()
+
+    return np.memmap(
+        fname,
+        dtype=dtype,
+        mode="r",
+        offset=offset,
+        shape=shape,
+        order="F" if fortran_order else "C",
+    )
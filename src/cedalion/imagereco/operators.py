@@ -0,0 +1,126 @@
+"""Matrix-free representation of the stacked sensitivity matrix."""
+
+import numpy as np
+import scipy.sparse
+import xarray as xr
+from scipy.sparse.linalg import LinearOperator
+
+from cedalion.imagereco.sparse import SparseAdot
+
+
+class StackedSensitivityOperator(LinearOperator):
+    """Stacked sensitivity matrix as a product of extinction coefficients and Adot.
+
+    The stacked matrix maps concentration images of all chromophores to optical
+    densities of all wavelengths. Its entries are
+
+        A[(wl, ch), (chromo, v)] = E[chromo, wl] * Adot[ch, v, wl]
+
+    with rows ordered wavelength-major and columns ordered chromophore-major, i.e. the
+    same layout as :meth:`ForwardModel.compute_stacked_sensitivity`. Instead of
+    materializing this (nwavelength * nchannel, nchromo * nvertex) matrix, products
+    are evaluated block-wise per wavelength: chromophore images are first combined with
+    the extinction coefficients and then multiplied with the single Adot block of that
+    wavelength. Memory usage therefore stays at the size of Adot, independent of the
+    number of wavelengths and chromophores.
+
+    Args:
+        sensitivity (xr.DataArray | SparseAdot): Sensitivity matrix with dimensions
+            (channel, vertex, wavelength).
+        ec (xr.DataArray): Extinction coefficients with dimensions (chromo,
+            wavelength).
+    """
+
+    def __init__(self, sensitivity: xr.DataArray | SparseAdot, ec: xr.DataArray):
+        if ec.pint.units is not None:
+            ec = ec.pint.dequantify()
+
+        if isinstance(sensitivity, SparseAdot):
+            wavelengths = sensitivity.wavelength
+            self._blocks = [sensitivity.wavelength_block(wl) for wl in wavelengths]
+        else:
+            sensitivity = sensitivity.transpose("channel", "vertex", "wavelength")
+            wavelengths = sensitivity.wavelength.values
+            values = sensitivity.values
+            self._blocks = [values[:, :, i_wl] for i_wl in range(len(wavelengths))]
+
+        # shape (nchromo, nwavelength)
+        self.ec = ec.sel(wavelength=wavelengths).transpose("chromo", "wavelength")
+        self._E = self.ec.values
+
+        self.nchannel = sensitivity.sizes["channel"]
+        self.nvertex = sensitivity.sizes["vertex"]
+        self.nwavelength = len(wavelengths)
+        self.nchromo = self.ec.sizes["chromo"]
+
+        super().__init__(
+            dtype=np.float64,
+            shape=(
+                self.nwavelength * self.nchannel,
+                self.nchromo * self.nvertex,
+            ),
+        )
+
+    def _matmat(self, X):
+        X = np.asarray(X).reshape(self.nchromo, self.nvertex, -1)
+        Y = np.empty((self.nwavelength, self.nchannel, X.shape[-1]))
+
+        for i_wl, block in enumerate(self._blocks):
+            # combine the chromophore images first: shape (nvertex, k)
+            Xw = np.tensordot(self._E[:, i_wl], X, axes=1)
+            Y[i_wl] = block @ Xw
+
+        return Y.reshape(self.nwavelength * self.nchannel, -1)
+
+    def _matvec(self, x):
+        return self._matmat(np.reshape(x, (-1, 1))).ravel()
+
+    def _rmatmat(self, Y):
+        Y = np.asarray(Y).reshape(self.nwavelength, self.nchannel, -1)
+        X = np.zeros((self.nchromo, self.nvertex, Y.shape[-1]))
+
+        for i_wl, block in enumerate(self._blocks):
+            T = block.T @ Y[i_wl]
+            X += self._E[:, i_wl, None, None] * T[None, :, :]
+
+        return X.reshape(self.nchromo * self.nvertex, -1)
+
+    def _rmatvec(self, y):
+        return self._rmatmat(np.reshape(y, (-1, 1))).ravel()
+
+    def gram(self) -> np.ndarray:
+        """Compute A @ A.T without forming A.
+
+        The block of wavelengths (wl1, wl2) is (E.T @ E)[wl1, wl2] times
+        Adot[wl1] @ Adot[wl2].T.
+
+        Returns:
+            np.ndarray: Matrix of shape (nwavelength * nchannel, nwavelength *
+            nchannel).
+        """
+        nwl, nch = self.nwavelength, self.nchannel
+        G = self._E.T @ self._E
+        AA = np.empty((nwl, nch, nwl, nch))
+
+        for i in range(nwl):
+            for j in range(i, nwl):
+                block = self._blocks[i] @ self._blocks[j].T
+                if scipy.sparse.issparse(block):
+                    block = block.toarray()
+                AA[i, :, j, :] = G[i, j] * block
+                AA[j, :, i, :] = AA[i, :, j, :].T
+
+        return AA.reshape(nwl * nch, nwl * nch)
+
+    def to_dense(self) -> xr.DataArray:
+        """Materialize the stacked matrix."""
+        A = np.empty((self.nwavelength, self.nchannel, self.nchromo, self.nvertex))
+
+        for i_wl, block in enumerate(self._blocks):
+            if scipy.sparse.issparse(block):
+                block = block.toarray()
+            A[i_wl] = self._E[None, :, i_wl, None] * block[:, None, :]
+
+        A = A.reshape(self.shape)
+        return xr.DataArray(A, dims=("flat_channel", "flat_vertex"))
+
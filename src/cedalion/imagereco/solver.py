@@ -1,23 +1,36 @@
 import numpy as np
+import scipy.sparse
 import xarray as xr
 
+from cedalion.imagereco.operators import StackedSensitivityOperator
+
 
 def pseudo_inverse_stacked(Adot, alpha=0.01):
     """Pseudo-inverse of a stacked matrix.
 
     Args:
-        Adot (xr.DataArray): Stacked matrix.
+        Adot (xr.DataArray | scipy.sparse.sparray | StackedSensitivityOperator):
+            Stacked matrix. Sparse matrices as returned by compute_stacked_sensitivity
+            for a SparseAdot and matrix-free stacked operators are supported.
         alpha (float): Regularization parameter.
 
     Returns:
         xr.DataArray: Pseudo-inverse of the stacked matrix.
     """
-    AA = Adot.values @ Adot.values.T
+    if isinstance(Adot, StackedSensitivityOperator):
+        A = Adot
+        AA = Adot.gram()
+    elif scipy.sparse.issparse(Adot):
+        A = Adot
+        AA = (A @ A.T).toarray()
+    else:
+        A = Adot.values
+        AA = A @ A.T
+
     highest_eigenvalue = np.linalg.eig(AA)[0][0].real
 
-    B = Adot.values.T @ np.linalg.pinv(
-        AA + alpha * highest_eigenvalue * np.eye(AA.shape[0])
-    )
+    M = np.linalg.pinv(AA + alpha * highest_eigenvalue * np.eye(AA.shape[0]))
+    B = np.asarray(A.T @ M)
     B = xr.DataArray(B, dims=("flat_vertex", "flat_channel"))
 
     return B
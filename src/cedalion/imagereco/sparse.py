@@ -0,0 +1,257 @@
+"""Thresholded sparse representation of sensitivity matrices."""
+
+from collections.abc import Iterable, Mapping
+from dataclasses import dataclass
+
+import numpy as np
+import scipy.sparse
+import xarray as xr
+
+
+def _threshold_row(row: np.ndarray, rtol: float):
+    """Drop the smallest entries of a row while keeping the L1 error below rtol.
+
+    Entries are sorted by magnitude and the longest prefix of small entries, whose
+    summed magnitude does not exceed rtol times the L1 norm of the row, is discarded.
+
+    Args:
+        row (np.ndarray): Dense row of the sensitivity matrix.
+        rtol (float): Relative tolerance on the L1 norm of the discarded entries.
+
+    Returns:
+        A tuple (indices, values, dropped, l1) containing the sorted column indices and
+        values of the retained entries, the summed magnitude of the discarded entries
+        and the L1 norm of the row.
+    """
+    magnitude = np.abs(row)
+    order = np.argsort(magnitude, kind="stable")
+    cumsum = np.cumsum(magnitude[order])
+    l1 = cumsum[-1] if len(cumsum) > 0 else 0.0
+
+    ndrop = np.searchsorted(cumsum, rtol * l1, side="right")
+    dropped = cumsum[ndrop - 1] if ndrop > 0 else 0.0
+
+    indices = np.sort(order[ndrop:])
+    indices = indices[row[indices] != 0]
+
+    return indices, row[indices], dropped, l1
+
+
+@dataclass
+class SparseAdot:
+    """Sensitivity matrix stored as a thresholded CSR matrix.
+
+    The dense sensitivity matrix Adot with dimensions (channel, vertex, wavelength) is
+    stored as a single CSR matrix of shape (nwavelength * nchannel, nvertex). Its rows
+    are ordered wavelength-major, i.e. the first nchannel rows belong to the first
+    wavelength. This is the same row layout as the stacked sensitivity matrix.
+
+    Error bound: in each (wavelength, channel) row the discarded entries sum in
+    magnitude to at most ``rtol`` times the L1 norm of that row. Hence, for any vertex
+    image x the channel-space error satisfies
+    ``|(Adot - Adot_sparse) @ x| <= rtol * ||Adot_row||_1 * max|x|``. The exact
+    discarded L1 mass per row is kept in ``dropped_l1``.
+
+    Attributes:
+        matrix (scipy.sparse.csr_array): Sensitivity values of shape
+            (nwavelength * nchannel, nvertex).
+        channel (np.ndarray): Channel labels.
+        wavelength (np.ndarray): Wavelengths.
+        is_brain (np.ndarray): Boolean mask of brain vertices.
+        rtol (float): Relative L1 tolerance used for thresholding.
+        dropped_l1 (np.ndarray): Summed magnitude of the discarded entries for each
+            row, shape (nwavelength, nchannel).
+    """
+
+    matrix: scipy.sparse.csr_array
+    channel: np.ndarray
+    wavelength: np.ndarray
+    is_brain: np.ndarray
+    rtol: float
+    dropped_l1: np.ndarray
+
+    dims = ("channel", "vertex", "wavelength")
+
+    @classmethod
+    def from_rows(
+        cls,
+        rows: Iterable[tuple[tuple[int, int], np.ndarray]]
+        | Mapping[tuple[int, int], np.ndarray],
+        channel: np.ndarray,
+        wavelength: np.ndarray,
+        is_brain: np.ndarray,
+        rtol: float = 1e-3,
+    ) -> "SparseAdot":
+        """Construct from dense rows, thresholding one row at a time.
+
+        Each row is thresholded as soon as it is taken from ``rows`` and only its
+        retained entries are kept. When ``rows`` is a generator, at most one dense row
+        is held in memory at a time.
+
+        Args:
+            rows: Iterable of ((wavelength index, channel index), dense row of length
+                nvertex) pairs, or a mapping with the same keys and values. Missing
+                rows are treated as zero.
+            channel (np.ndarray): Channel labels.
+            wavelength (np.ndarray): Wavelengths.
+            is_brain (np.ndarray): Boolean mask of brain vertices.
+            rtol (float): Relative L1 tolerance for discarded entries per row.
+
+        Returns:
+            SparseAdot: The thresholded sensitivity matrix.
+        """
+        nchannel, nwavelength = len(channel), len(wavelength)
+        nvertex = len(is_brain)
+
+        if isinstance(rows, Mapping):
+            rows = rows.items()
+
+        retained = {}
+        dropped_l1 = np.zeros((nwavelength, nchannel))
+
+        for (i_wl, i_ch), row in rows:
+            idx, val, dropped, _ = _threshold_row(row, rtol)
+            retained[i_wl, i_ch] = (idx, val)
+            dropped_l1[i_wl, i_ch] = dropped
+
+        indptr = np.zeros(nwavelength * nchannel + 1, dtype=np.int64)
+        indices = []
+        values = []
+
+        for i_wl in range(nwavelength):
+            for i_ch in range(nchannel):
+                i_row = i_wl * nchannel + i_ch
+                if (i_wl, i_ch) in retained:
+                    idx, val = retained[i_wl, i_ch]
+                    indices.append(idx)
+                    values.append(val)
+                    indptr[i_row + 1] = indptr[i_row] + len(idx)
+                else:
+                    indptr[i_row + 1] = indptr[i_row]
+
+        matrix = scipy.sparse.csr_array(
+            (
+                np.concatenate(values) if values else np.zeros(0),
+                np.concatenate(indices) if indices else np.zeros(0, dtype=int),
+                indptr,
+            ),
+            shape=(nwavelength * nchannel, nvertex),
+        )
+
+        return cls(
+            matrix=matrix,
+            channel=np.asarray(channel),
+            wavelength=np.asarray(wavelength),
+            is_brain=np.asarray(is_brain, dtype=bool),
+            rtol=rtol,
+            dropped_l1=dropped_l1,
+        )
+
+    @classmethod
+    def from_dense(cls, Adot: xr.DataArray, rtol: float = 1e-3) -> "SparseAdot":
+        """Threshold a dense sensitivity matrix.
+
+        Args:
+            Adot (xr.DataArray): Sensitivity matrix with dimensions (channel, vertex,
+                wavelength) and a boolean coordinate 'is_brain' along 'vertex'.
+            rtol (float): Relative L1 tolerance for discarded entries per row.
+
+        Returns:
+            SparseAdot: The thresholded sensitivity matrix.
+        """
+        values = Adot.transpose("wavelength", "channel", "vertex").values
+        nwavelength, nchannel, _ = values.shape
+
+        rows = (
+            ((i_wl, i_ch), values[i_wl, i_ch])
+            for i_wl in range(nwavelength)
+            for i_ch in range(nchannel)
+        )
+
+        return cls.from_rows(
+            rows,
+            channel=Adot.channel.values,
+            wavelength=Adot.wavelength.values,
+            is_brain=Adot.is_brain.values,
+            rtol=rtol,
+        )
+
+    @property
+    def sizes(self) -> dict[str, int]:
+        return {
+            "channel": len(self.channel),
+            "vertex": len(self.is_brain),
+            "wavelength": len(self.wavelength),
+        }
+
+    @property
+    def nnz(self) -> int:
+        return self.matrix.nnz
+
+    @property
+    def density(self) -> float:
+        """Fraction of retained entries."""
+        return self.nnz / np.prod(self.matrix.shape)
+
+    def wavelength_block(self, wavelength: float) -> scipy.sparse.csr_array:
+        """Sensitivity matrix of shape (nchannel, nvertex) for one wavelength."""
+        i_wl = list(self.wavelength).index(wavelength)
+        nchannel = len(self.channel)
+        return self.matrix[i_wl * nchannel : (i_wl + 1) * nchannel]
+
+    def error_bound(self, image_max: float = 1.0) -> xr.DataArray:
+        """Upper bound of the absolute channel-space error due to thresholding.
+
+        Args:
+            image_max (float): Upper bound of the magnitude of the vertex image that
+                the sensitivity matrix is applied to.
+
+        Returns:
+            xr.DataArray: Error bound with dimensions (channel, wavelength).
+        """
+        return xr.DataArray(
+            self.dropped_l1.T * image_max,
+            dims=["channel", "wavelength"],
+            coords={"channel": self.channel, "wavelength": self.wavelength},
+        )
+
+    def to_dense(self) -> xr.DataArray:
+        """Convert back to a dense (channel, vertex, wavelength) DataArray."""
+        nchannel, nvertex, nwavelength = (self.sizes[d] for d in self.dims)
+        values = self.matrix.toarray().reshape(nwavelength, nchannel, nvertex)
+
+        return xr.DataArray(
+            values.transpose(1, 2, 0),
+            dims=["channel", "vertex", "wavelength"],
+            coords={
+                "channel": ("channel", self.channel),
+                "wavelength": ("wavelength", self.wavelength),
+                "is_brain": ("vertex", self.is_brain),
+            },
+        )
+
+    def stacked(self, ec: xr.DataArray) -> scipy.sparse.csr_array:
+        """Build the sparse stacked sensitivity matrix.
+
+        Args:
+            ec (xr.DataArray): Extinction coefficients with dimensions (chromo,
+                wavelength).
+
+        Returns:
+            scipy.sparse.csr_array: Matrix of shape (nwavelength * nchannel,
+            nchromo * nvertex) with the same block layout as
+            :meth:`ForwardModel.compute_stacked_sensitivity`.
+        """
+        if ec.pint.units is not None:
+            ec = ec.pint.dequantify()
+
+        blocks = [
+            [
+                ec.sel(chromo=chromo, wavelength=wl).item()
+                * self.wavelength_block(wl)
+                for chromo in ec.chromo.values
+            ]
+            for wl in self.wavelength
+        ]
+
+        return scipy.sparse.csr_array(scipy.sparse.bmat(blocks, format="csr"))
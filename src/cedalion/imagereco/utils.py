@@ -4,7 +4,6 @@ import cedalion
 from cedalion import units
 import cedalion.dataclasses as cdc
 import cedalion.typing as cdt
-import cedalion.geometry.segmentation as segm
 from scipy.sparse import coo_array
 import scipy.stats
 
@@ -33,21 +32,26 @@ def map_segmentation_mask_to_surface(
 
     assert surface.crs == transform_vox2ras.dims[0]
 
-    cell_coords = segm.cell_coordinates(segmentation_mask, flat=True)
-    cell_coords = cell_coords.points.apply_transform(transform_vox2ras)
-
-    cell_coords = cell_coords.pint.to(surface.units).pint.dequantify()
-
-    ncells = cell_coords.sizes["label"]
+    mask = np.asarray(segmentation_mask.values)
+    ncells = mask.size
     nvertices = len(surface.vertices)
 
     # find indices of cells that belong to the mask
-    cell_indices = np.flatnonzero(segmentation_mask.values)
+    cell_indices = np.flatnonzero(mask)
 
-    # for each cell query the closests vertex on the surface
-    dists, vertex_indices = surface.kdtree.query(
-        cell_coords.values[cell_indices, :], workers=-1
+    # only masked cells need coordinates. Transform their ijk indices into the
+    # surface's coordinate system.
+    ijk = np.column_stack(np.unravel_index(cell_indices, mask.shape)).astype(float)
+    transform = transform_vox2ras.pint.dequantify().values
+    cell_coords = ijk @ transform[:3, :3].T + transform[:3, 3]
+
+    to_surface_units = (
+        cedalion.Quantity(1, transform_vox2ras.pint.units).to(surface.units).magnitude
     )
+    cell_coords *= to_surface_units
+
+    # for each cell query the closests vertex on the surface
+    dists, vertex_indices = surface.kdtree.query(cell_coords, workers=-1)
 
     # construct a sparse matrix of shape (ncells, nvertices)
     # that maps voxels to cells
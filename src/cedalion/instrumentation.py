@@ -0,0 +1,253 @@
+"""Instrumentation of tasks and pipeline steps.
+
+Calls of functions registered with :func:`cedalion.tasks.task` and steps of
+:mod:`cedalion.pipelines` are measured while a :func:`profile` context is active::
+
+    with cedalion.instrumentation.profile() as prof:
+        job.run(rec)
+
+    prof.to_dataframe()
+    prof.save_trace_events("trace.json")  # open with chrome://tracing or Perfetto
+
+For every call the wall time, CPU time, the increase of the peak resident set size,
+the shapes and dtypes of the input and output arrays and the number of bytes in outputs
+that do not share memory with any input are recorded. Outside of a profile context the
+only overhead is a check of an empty list.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable
+
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+logger = logging.getLogger("cedalion")
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+_active_profiles: list[Profile] = []
+
+
+def _peak_rss() -> int | None:
+    """Peak resident set size of this process in bytes."""
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in kilobytes on Linux and in bytes on macOS
+    return rss if os.uname().sysname == "Darwin" else rss * 1024
+
+
+def _raw_array(array):
+    if isinstance(array, xr.DataArray):
+        array = array.data
+    return getattr(array, "magnitude", array)
+
+
+def _collect_arrays(obj, prefix: str = "") -> dict[str, Any]:
+    """Map names to the arrays contained in obj."""
+    if isinstance(obj, (xr.DataArray, np.ndarray)):
+        return {prefix or "0": obj}
+    if hasattr(obj, "timeseries"):  # Recording
+        return {f"{prefix}{k}": v for k, v in obj.timeseries.items()}
+    if isinstance(obj, (list, tuple)):
+        arrays = {}
+        for i, item in enumerate(obj):
+            arrays.update(_collect_arrays(item, f"{prefix}{i}."))
+        return arrays
+    if isinstance(obj, dict):
+        arrays = {}
+        for k, item in obj.items():
+            if isinstance(item, (xr.DataArray, np.ndarray)):
+                arrays[f"{prefix}{k}"] = item
+        return arrays
+    return {}
+
+
+def _describe(arrays: dict[str, Any]) -> dict[str, dict]:
+    return {
+        name: {"shape": list(np.shape(a)), "dtype": str(getattr(a, "dtype", ""))}
+        for name, a in arrays.items()
+    }
+
+
+def _bytes_copied(inputs: dict[str, Any], outputs: dict[str, Any]) -> int:
+    """Total size of the outputs that do not share memory with any input."""
+    raw_inputs = [_raw_array(a) for a in inputs.values()]
+    raw_inputs = [a for a in raw_inputs if isinstance(a, np.ndarray)]
+
+    nbytes = 0
+    for output in outputs.values():
+        out = _raw_array(output)
+        if not isinstance(out, np.ndarray):
+            continue
+        if not any(np.may_share_memory(out, a) for a in raw_inputs):
+            nbytes += out.nbytes
+    return nbytes
+
+
+class Profile:
+    """Measurements of the calls made while a :func:`profile` context is active.
+
+    Attributes:
+        events: one dict per call with the keys name, kind, start (seconds since the
+            profile was started), wall_time, cpu_time, peak_rss_delta (bytes),
+            bytes_copied, inputs, outputs and thread.
+    """
+
+    def __init__(self):
+        self.events = []
+        self._t0 = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def _add(self, event: dict):
+        with self._lock:
+            self.events.append(event)
+
+    def to_dataframe(self) -> pd.DataFrame:
+        """Return one row per call. Inputs and outputs are omitted."""
+        return pd.DataFrame(
+            self.events,
+            columns=[
+                "name", "kind", "start", "wall_time", "cpu_time", "peak_rss_delta",
+                "bytes_copied",
+            ],
+        )
+
+    def summary(self) -> pd.DataFrame:
+        """Number of calls and total times per name, sorted by total wall time."""
+        df = self.to_dataframe()
+        return (
+            df.groupby(["kind", "name"])[["wall_time", "cpu_time", "bytes_copied"]]
+            .agg(["count", "sum"])
+            .sort_values(("wall_time", "sum"), ascending=False)
+        )
+
+    def to_json(self, fname: str | None = None) -> str:
+        """Serialize all events as JSON and optionally write them to fname."""
+        result = json.dumps(self.events, indent=1)
+        if fname is not None:
+            with open(fname, "w") as fout:
+                fout.write(result)
+        return result
+
+    def trace_events(self) -> list[dict]:
+        """Events in the Trace Event Format of chrome://tracing and Perfetto."""
+        pid = os.getpid()
+        return [
+            {
+                "name": e["name"],
+                "cat": e["kind"],
+                "ph": "X",
+                "ts": e["start"] * 1e6,
+                "dur": e["wall_time"] * 1e6,
+                "pid": pid,
+                "tid": e["thread"],
+                "args": {
+                    k: e[k]
+                    for k in [
+                        "cpu_time", "peak_rss_delta", "bytes_copied", "inputs",
+                        "outputs",
+                    ]
+                },
+            }
+            for e in self.events
+        ]
+
+    def save_trace_events(self, fname: str):
+        with open(fname, "w") as fout:
+            json.dump({"traceEvents": self.trace_events()}, fout)
+
+
+@contextlib.contextmanager
+def profile():
+    """Record all instrumented calls inside the context in a :class:`Profile`."""
+    prof = Profile()
+    _active_profiles.append(prof)
+    try:
+        yield prof
+    finally:
+        _active_profiles.remove(prof)
+
+
+def is_active() -> bool:
+    return len(_active_profiles) > 0
+
+
+def call(name: str, kind: str, func: Callable, *args, **kwargs):
+    """Call func(*args, **kwargs) and record it in all active profiles.
+
+    Args:
+        name: name of the call in the profile, e.g. the task or step name
+        kind: category of the call, e.g. "task" or "pipeline"
+        func: the function to call
+        args, kwargs: the arguments of func
+
+    Returns:
+        the return value of func
+    """
+    if not _active_profiles:
+        return func(*args, **kwargs)
+
+    inputs = {}
+    for i, arg in enumerate(args):
+        inputs.update(_collect_arrays(arg, f"{i}."))
+    for key, arg in kwargs.items():
+        inputs.update(_collect_arrays(arg, f"{key}."))
+    # recordings are modified in place, so remember which arrays they held before
+    input_ids = {id(a) for a in inputs.values()}
+
+    rss_start = _peak_rss()
+    cpu_start = time.process_time()
+    t_start = time.perf_counter()
+
+    result = func(*args, **kwargs)
+
+    wall_time = time.perf_counter() - t_start
+    cpu_time = time.process_time() - cpu_start
+    rss_end = _peak_rss()
+
+    # new arrays in the return value and in recordings that were modified in place
+    outputs = {}
+    if not any(result is arg for arg in args):
+        outputs.update(_collect_arrays(result, "return."))
+    for i, arg in enumerate(args):
+        if hasattr(arg, "timeseries"):
+            outputs.update(_collect_arrays(arg, f"{i}."))
+    outputs = {k: a for k, a in outputs.items() if id(a) not in input_ids}
+
+    event = {
+        "name": name,
+        "kind": kind,
+        "wall_time": wall_time,
+        "cpu_time": cpu_time,
+        "peak_rss_delta": None if rss_start is None else rss_end - rss_start,
+        "bytes_copied": _bytes_copied(inputs, outputs),
+        "inputs": _describe(inputs),
+        "outputs": _describe(outputs),
+        "thread": threading.get_ident(),
+    }
+
+    for prof in list(_active_profiles):
+        prof._add({**event, "start": t_start - prof._t0})
+
+    logger.debug(
+        "%s '%s': %.3f s wall, %.3f s cpu, %d bytes copied",
+        kind,
+        name,
+        wall_time,
+        cpu_time,
+        event["bytes_copied"],
+    )
+
+    return result
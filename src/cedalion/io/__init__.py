@@ -1,6 +1,35 @@
-from .snirf import read_snirf, write_snirf
-from .probe_geometry import read_mrk_json, read_digpts, read_einstar_obj
-from .anatomy import read_segmentation_masks
-from .photogrammetry import read_photogrammetry_einstar, read_einstar, opt_fid_to_xr
-from .forward_model import save_Adot, load_Adot
-from .bids import read_events_from_tsv
+import importlib
+
+# The readers depend on h5py, nibabel, trimesh and others. Each function is imported
+# from its submodule on first access (PEP 562).
+_LAZY_ATTRIBUTES = {
+    "read_snirf": "snirf",
+    "write_snirf": "snirf",
+    "read_mrk_json": "probe_geometry",
+    "read_digpts": "probe_geometry",
+    "read_einstar_obj": "probe_geometry",
+    "read_segmentation_masks": "anatomy",
+    "read_photogrammetry_einstar": "photogrammetry",
+    "read_einstar": "photogrammetry",
+    "opt_fid_to_xr": "photogrammetry",
+    "save_Adot": "forward_model",
+    "load_Adot": "forward_model",
+    "read_events_from_tsv": "bids",
+}
+
+__all__ = list(_LAZY_ATTRIBUTES)
+
+
+def __getattr__(name):
+    if name in _LAZY_ATTRIBUTES:
+        module = importlib.import_module(f"{__name__}.{_LAZY_ATTRIBUTES[name]}")
+        value = getattr(module, name)
+        globals()[name] = value
+        return value
+    if name in set(_LAZY_ATTRIBUTES.values()):
+        return importlib.import_module(f"{__name__}.{name}")
+    raise AttributeError(f"module '{__name__}' has no attribute '{name}'")
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_ATTRIBUTES))
@@ -1,20 +1,27 @@
 import h5py
+import scipy.sparse
 import xarray as xr
 
 import cedalion.dataclasses as cdc
+from cedalion.imagereco.sparse import SparseAdot
 
 
-def save_Adot(fn: str, Adot: xr.DataArray):
+def save_Adot(fn: str, Adot: xr.DataArray | SparseAdot):
     """Save Adot to a netCDF file.
 
     Args:
         fn (str): File name to save the data to.
-        Adot (xr.DataArray): Data to save.
+        Adot (xr.DataArray | SparseAdot): Data to save. Sparse sensitivity matrices are
+            stored as their CSR components.
 
     Returns:
         None
     """
 
+    if isinstance(Adot, SparseAdot):
+        _save_sparse_Adot(fn, Adot)
+        return
+
     Adot.to_netcdf(fn)
     return
 
@@ -25,10 +32,14 @@ def load_Adot(fn: str):
         fn (str): File name to load the data from.
 
     Returns:
-        xr.DataArray: Data loaded from the file.
+        xr.DataArray | SparseAdot: Data loaded from the file. Files written from a
+            SparseAdot are loaded as SparseAdot.
     """
 
     Adot = xr.open_dataset(fn)
+    if Adot.attrs.get("sparse_format") == "csr":
+        return _load_sparse_Adot(Adot)
+
     Adot = xr.DataArray(
             Adot.to_array()[0],
             dims=["channel", "vertex", "wavelength"],
@@ -40,6 +51,41 @@ def load_Adot(fn: str):
     return Adot
 
 
+def _save_sparse_Adot(fn: str, Adot: SparseAdot):
+    matrix = Adot.matrix
+    ds = xr.Dataset(
+        {
+            "data": ("nnz", matrix.data),
+            "indices": ("nnz", matrix.indices),
+            "indptr": ("row_ptr", matrix.indptr),
+            "dropped_l1": (("wavelength", "channel"), Adot.dropped_l1),
+        },
+        coords={
+            "channel": ("channel", Adot.channel),
+            "wavelength": ("wavelength", Adot.wavelength),
+            "is_brain": ("vertex", Adot.is_brain),
+        },
+        attrs={"sparse_format": "csr", "rtol": Adot.rtol},
+    )
+    ds.to_netcdf(fn)
+
+
+def _load_sparse_Adot(ds: xr.Dataset) -> SparseAdot:
+    nrows = ds.sizes["wavelength"] * ds.sizes["channel"]
+    matrix = scipy.sparse.csr_array(
+        (ds["data"].values, ds["indices"].values, ds["indptr"].values),
+        shape=(nrows, ds.sizes["vertex"]),
+    )
+
+    return SparseAdot(
+        matrix=matrix,
+        channel=ds.channel.values,
+        wavelength=ds.wavelength.values,
+        is_brain=ds.is_brain.values.astype(bool),
+        rtol=float(ds.attrs["rtol"]),
+        dropped_l1=ds["dropped_l1"].transpose("wavelength", "channel").values,
+    )
+
 
 def save_fluence(fn : str, fluence_all, fluence_at_optodes):
     """Save forward model computation results.
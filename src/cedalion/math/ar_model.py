@@ -92,3 +92,48 @@ def ar_filter(data,pmax=12):
 
 
 
+def innovation_std(data,pmax=12):
+    """
+    This function estimates the standard deviation of the AR innovations of many time
+    series at once. It is a fast alternative to ar_filter(data).std() for large
+    batches of time series.
+
+    The prediction errors of all model orders up to pmax are computed with Burg's
+    recursion, vectorized over all time series. Unlike the Yule-Walker equations, Burg's
+    method stays accurate for the strongly autocorrelated signals typical of fNIRS. As
+    in bic_arfit, the model order is the last one before the BIC increases for the
+    first time.
+
+    Inputs:
+        data: np.array (time, ...)
+        pmax: int (default=12)
+    Outputs:
+        np.array (...) standard deviation of the innovations 
+    """
+
+    data=np.asarray(data,dtype=float)
+    T=data.shape[0]
+    x=data.reshape(T,-1)
+    x=x-x.mean(axis=0)
+
+    # forward and backward prediction errors
+    ef=x.copy()
+    eb=x.copy()
+
+    sigma2=np.empty((pmax+1,x.shape[1]))
+    sigma2[0]=np.mean(x**2,axis=0)
+    for p in range(1,pmax+1):
+        f=ef[p:]
+        b=eb[p-1:-1]
+        # reflection coefficients
+        k=2*np.sum(f*b,axis=0)/(np.sum(f**2,axis=0)+np.sum(b**2,axis=0))
+        ef[p:],eb[p:]=f-k*b,b-k*f
+        sigma2[p]=np.mean(ef[p:]**2,axis=0)
+
+    # select the order before the first increase of the BIC
+    bic=T*np.log(sigma2)+np.arange(pmax+1)[:,None]*np.log(T)
+    increases=np.diff(bic,axis=0)>0
+    order=np.where(increases.any(axis=0),increases.argmax(axis=0),pmax)
+
+    std=np.sqrt(sigma2[order,np.arange(x.shape[1])])
+    return std.reshape(data.shape[1:])
@@ -1,6 +1,7 @@
 import cedalion.sigproc.frequency as freq
 import xarray as xr
 import cedalion
+import cedalion.xrutils as xrutils
 import numpy as np
 
 units = cedalion.units
@@ -18,11 +19,11 @@ def resample(data,Fs=4):
     """
 
 
-    data2=data.copy()
-    Fs_curr = 1/(data2.time[1]-data2.time[0])
+    Fs_curr = 1/(data.time[1]-data.time[0])
 
-    # STrip off the units to avoid the warning as part of the interp function
-    data2=data2.pint.dequantify()
+    # STrip off the units to avoid the warning as part of the interp function.
+    # Filtering and interpolation return new arrays, so the data need not be copied.
+    data2, data_units = xrutils.strip_units(data)
     if(Fs_curr>Fs):
         # If downsampling, filter at the Nyquist
         data2 = freq.freq_filter(data2,fmin=0*units.Hz,
@@ -35,7 +36,7 @@ def resample(data,Fs=4):
     data2 = data2.interp(time=new_time)
     
     # Fix the unit stripping issue
-    data2=data2.pint.quantify(data.pint.units)
+    data2=xrutils.restore_units(data2, data_units)
     
     return data2
     
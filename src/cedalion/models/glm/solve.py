@@ -6,15 +6,11 @@ import xarray as xr
 
 import cedalion.typing as cdt
 import cedalion.xrutils as xrutils
-import cedalion.dataclasses.statistics
-import statsmodels.regression
-import statsmodels.api
 import pandas as pd
 from scipy.linalg import toeplitz
 
-from pqdm.processes import pqdm
-from tqdm import tqdm
-import cedalion.math.ar_irls
+# statsmodels, pqdm and tqdm are slow to import and only needed for fitting. They are
+# imported in the functions below.
 
 def _hash_channel_wise_regressor(regressor: xr.DataArray) -> list[int]:
     """Hashes each channel slice of the regressor array.
@@ -33,6 +29,10 @@ def _hash_channel_wise_regressor(regressor: xr.DataArray) -> list[int]:
 
 
 def _channel_fit(y,x,noise_model='ols',ar_order=30):
+    import statsmodels.api
+
+    import cedalion.math.ar_irls
+
     if noise_model=='ols':
         ss=statsmodels.api.OLS(y,x).fit()
     elif noise_model=='rls':
@@ -77,13 +77,18 @@ def fit(
         thetas as a DataArray
 
     """
+    from pqdm.processes import pqdm
+    from tqdm import tqdm
+
+    import cedalion.dataclasses.statistics
+
     #if noise_model != "ols":
     #    raise NotImplementedError("support for other noise models is missing")
 
     # FIXME: unit handling?
     # shoud the design matrix be dimensionless? -> thetas will have units
-    ts = ts.pint.dequantify()
-    design_matrix = design_matrix.pint.dequantify()
+    ts, _ = xrutils.strip_units(ts)
+    design_matrix, _ = xrutils.strip_units(design_matrix)
 
     dim3_name = xrutils.other_dim(design_matrix, "time", "regressor")
 
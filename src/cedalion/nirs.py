@@ -1,3 +1,7 @@
+import functools
+import hashlib
+from collections import OrderedDict
+
 import numpy as np
 import xarray as xr
 from numpy.typing import ArrayLike
@@ -47,32 +51,48 @@ def get_extinction_coefficients(spectrum: str, wavelengths: ArrayLike):
             where x is the number of grams per liter. A typical value of x for whole
             blood is x=150 g Hb/liter."
     """
+    wavelengths = np.asarray(wavelengths)
+
+    E = xr.DataArray(
+        _extinction_matrix(spectrum, tuple(wavelengths.tolist())),
+        dims=["chromo", "wavelength"],
+        coords={"chromo": list(_load_spectrum(spectrum)[0]), "wavelength": wavelengths},
+        attrs={"units": "mm^-1 / M"},
+    )
+    E = E.pint.quantify()
+    return E
+
+
+@functools.lru_cache(maxsize=None)
+def _load_spectrum(spectrum: str) -> tuple[tuple[str, ...], tuple[interp1d, ...]]:
+    """Read a tabulated spectrum once and return its chromophores and interpolators."""
     if spectrum == "prahl":
         path = cedalion.data.get("prahl_absorption_spectrum.tsv")
         with path.open("r") as fin:
             coeffs = np.loadtxt(fin, comments="#")
 
-        chromophores = ["HbO", "HbR"]
-        spectra = [
+        chromophores = ("HbO", "HbR")
+        spectra = tuple(
             interp1d(coeffs[:, 0], np.log(10) * coeffs[:, i] / 10) for i in [1, 2]
-        ]  # convert units from cm^-1/ M to mm^-1 / M
+        )  # convert units from cm^-1/ M to mm^-1 / M
 
-        E = np.array([spec(wl) for spec in spectra for wl in wavelengths]).reshape(
-            len(spectra), len(wavelengths)
-        )
-
-        E = xr.DataArray(
-            E,
-            dims=["chromo", "wavelength"],
-            coords={"chromo": chromophores, "wavelength": wavelengths},
-            attrs={"units": "mm^-1 / M"},
-        )
-        E = E.pint.quantify()
-        return E
+        return chromophores, spectra
     else:
         raise ValueError(f"unsupported spectrum '{spectrum}'")
 
 
+@functools.lru_cache(maxsize=128)
+def _extinction_matrix(spectrum: str, wavelengths: tuple[float, ...]) -> np.ndarray:
+    """Extinction coefficients with shape (chromo, wavelength) in mm^-1 / M."""
+    _, spectra = _load_spectrum(spectrum)
+
+    E = np.array([spec(wavelengths) for spec in spectra]).reshape(
+        len(spectra), len(wavelengths)
+    )
+    E.flags.writeable = False
+    return E
+
+
 def channel_distances(amplitudes: xr.DataArray, geo3d: xr.DataArray):
     """Calculate distances between channels.
 
@@ -91,11 +111,23 @@ def channel_distances(amplitudes: xr.DataArray, geo3d: xr.DataArray):
     validators.has_positions(geo3d, npos=3)
     validators.is_quantified(geo3d)
 
-    diff = geo3d.loc[amplitudes.source] - geo3d.loc[amplitudes.detector]
-    dists = xrutils.norm(diff, geo3d.points.crs)
-    dists = dists.rename("dists")
+    # look up positions by integer index instead of label-based .loc selections
+    label_index = {label: i for i, label in enumerate(geo3d.label.values)}
+    src = [label_index[s] for s in amplitudes.source.values]
+    det = [label_index[d] for d in amplitudes.detector.values]
+
+    pos, pos_units = xrutils.strip_units(geo3d.transpose("label", ...))
+    pos = pos.values
+    dists = np.linalg.norm(pos[src] - pos[det], axis=1)
 
-    return dists
+    channel_coords = {
+        name: coord
+        for name, coord in amplitudes.coords.items()
+        if coord.dims == ("channel",)
+    }
+    dists = xr.DataArray(dists, dims="channel", coords=channel_coords, name="dists")
+
+    return xrutils.restore_units(dists, pos_units)
 
 
 def int2od(amplitudes: xr.DataArray):
@@ -137,6 +169,179 @@ def od2int(od: xr.DataArray):
 
 
 
+class MBLLOperator:
+    """Precomputed linear operator of the modified Beer-Lambert law.
+
+    The conversions between optical densities and concentrations are linear and
+    independent for each channel. For a given probe, wavelengths and differential
+    pathlength factors the per-channel matrices are computed once and applied to
+    time series of any length with a single batched matrix product. Since the operator
+    is memoryless, it can be applied to the whole recording or to consecutive blocks of
+    a stream with identical results.
+
+    Args:
+        channels (xr.DataArray, (channel, *)): An array with channel, source and
+            detector coordinates, e.g. the time series to convert.
+        geo3d (xr.DataArray): The 3D coordinates of the optodes.
+        dpf (xr.DataArray, (wavelength, *)): The differential pathlength factors. An
+            additional channel dimension is supported. If the first value is 1, the
+            pathlength is 1 mm instead of the channel distance.
+        spectrum (str, optional): The type of spectrum to use for calculating extinction
+            coefficients. Defaults to "prahl".
+
+    Attributes:
+        channel (np.ndarray): The channel labels in the order of the matrices.
+        wavelength (np.ndarray): The wavelengths in the order of the matrices.
+        chromo (np.ndarray): The chromophores in the order of the matrices.
+        od2conc_matrix (np.ndarray, (channel, chromo, wavelength)): Maps optical
+            densities to concentrations in micromolar.
+        conc2od_matrix (np.ndarray, (channel, wavelength, chromo)): Maps concentrations
+            in molar to optical densities.
+    """
+
+    _cache: OrderedDict = OrderedDict()
+    _cache_size = 32
+
+    def __init__(
+        self,
+        channels: xr.DataArray,
+        geo3d: xr.DataArray,
+        dpf: xr.DataArray,
+        spectrum: str = "prahl",
+    ):
+        validators.has_channel(channels)
+        validators.has_wavelengths(dpf)
+        validators.has_positions(geo3d, npos=3)
+
+        if not set(dpf.dims) <= {"wavelength", "channel"}:
+            raise ValueError("dpf may only have the dimensions wavelength and channel.")
+
+        self.channel = channels.channel.values
+        self.wavelength = dpf.wavelength.values
+        self.chromo = np.asarray(_load_spectrum(spectrum)[0])
+
+        E = _extinction_matrix(spectrum, tuple(self.wavelength.tolist()))  # (q, w)
+
+        dpf, _ = xrutils.strip_units(dpf)
+        if "channel" in dpf.dims:
+            dpf = dpf.sel(channel=self.channel)
+        else:
+            dpf = dpf.expand_dims(channel=len(self.channel))
+        dpf = dpf.transpose("channel", "wavelength").values
+
+        # pathlengths in mm with shape (channel, wavelength)
+        if dpf.flat[0] != 1:
+            dists = channel_distances(channels, geo3d).pint.to("mm").pint.magnitude
+            pathlength = np.asarray(dists)[:, None] * dpf
+        else:
+            pathlength = dpf * 1.0
+
+        Einv = np.linalg.pinv(E)  # (w, q) in mm M
+        self.od2conc_matrix = Einv.T[None, :, :] / pathlength[:, None, :] * 1e6
+        self.conc2od_matrix = E.T[None, :, :] * pathlength[:, :, None]
+
+    @classmethod
+    def for_probe(
+        cls,
+        channels: xr.DataArray,
+        geo3d: xr.DataArray,
+        dpf: xr.DataArray,
+        spectrum: str = "prahl",
+    ) -> "MBLLOperator":
+        """Return a cached operator for the given probe, wavelengths and DPFs.
+
+        The cache is keyed by the content of the arguments, so repeated calls for
+        recordings with the same probe reuse the precomputed matrices.
+        """
+        h = hashlib.sha1()
+        h.update(spectrum.encode())
+        for name in ["channel", "source", "detector"]:
+            h.update(repr(channels[name].values.tolist()).encode())
+        h.update(repr(geo3d.label.values.tolist()).encode())
+        h.update(str(geo3d.pint.units).encode())
+        h.update(np.ascontiguousarray(xrutils.strip_units(geo3d)[0].values).tobytes())
+        h.update(repr(dpf.dims).encode())
+        h.update(repr(dpf.wavelength.values.tolist()).encode())
+        h.update(np.ascontiguousarray(xrutils.strip_units(dpf)[0].values).tobytes())
+        key = h.hexdigest()
+
+        if key in cls._cache:
+            cls._cache.move_to_end(key)
+            return cls._cache[key]
+
+        op = cls(channels, geo3d, dpf, spectrum)
+        cls._cache[key] = op
+        while len(cls._cache) > cls._cache_size:
+            cls._cache.popitem(last=False)
+        return op
+
+    @classmethod
+    def clear_cache(cls):
+        cls._cache.clear()
+
+    def od2conc(self, od: xr.DataArray) -> xr.DataArray:
+        """Convert optical densities with dims (channel, wavelength, *) to µM."""
+        od = self._align(od, "wavelength", self.wavelength)
+        od, od_units = xrutils.strip_units(od)
+
+        other_dims = [d for d in od.dims if d not in ("channel", "wavelength")]
+        x = od.transpose(*other_dims, "channel", "wavelength").values
+        matrix = self.od2conc_matrix
+        if od_units is not None:
+            scale = units.Quantity(1, od_units).to("dimensionless").magnitude
+            matrix = matrix * scale
+
+        # batched (chromo, wavelength) @ (wavelength,) products for each channel
+        conc = np.matmul(matrix, x[..., None])[..., 0]
+
+        coords = {"chromo": self.chromo}
+        coords.update(
+            {k: c for k, c in od.coords.items() if "wavelength" not in c.dims}
+        )
+        conc = xr.DataArray(
+            conc, dims=other_dims + ["channel", "chromo"], coords=coords
+        )
+        conc = conc.transpose("chromo", *[d for d in od.dims if d != "wavelength"])
+        conc = conc.rename("concentration")
+
+        return xrutils.restore_units(conc, units.micromolar)
+
+    def conc2od(self, conc: xr.DataArray) -> xr.DataArray:
+        """Convert concentrations with dims (chromo, channel, *) to optical density."""
+        conc = self._align(conc, "chromo", self.chromo)
+        conc, conc_units = xrutils.strip_units(conc)
+
+        other_dims = [d for d in conc.dims if d not in ("channel", "chromo")]
+        x = conc.transpose(*other_dims, "channel", "chromo").values
+        matrix = self.conc2od_matrix
+        if conc_units is not None:
+            matrix = matrix * units.Quantity(1, conc_units).to("molar").magnitude
+
+        od = np.matmul(matrix, x[..., None])[..., 0]
+
+        coords = {"wavelength": self.wavelength}
+        coords.update(
+            {k: c for k, c in conc.coords.items() if "chromo" not in c.dims}
+        )
+        od = xr.DataArray(
+            od, dims=other_dims + ["channel", "wavelength"], coords=coords
+        )
+        od = od.transpose("wavelength", *[d for d in conc.dims if d != "chromo"])
+
+        return od.rename("optical density")
+
+    def _align(self, array: xr.DataArray, dim: str, values: np.ndarray):
+        if not np.array_equal(array.channel.values, self.channel):
+            array = array.sel(channel=self.channel)
+        if not np.array_equal(array[dim].values, values):
+            array = array.sel({dim: values})
+        return array
+
+
+def _supports_operator(dpf: xr.DataArray) -> bool:
+    return set(dpf.dims) <= {"wavelength", "channel"}
+
+
 def od2conc(
     od: xr.DataArray,
     geo3d: xr.DataArray,
@@ -161,6 +366,10 @@ def od2conc(
     validators.has_wavelengths(dpf)
     validators.has_positions(geo3d, npos=3)
 
+    if _supports_operator(dpf):
+        dpf = dpf.sel(wavelength=od.wavelength.values)
+        return MBLLOperator.for_probe(od, geo3d, dpf, spectrum).od2conc(od)
+
     E = get_extinction_coefficients(spectrum, od.wavelength)
 
     Einv = xrutils.pinv(E)
@@ -175,7 +384,8 @@ def od2conc(
         conc = xr.dot(Einv, od / (dpf * 1*units.mm), dims=["wavelength"])
 
     conc = conc.pint.to("micromolar")
-    conc = conc.pint.quantify({"time": od.time.attrs["units"]})  # got lost in xr.dot
+    # the attributes of the time coordinate got lost in xr.dot
+    conc = conc.assign_coords(time=("time", conc.time.values, od.time.attrs))
     conc = conc.rename("concentration")
 
     return conc
@@ -206,6 +416,9 @@ def conc2od(
     validators.has_wavelengths(dpf)
     validators.has_positions(geo3d, npos=3)
 
+    if _supports_operator(dpf):
+        return MBLLOperator.for_probe(conc, geo3d, dpf, spectrum).conc2od(conc)
+
     conc = conc.pint.to("molar")
     conc = conc.pint.dequantify()
 
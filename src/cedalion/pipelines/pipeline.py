@@ -1,6 +1,204 @@
+import copy
+import enum
+import functools
+import hashlib
+import logging
+import os
+import pickle
+import tempfile
+import types
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+import pint
+import xarray as xr
+
 import cedalion
 import cedalion.dataclasses
 import cedalion.dataclasses.recording
+import cedalion.instrumentation
+
+logger = logging.getLogger("cedalion")
+
+
+def _hash_update(h, obj):
+    """Feed the content of obj into the hash object h."""
+    if isinstance(obj, xr.DataArray):
+        h.update(b"DataArray")
+        _hash_update(h, obj.dims)
+        _hash_update(h, str(obj.pint.units))
+        _hash_update(h, obj.pint.dequantify().values)
+        for name in sorted(obj.coords):
+            _hash_update(h, name)
+            _hash_update(h, obj.coords[name].values)
+    elif isinstance(obj, np.ndarray):
+        h.update(f"ndarray{obj.dtype}{obj.shape}".encode())
+        if obj.dtype == object:
+            _hash_update(h, obj.tolist())
+        else:
+            h.update(np.ascontiguousarray(obj).tobytes())
+    elif isinstance(obj, pint.Quantity):
+        _hash_update(h, str(obj.units))
+        _hash_update(h, np.asarray(obj.magnitude))
+    elif isinstance(obj, pd.DataFrame):
+        _hash_update(h, list(obj.columns))
+        h.update(pd.util.hash_pandas_object(obj, index=True).values.tobytes())
+    elif isinstance(obj, dict):
+        h.update(b"dict")
+        for key in sorted(obj, key=str):
+            _hash_update(h, key)
+            _hash_update(h, obj[key])
+    elif isinstance(obj, (list, tuple)):
+        h.update(f"{type(obj).__name__}{len(obj)}".encode())
+        for item in obj:
+            _hash_update(h, item)
+    elif obj is None or isinstance(obj, (str, bytes, int, float, complex, bool)):
+        h.update(f"{type(obj).__name__}:{obj!r}".encode())
+    elif isinstance(obj, np.generic):
+        _hash_update(h, np.asarray(obj))
+    elif isinstance(obj, (set, frozenset)):
+        h.update(f"{type(obj).__name__}{len(obj)}".encode())
+        for item in sorted(obj, key=repr):
+            _hash_update(h, item)
+    elif isinstance(obj, enum.Enum):
+        h.update(f"{type(obj).__module__}.{type(obj).__qualname__}".encode())
+        _hash_update(h, obj.name)
+    elif isinstance(obj, type):
+        h.update(f"type:{obj.__module__}.{obj.__qualname__}".encode())
+    elif isinstance(obj, types.FunctionType):
+        # functions and lambdas are hashed by their code, defaults and closure. The
+        # values of global variables they reference are not included.
+        h.update(f"function:{obj.__module__}.{obj.__qualname__}".encode())
+        _hash_update(h, obj.__code__)
+        _hash_update(h, obj.__defaults__)
+        _hash_update(h, obj.__kwdefaults__)
+        cells = []
+        for cell in obj.__closure__ or ():
+            try:
+                cells.append(cell.cell_contents)
+            except ValueError:  # empty cell
+                cells.append(None)
+        _hash_update(h, cells)
+    elif isinstance(obj, types.CodeType):
+        h.update(obj.co_code)
+        _hash_update(h, obj.co_consts)
+        _hash_update(h, obj.co_names)
+    elif isinstance(obj, types.MethodType):
+        _hash_update(h, obj.__func__)
+        _hash_update(h, obj.__self__)
+    elif isinstance(obj, types.BuiltinFunctionType):
+        h.update(f"builtin:{obj.__module__}.{obj.__qualname__}".encode())
+    elif isinstance(obj, functools.partial):
+        h.update(b"partial")
+        _hash_update(h, obj.func)
+        _hash_update(h, obj.args)
+        _hash_update(h, obj.keywords)
+    elif hasattr(obj, "__dict__"):
+        # e.g. basis functions passed as options
+        h.update(f"{type(obj).__module__}.{type(obj).__qualname__}".encode())
+        _hash_update(h, vars(obj))
+    else:
+        raise TypeError(f"cannot hash objects of type {type(obj)} by content.")
+
+
+def hash_recording(rec) -> str:
+    """Content hash of the timeseries, masks, geometry and stimuli of a recording."""
+    h = hashlib.sha1()
+    for name in ["timeseries", "masks", "aux_ts"]:
+        _hash_update(h, dict(getattr(rec, name)))
+    _hash_update(h, rec.geo3d)
+    _hash_update(h, rec.geo2d)
+    _hash_update(h, rec.stim)
+    return h.hexdigest()
+
+
+class StepCache:
+    """Memoizes the results of pipeline steps.
+
+    Entries are keyed by a hash of the pipeline input and of the type, input, output
+    and options of all steps up to the cached one. The least recently used entries are
+    evicted once maxsize entries are held in memory. If a directory is given, entries
+    are also pickled there and reused across processes and sessions; the disk cache is
+    limited to max_disk_entries files.
+
+    Args:
+        maxsize: maximum number of results held in memory
+        directory: optional directory for on-disk caching
+        max_disk_entries: maximum number of files in directory
+    """
+
+    def __init__(self, maxsize: int = 16, directory: str | None = None,
+                 max_disk_entries: int = 256):
+        self.maxsize = maxsize
+        self.directory = directory
+        self.max_disk_entries = max_disk_entries
+        self._entries = OrderedDict()
+
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.pkl")
+
+    def get(self, key):
+        """Return a copy of the cached recording for key or None."""
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            return copy.deepcopy(self._entries[key])
+
+        if self.directory is not None and os.path.exists(self._path(key)):
+            with open(self._path(key), "rb") as fin:
+                rec = pickle.load(fin)
+            os.utime(self._path(key))
+            self._store(key, rec)
+            return copy.deepcopy(rec)
+
+        return None
+
+    def put(self, key, rec):
+        """Store a copy of rec under key."""
+        rec = copy.deepcopy(rec)
+        self._store(key, rec)
+
+        if self.directory is not None:
+            # write to a temporary file first so that concurrent readers never see
+            # an incomplete pickle
+            fd, tmp_fn = tempfile.mkstemp(suffix=".tmp", dir=self.directory)
+            try:
+                with os.fdopen(fd, "wb") as fout:
+                    pickle.dump(rec, fout)
+                os.replace(tmp_fn, self._path(key))
+            except BaseException:
+                os.remove(tmp_fn)
+                raise
+            self._evict_disk()
+
+    def _store(self, key, rec):
+        self._entries[key] = rec
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def _evict_disk(self):
+        files = [
+            os.path.join(self.directory, f)
+            for f in os.listdir(self.directory)
+            if f.endswith(".pkl")
+        ]
+        if len(files) <= self.max_disk_entries:
+            return
+        files.sort(key=os.path.getmtime)
+        for fname in files[: len(files) - self.max_disk_entries]:
+            os.remove(fname)
+
+    def clear(self):
+        """Remove all entries from memory and disk."""
+        self._entries.clear()
+        if self.directory is not None:
+            for f in os.listdir(self.directory):
+                if f.endswith(".pkl"):
+                    os.remove(os.path.join(self.directory, f))
 
 def PipelineList(steps):
     job = None
@@ -12,6 +210,9 @@ def PipelineList(steps):
 
 
 class cedalion_module:
+    # set by enable_cache() on all steps of a pipeline
+    cache = None
+
     def __init__(self,previous_job=None):
         self.name = "default pipeline"
         self._cite=None
@@ -41,13 +242,95 @@ class cedalion_module:
         return (str)
     """         
 
+    def steps(self):
+        """Return the steps of the pipeline ending with this one in execution order."""
+        if(self.previous_job is None):
+            return [self]
+        return self.previous_job.steps() + [self]
+
+    def step_key(self, input_key):
+        """Hash of this step's configuration and the key of its input."""
+        h = hashlib.sha1(input_key.encode())
+        _hash_update(h, f"{type(self).__module__}.{type(self).__qualname__}")
+        _hash_update(h, self.inputName)
+        _hash_update(h, self.outputName)
+        try:
+            _hash_update(h, self.options)
+        except RecursionError:
+            # objects hashed through their __dict__ may reference themselves
+            raise TypeError("cannot hash self-referencing options by content.")
+        return h.hexdigest()
+
+    def enable_cache(self, cache=None):
+        """Memoize the results of all steps of this pipeline.
+
+        When the pipeline is run again on the same data, only the steps whose options
+        (or whose predecessors' options) changed are executed.
+
+        Args:
+            cache: a StepCache shared by all steps. A new in-memory cache is created
+                if None.
+        """
+        if cache is None:
+            cache = StepCache()
+        for step in self.steps():
+            step.cache = cache
+        return cache
+
+    def disable_cache(self):
+        for step in self.steps():
+            step.cache = None
+
     def run(self,rec):
+        if(self.cache is not None):
+            return self._run_cached(rec)
+
         # Make sure all previous jobs are run
         if(self.previous_job is None):
             # This is the first module on a pipeline run it
-            return self._runlocal(rec)
+            return self._run_instrumented(rec)
+        else:
+            return self._run_instrumented(self.previous_job.run(rec))
+
+    def _run_cached(self,rec):
+        steps = self.steps()
+        keys = []
+        key = hash_recording(rec)
+        for step in steps:
+            try:
+                key = step.step_key(key)
+            except TypeError as e:
+                # this and all following steps depend on options that cannot be
+                # hashed by content and are not cached
+                logger.warning(
+                    f"not caching step '{step.name}' and its successors: {e}"
+                )
+                break
+            keys.append(key)
+
+        # resume after the last step with a cached result. The input is copied so that
+        # it can be reused with the same key.
+        start = 0
+        for i in range(len(keys) - 1, -1, -1):
+            cached = self.cache.get(keys[i])
+            if cached is not None:
+                rec = cached
+                start = i + 1
+                break
         else:
-            return self._runlocal(self.previous_job.run(rec))
+            rec = copy.deepcopy(rec)
+
+        for i, step in enumerate(steps[start:], start):
+            rec = step._run_instrumented(rec)
+            if i < len(keys):
+                self.cache.put(keys[i], rec)
+
+        return rec
+
+    def _run_instrumented(self,rec):
+        return cedalion.instrumentation.call(
+            self.name, "pipeline", self._runlocal, rec
+        )
 
     def _runlocal(self,rec):
         # Do the actual job
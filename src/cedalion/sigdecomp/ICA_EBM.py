@@ -3,6 +3,8 @@ This code is based on converted matlab versions provided by the MLSP Lab at the
 which is available here: https://mlsp.umbc.edu/resources.html.
 """  # noqa: D205
 
+import functools
+
 import scipy.io
 import numpy as np
 import matplotlib.pyplot as plt 
@@ -51,15 +53,7 @@ def ICA_EBM(X: np.ndarray) -> np.ndarray:
     show_cost = False    # show the cost values vs. iterations at each stage if show_cost== True  - not implemented yet 
 
     # Load 8 measuring functions. But we only use 4 of them.
-    K = 8
-    
-    # table = np.load('measfunc_table.npy', allow_pickle= True)
-    
-    file_path = cedalion.data.get("measfunc_table.npy")
-    table = np.load(file_path, allow_pickle=True) 
-        
-    nf1, nf2, nf3, nf4, nf5, nf6, nf7, nf8 = table[0], table[1], table[2], table[3], table[4], table[5], table[6], table[7]
-
+    nf1, nf2, nf3, nf4, nf5, nf6, nf7, nf8 = load_measfunc_table()
 
     N = X.shape[0]
     T = X.shape[1]
@@ -77,72 +71,11 @@ def ICA_EBM(X: np.ndarray) -> np.ndarray:
     negentropy_array = np.zeros((N,1 ))  
     for iter in range(max_iter_fastica): 
         Y = np.copy(W.dot(X))
-        for n in range(N): 
-            y = np.copy(Y[n, :])
-            # evaluate the upper bound of negentropy of the nth component 
-            NE_Bound = np.zeros((K, 1)) 
-            EGx = np.zeros((K, 1))  
-            # we only need to calculate these quantities once 
-            yy = y* y 
-            sign_y = np.sign(y) 
-            abs_y = np.abs(y)  
-            inv_pabs_y = 1/(1 + abs_y)
-            inv_pabs_yy = 1/(1+ yy)
-            inv_p10abs_y = 1/(10+abs_y)
-
-            # G1(x) = x^4
-            EGx[0] = np.sum(yy*yy)/T
-            if EGx[0] < nf1['min_EGx']:
-                NE_Bound[0] = simplified_ppval(nf1['pp_slope'], nf1['min_EGx'] ) * (EGx[0] - nf1['min_EGx']) 
-                NE_Bound[0] = simplified_ppval(nf1['pp'],nf1['min_EGx'])  + np.abs(NE_Bound[0] )
-            else:
-                if EGx[0] > nf1['max_EGx']:
-                    NE_Bound[0] = 0 
-                else:
-                    NE_Bound[0] = simplified_ppval(nf1['pp'], EGx[0] )  
-
-            # G3(x) = np.abs(x)/ (1 + np.abs(x))
-            EGx[2] = 1 - np.sum(inv_pabs_y)/T
-            if EGx[2] < nf3['min_EGx']: 
-                NE_Bound[2] = simplified_ppval(nf3['pp_slope'], nf3['min_EGx'] ) * (EGx[2] - nf3['min_EGx'])
-                NE_Bound[2] = simplified_ppval(nf3['pp'], nf3['min_EGx']) + np.abs(NE_Bound[2]) 
-            else:
-                if EGx[2] > nf3['max_EGx']:
-                    NE_Bound[2] = simplified_ppval(nf3['pp_slope'], nf3['max_EGx'] ) * (EGx[2] - nf3['max_EGx'])    
-                    NE_Bound[2] = simplified_ppval(nf3['pp'], nf3['max_EGx']) + np.abs(NE_Bound[2])
-
-                else:
-                    NE_Bound[2] = simplified_ppval(nf3['pp'], EGx[2] )
-
-            # G5(x)  = x* np.abs(x) /(10 + np.abs(x))   
-            EGx[4] = np.sum( y * abs_y * inv_p10abs_y )/T
-            if EGx[4] < nf5['min_EGx']:
-                NE_Bound[4] = simplified_ppval(nf5['pp_slope'], nf5['min_EGx'] ) * (EGx[4] - nf5['min_EGx']) 
-                NE_Bound[4] = simplified_ppval(nf5['pp'], nf5['min_EGx']) + np.abs(NE_Bound[4])
-            else:
-                if EGx[4] > nf5['max_EGx']:
-                    NE_Bound[4] = simplified_ppval(nf5['pp_slope'], nf5['max_EGx'] ) * (EGx[4] - nf5['max_EGx'])    
-                    NE_Bound[4] = simplified_ppval(nf5['pp'], nf5['max_EGx']) + np.abs(NE_Bound[4])
-                else:
-                    NE_Bound[4] = simplified_ppval(nf5['pp'], EGx[4] )
-
-            # G7(x) =  x / (1 + x**2)
-            EGx[6] = np.sum(y*inv_pabs_yy)/T    
-            if EGx[6] < nf7['min_EGx']: 
-                NE_Bound[6] = simplified_ppval(nf7['pp_slope'], nf7['min_EGx'] ) * (EGx[6] - nf7['min_EGx'])
-                NE_Bound[6] = simplified_ppval(nf7['pp'], nf7['min_EGx']) + np.abs(NE_Bound[6])
-            else:
-                if EGx[6] > nf7['max_EGx']:
-                    NE_Bound[6] = simplified_ppval(nf7['pp_slope'], nf7['max_EGx'] ) * (EGx[6] - nf7['max_EGx'])    
-                    NE_Bound[6] = simplified_ppval(nf7['pp'], nf7['max_EGx']) + np.abs(NE_Bound[6])
-                else:
-                    NE_Bound[6] = simplified_ppval(nf7['pp'], EGx[6] )
-
-            # select the tightest upper bound
-            max_NE, max_i = np.max(NE_Bound), np.argmax(NE_Bound)   
-            negentropy_array[n] = np.copy(max_NE)  
-            Cost[iter] = np.copy(Cost[iter] - max_NE)
-
+        # evaluate the upper bounds of negentropy of all components and
+        # select the tightest upper bound of each
+        EGx, NE_Bound = negentropy_bounds(Y)
+        negentropy_array[:, 0] = np.max(NE_Bound, axis=0)
+        Cost[iter] = -np.sum(negentropy_array)
 
         if Cost[iter] < min_cost:
             min_cost = np.copy(Cost[iter])
@@ -186,13 +119,13 @@ def ICA_EBM(X: np.ndarray) -> np.ndarray:
     negentropy_array = np.zeros((N, 1))  
     for iter in range(max_iter_orth):   
         Y = np.copy(W.dot(X))  
+        # evaluate the upper bounds of negentropy of all components at once
+        EGx_all, NE_Bound_all = negentropy_bounds(Y)
         for n in range(N):  
             w = np.copy(W[n, :].T)
             y = np.copy(Y[n, :] )
+            EGx = EGx_all[:, n]
 
-            # evaluate the upper bound of negentropy of the nth component   
-            NE_Bound = np.zeros((K, 1))
-            EGx = np.zeros((K, 1))  
             # we only need to calculate these quantities once   
             yy = y* y   
             sign_y = np.sign(y)
@@ -201,56 +134,8 @@ def ICA_EBM(X: np.ndarray) -> np.ndarray:
             inv_pabs_yy = 1/(1+ yy) 
             inv_p10abs_y = 1/(10+abs_y) 
 
-            # G1(x) = x^4
-            EGx[0] = np.sum(yy*yy)/T 
-            if EGx[0] < nf1['min_EGx']:
-                NE_Bound[0] = simplified_ppval(nf1['pp_slope'], nf1['min_EGx'] ) * (EGx[0] - nf1['min_EGx']) 
-                NE_Bound[0] = simplified_ppval(nf1['pp'],nf1['min_EGx'])  + np.abs(NE_Bound[0] )
-            else:
-                if EGx[0] > nf1['max_EGx']:
-                    NE_Bound[0] = 0 
-                else:
-                    NE_Bound[0] = simplified_ppval(nf1['pp'], EGx[0] )  
-
-            # G3(x) = np.abs(x)/ (1 + np.abs(x))
-            EGx[2] = 1 - np.sum(inv_pabs_y)/T
-            if EGx[2] < nf3['min_EGx']: 
-                NE_Bound[2] = simplified_ppval(nf3['pp_slope'], nf3['min_EGx'] ) * (EGx[2] - nf3['min_EGx'])
-                NE_Bound[2] = simplified_ppval(nf3['pp'], nf3['min_EGx']) + np.abs(NE_Bound[2]) 
-            else:
-                if EGx[2] > nf3['max_EGx']:
-                    NE_Bound[2] = simplified_ppval(nf3['pp_slope'], nf3['max_EGx'] ) * (EGx[2] - nf3['max_EGx'])    
-                    NE_Bound[2] = simplified_ppval(nf3['pp'], nf3['max_EGx']) + np.abs(NE_Bound[2])
-
-                else:
-                    NE_Bound[2] = simplified_ppval(nf3['pp'], EGx[2] )
-
-            # G5(x)  = x* np.abs(x) /(10 + np.abs(x))   
-            EGx[4] = np.sum( y * abs_y * inv_p10abs_y )/T
-            if EGx[4] < nf5['min_EGx']:
-                NE_Bound[4] = simplified_ppval(nf5['pp_slope'], nf5['min_EGx'] ) * (EGx[4] - nf5['min_EGx']) 
-                NE_Bound[4] = simplified_ppval(nf5['pp'], nf5['min_EGx']) + np.abs(NE_Bound[4])
-            else:
-                if EGx[4] > nf5['max_EGx']:
-                    NE_Bound[4] = simplified_ppval(nf5['pp_slope'], nf5['max_EGx'] ) * (EGx[4] - nf5['max_EGx'])    
-                    NE_Bound[4] = simplified_ppval(nf5['pp'], nf5['max_EGx']) + np.abs(NE_Bound[4])
-                else:
-                    NE_Bound[4] = simplified_ppval(nf5['pp'], EGx[4] )
-
-            # G7(x) =  x / (1 + x**2)
-            EGx[6] = np.sum(y*inv_pabs_yy)/T   
-            if EGx[6] < nf7['min_EGx']: 
-                NE_Bound[6] = simplified_ppval(nf7['pp_slope'], nf7['min_EGx'] ) * (EGx[6] - nf7['min_EGx'])
-                NE_Bound[6] = simplified_ppval(nf7['pp'], nf7['min_EGx']) + np.abs(NE_Bound[6])
-            else:
-                if EGx[6] > nf7['max_EGx']:
-                    NE_Bound[6] = simplified_ppval(nf7['pp_slope'], nf7['max_EGx'] ) * (EGx[6] - nf7['max_EGx'])    
-                    NE_Bound[6] = simplified_ppval(nf7['pp'], nf7['max_EGx']) + np.abs(NE_Bound[6])
-                else:
-                    NE_Bound[6] = simplified_ppval(nf7['pp'], EGx[6] )
-
             # select the tightest upper bound
-            max_NE, max_i = np.max(NE_Bound), np.argmax(NE_Bound)   
+            max_NE, max_i = np.max(NE_Bound_all[:, n]), np.argmax(NE_Bound_all[:, n])
             negentropy_array[n] = np.copy(max_NE)
             Cost[iter] = np.copy(Cost[iter] - max_NE)
 
@@ -358,127 +243,10 @@ def ICA_EBM(X: np.ndarray) -> np.ndarray:
 
                     yr1 = (ym + yn)/ np.sqrt(2)
                     yr2 = (ym - yn)/ np.sqrt(2) 
-                    y = np.copy(yr1)
-                    # we only need to calculate these quantities once
-                    yy = y* y   
-                    sign_y = np.sign(y)
-                    abs_y = np.abs(y)
-                    inv_pabs_y = 1/(1 + abs_y)  
-                    inv_pabs_yy = 1/(1+ yy) 
-                    inv_p10abs_y = 1/(10+abs_y) 
-
-                    # G1(x) = x^4   
-                    EGx[0] = np.sum(yy*yy)/T    
-                    if EGx[0] < nf1['min_EGx']: 
-                        NE_Bound[0] = simplified_ppval(nf1['pp_slope'], nf1['min_EGx'] ) * (EGx[0] - nf1['min_EGx']) 
-                        NE_Bound[0] = simplified_ppval(nf1['pp'],nf1['min_EGx'])  + np.abs(NE_Bound[0] )   
-                    else:
-                        if EGx[0] > nf1['max_EGx']:
-                            NE_Bound[0] = 0 
-                        else:
-                            NE_Bound[0] = simplified_ppval(nf1['pp'], EGx[0] )  
-
-                    # G3(x) = np.abs(x)/ (1 + np.abs(x))
-                    EGx[2] = 1 - np.sum(inv_pabs_y)/T
-                    if EGx[2] < nf3['min_EGx']: 
-                        NE_Bound[2] = simplified_ppval(nf3['pp_slope'], nf3['min_EGx'] ) * (EGx[2] - nf3['min_EGx'])
-                        NE_Bound[2] = simplified_ppval(nf3['pp'], nf3['min_EGx']) + np.abs(NE_Bound[2]) 
-                    else:
-                        if EGx[2] > nf3['max_EGx']:
-                            NE_Bound[2] = simplified_ppval(nf3['pp_slope'], nf3['max_EGx'] ) * (EGx[2] - nf3['max_EGx'])    
-                            NE_Bound[2] = simplified_ppval(nf3['pp'], nf3['max_EGx']) + np.abs(NE_Bound[2])
-
-                        else:
-                            NE_Bound[2] = simplified_ppval(nf3['pp'], EGx[2] )
-
-                    # G5(x)  = x* np.abs(x) /(10 + np.abs(x))   
-                    EGx[4] = np.sum( y * abs_y * inv_p10abs_y )/T
-                    if EGx[4] < nf5['min_EGx']:
-                        NE_Bound[4] = simplified_ppval(nf5['pp_slope'], nf5['min_EGx'] ) * (EGx[4] - nf5['min_EGx']) 
-                        NE_Bound[4] = simplified_ppval(nf5['pp'], nf5['min_EGx']) + np.abs(NE_Bound[4])
-                    else:
-                        if EGx[4] > nf5['max_EGx']:
-                            NE_Bound[4] = simplified_ppval(nf5['pp_slope'], nf5['max_EGx'] ) * (EGx[4] - nf5['max_EGx'])    
-                            NE_Bound[4] = simplified_ppval(nf5['pp'], nf5['max_EGx']) + np.abs(NE_Bound[4])
-                        else:
-                            NE_Bound[4] = simplified_ppval(nf5['pp'], EGx[4] )
-
-                    # G7(x) =  x / (1 + x**2)
-                    EGx[6] = np.sum(y*inv_pabs_yy)/T    
-                    if EGx[6] < nf7['min_EGx']: 
-                        NE_Bound[6] = simplified_ppval(nf7['pp_slope'], nf7['min_EGx'] ) * (EGx[6] - nf7['min_EGx'])
-                        NE_Bound[6] = simplified_ppval(nf7['pp'], nf7['min_EGx']) + np.abs(NE_Bound[6])
-                    else:
-                        if EGx[6] > nf7['max_EGx']:
-                            NE_Bound[6] = simplified_ppval(nf7['pp_slope'], nf7['max_EGx'] ) * (EGx[6] - nf7['max_EGx'])    
-                            NE_Bound[6] = simplified_ppval(nf7['pp'], nf7['max_EGx']) + np.abs(NE_Bound[6])
-                        else:
-                            NE_Bound[6] = simplified_ppval(nf7['pp'], EGx[6] )
-
-                    # select the tightest upper bound
-                    max_NE, max_i = np.max(NE_Bound), np.argmax(NE_Bound)   
-                    negentropy1 = max_NE
-
-                    y = np.copy(yr2)  
-                    # we only need to calculate these quantities once
-                    yy = y* y   
-                    sign_y = np.sign(y)
-                    abs_y = np.abs(y)
-                    inv_pabs_y = 1/(1 + abs_y)  
-                    inv_pabs_yy = 1/(1+ yy) 
-                    inv_p10abs_y = 1/(10+abs_y) 
-
-                    # G1(x) = x^4   
-                    EGx[0] = np.sum(yy*yy)/T  
-                    if EGx[0] < nf1['min_EGx']: 
-                        NE_Bound[0] = simplified_ppval(nf1['pp_slope'], nf1['min_EGx'] ) * (EGx[0] - nf1['min_EGx']) 
-                        NE_Bound[0] = simplified_ppval(nf1['pp'],nf1['min_EGx'])  + np.abs(NE_Bound[0] )  
-                    else:
-                        if EGx[0] > nf1['max_EGx']:
-                            NE_Bound[0] = 0 
-                        else:
-                            NE_Bound[0] = simplified_ppval(nf1['pp'], EGx[0] ) 
-
-                    # G3(x) = np.abs(x)/ (1 + np.abs(x))
-                    EGx[2] = 1 - np.sum(inv_pabs_y)/T
-                    if EGx[2] < nf3['min_EGx']: 
-                        NE_Bound[2] = simplified_ppval(nf3['pp_slope'], nf3['min_EGx'] ) * (EGx[2] - nf3['min_EGx'])
-                        NE_Bound[2] = simplified_ppval(nf3['pp'], nf3['min_EGx']) + np.abs(NE_Bound[2]) 
-                    else:
-                        if EGx[2] > nf3['max_EGx']:
-                            NE_Bound[2] = simplified_ppval(nf3['pp_slope'], nf3['max_EGx'] ) * (EGx[2] - nf3['max_EGx'])    
-                            NE_Bound[2] = simplified_ppval(nf3['pp'], nf3['max_EGx']) + np.abs(NE_Bound[2])
-
-                        else:
-                            NE_Bound[2] = simplified_ppval(nf3['pp'], EGx[2] )
-
-                    # G5(x)  = x* np.abs(x) /(10 + np.abs(x))   
-                    EGx[4] = np.sum( y * abs_y * inv_p10abs_y )/T
-                    if EGx[4] < nf5['min_EGx']:
-                        NE_Bound[4] = simplified_ppval(nf5['pp_slope'], nf5['min_EGx'] ) * (EGx[4] - nf5['min_EGx']) 
-                        NE_Bound[4] = simplified_ppval(nf5['pp'], nf5['min_EGx']) + np.abs(NE_Bound[4])
-                    else:
-                        if EGx[4] > nf5['max_EGx']:
-                            NE_Bound[4] = simplified_ppval(nf5['pp_slope'], nf5['max_EGx'] ) * (EGx[4] - nf5['max_EGx'])    
-                            NE_Bound[4] = simplified_ppval(nf5['pp'], nf5['max_EGx']) + np.abs(NE_Bound[4])
-                        else:
-                            NE_Bound[4] = simplified_ppval(nf5['pp'], EGx[4] )
-
-                    # G7(x) =  x / (1 + x**2)
-                    EGx[6] = np.sum(y*inv_pabs_yy)/T    
-                    if EGx[6] < nf7['min_EGx']: 
-                        NE_Bound[6] = simplified_ppval(nf7['pp_slope'], nf7['min_EGx'] ) * (EGx[6] - nf7['min_EGx'])
-                        NE_Bound[6] = simplified_ppval(nf7['pp'], nf7['min_EGx']) + np.abs(NE_Bound[6])
-                    else:
-                        if EGx[6] > nf7['max_EGx']:
-                            NE_Bound[6] = simplified_ppval(nf7['pp_slope'], nf7['max_EGx'] ) * (EGx[6] - nf7['max_EGx'])    
-                            NE_Bound[6] = simplified_ppval(nf7['pp'], nf7['max_EGx']) + np.abs(NE_Bound[6])
-                        else:
-                            NE_Bound[6] = simplified_ppval(nf7['pp'], EGx[6] )
-
-                    # select the tightest upper bound
-                    max_NE, max_i = np.max(NE_Bound), np.argmax(NE_Bound)   
-                    negentropy2 = max_NE
+
+                    # select the tightest upper bounds of both rotated components
+                    _, NE_Bound = negentropy_bounds(np.vstack((yr1, yr2)))
+                    negentropy1, negentropy2 = np.max(NE_Bound, axis=0)
 
                     if negentropy1 + negentropy2 > max_negentropy[m] + max_negentropy[n]+ eps : 
                         if verbose:
@@ -517,12 +285,14 @@ def ICA_EBM(X: np.ndarray) -> np.ndarray:
         error = 0 
 
         for iter in range(max_iter_orth_refine): 
+            # the nth row of W is only updated in the nth step, so the bounds of all
+            # components can be evaluated at once
+            Y = W.dot(X)
+            EGx_all, NE_Bound_all = negentropy_bounds(Y)
             for n in range(N): 
                 w = np.copy(W[n, :].T) 
-                y = np.copy(w.T.dot(X)) 
-                # evaluate the upper bound of negentropy of the nth component   
-                NE_Bound = np.zeros((K, 1))
-                EGx = np.zeros((K, 1))
+                y = np.copy(Y[n, :])
+                EGx = EGx_all[:, n]
                 # we only need to calculate these quantities once
                 yy = y* y
                 sign_y = np.sign(y)
@@ -531,56 +301,8 @@ def ICA_EBM(X: np.ndarray) -> np.ndarray:
                 inv_pabs_yy = 1/(1+ yy) 
                 inv_p10abs_y = 1/(10+abs_y)
 
-                # G1(x) = x^4   
-                EGx[0] = np.sum(yy*yy)/T    
-                if EGx[0] < nf1['min_EGx']: 
-                    NE_Bound[0] = simplified_ppval(nf1['pp_slope'], nf1['min_EGx'] ) * (EGx[0] - nf1['min_EGx']) 
-                    NE_Bound[0] = simplified_ppval(nf1['pp'],nf1['min_EGx'])  + np.abs(NE_Bound[0] )   
-                else:
-                    if EGx[0] > nf1['max_EGx']:
-                        NE_Bound[0] = 0 
-                    else:
-                        NE_Bound[0] = simplified_ppval(nf1['pp'], EGx[0] )  
-
-                # G3(x) = np.abs(x)/ (1 + np.abs(x))
-                EGx[2] = 1 - np.sum(inv_pabs_y)/T
-                if EGx[2] < nf3['min_EGx']: 
-                    NE_Bound[2] = simplified_ppval(nf3['pp_slope'], nf3['min_EGx'] ) * (EGx[2] - nf3['min_EGx'])
-                    NE_Bound[2] = simplified_ppval(nf3['pp'], nf3['min_EGx']) + np.abs(NE_Bound[2]) 
-                else:
-                    if EGx[2] > nf3['max_EGx']:
-                        NE_Bound[2] = simplified_ppval(nf3['pp_slope'], nf3['max_EGx'] ) * (EGx[2] - nf3['max_EGx'])    
-                        NE_Bound[2] = simplified_ppval(nf3['pp'], nf3['max_EGx']) + np.abs(NE_Bound[2])
-
-                    else:
-                        NE_Bound[2] = simplified_ppval(nf3['pp'], EGx[2] )
-
-                # G5(x)  = x* np.abs(x) /(10 + np.abs(x))   
-                EGx[4] = np.sum( y * abs_y * inv_p10abs_y )/T
-                if EGx[4] < nf5['min_EGx']:
-                    NE_Bound[4] = simplified_ppval(nf5['pp_slope'], nf5['min_EGx'] ) * (EGx[4] - nf5['min_EGx']) 
-                    NE_Bound[4] = simplified_ppval(nf5['pp'], nf5['min_EGx']) + np.abs(NE_Bound[4])
-                else:
-                    if EGx[4] > nf5['max_EGx']:
-                        NE_Bound[4] = simplified_ppval(nf5['pp_slope'], nf5['max_EGx'] ) * (EGx[4] - nf5['max_EGx'])    
-                        NE_Bound[4] = simplified_ppval(nf5['pp'], nf5['max_EGx']) + np.abs(NE_Bound[4])
-                    else:
-                        NE_Bound[4] = simplified_ppval(nf5['pp'], EGx[4] )
-
-                # G7(x) =  x / (1 + x**2)
-                EGx[6] = np.sum(y*inv_pabs_yy)/T    
-                if EGx[6] < nf7['min_EGx']: 
-                    NE_Bound[6] = simplified_ppval(nf7['pp_slope'], nf7['min_EGx'] ) * (EGx[6] - nf7['min_EGx'])
-                    NE_Bound[6] = simplified_ppval(nf7['pp'], nf7['min_EGx']) + np.abs(NE_Bound[6])
-                else:
-                    if EGx[6] > nf7['max_EGx']:
-                        NE_Bound[6] = simplified_ppval(nf7['pp_slope'], nf7['max_EGx'] ) * (EGx[6] - nf7['max_EGx'])    
-                        NE_Bound[6] = simplified_ppval(nf7['pp'], nf7['max_EGx']) + np.abs(NE_Bound[6])
-                    else:
-                        NE_Bound[6] = simplified_ppval(nf7['pp'], EGx[6] )
-
                 # select the tightest upper bound
-                max_NE, max_i = np.max(NE_Bound), np.argmax(NE_Bound)   
+                max_NE, max_i = np.max(NE_Bound_all[:, n]), np.argmax(NE_Bound_all[:, n])
                 negentropy_array[n] = max_NE
                 Cost[iter] = np.copy(Cost[iter] - max_NE)
 
@@ -678,6 +400,11 @@ def ICA_EBM(X: np.ndarray) -> np.ndarray:
     for iter in range(max_iter_nonorth): 
         Cost[iter] = np.copy(- np.log(np.abs(np.linalg.det(W))))
 
+        # the nth row of W is only updated in the nth step, so the bounds of all
+        # components can be evaluated at once
+        Y = W.dot(X)
+        EGx_all, NE_Bound_all = negentropy_bounds(Y)
+
         for n in range(N):  
             if N > 7:  
                 if n == 0: 
@@ -716,11 +443,8 @@ def ICA_EBM(X: np.ndarray) -> np.ndarray:
                 h = temp1 - temp2.T.dot(np.linalg.inv(temp2.dot(temp2.T)).dot(temp2.dot(temp1)))   
 
             w = np.copy(W[n, :].T ) 
-            y = np.copy(w.T.dot(X))
-
-            # evaluate the upper bound of negentropy of the nth component   
-            NE_Bound = np.zeros((K, 1)) 
-            EGx = np.zeros((K, 1))  
+            y = np.copy(Y[n, :])
+            EGx = np.copy(EGx_all[:, n])
 
             # we only need to calculate these quantities once  
             yy = y* y
@@ -730,58 +454,8 @@ def ICA_EBM(X: np.ndarray) -> np.ndarray:
             inv_pabs_yy = 1/(1+ yy) 
             inv_p10abs_y = 1/(10+abs_y)
 
-            # G1(x) = x^4   
-            EGx[0] = np.sum(yy*yy)/T    
-            if EGx[0] < nf1['min_EGx']: 
-                NE_Bound[0] = simplified_ppval(nf1['pp_slope'], nf1['min_EGx'] ) * (EGx[0] - nf1['min_EGx']) 
-                NE_Bound[0] = simplified_ppval(nf1['pp'],nf1['min_EGx'])  + np.abs(NE_Bound[0] )   
-            else:
-                if EGx[0] > nf1['max_EGx']:
-                    NE_Bound[0] = 0 
-                else:
-                    NE_Bound[0] = simplified_ppval(nf1['pp'], EGx[0] )  
-
-            # G3(x) = np.abs(x)/ (1 + np.abs(x))
-            EGx[2] = 1 - np.sum(inv_pabs_y)/T   
-
-            if EGx[2] < nf3['min_EGx']: 
-                NE_Bound[2] = simplified_ppval(nf3['pp_slope'], nf3['min_EGx'] ) * (EGx[2] - nf3['min_EGx'])
-                NE_Bound[2] = simplified_ppval(nf3['pp'], nf3['min_EGx']) + np.abs(NE_Bound[2]) 
-            else:
-                if EGx[2] > nf3['max_EGx']:
-                    NE_Bound[2] = simplified_ppval(nf3['pp_slope'], nf3['max_EGx'] ) * (EGx[2] - nf3['max_EGx'])    
-                    NE_Bound[2] = simplified_ppval(nf3['pp'], nf3['max_EGx']) + np.abs(NE_Bound[2])  
-
-                else: 
-                    NE_Bound[2] = simplified_ppval(nf3['pp'], EGx[2] )
-
-
-            # G5(x)  = x* np.abs(x) /(10 + np.abs(x))   
-            EGx[4] = np.sum( y * abs_y * inv_p10abs_y )/T
-            if EGx[4] < nf5['min_EGx']:
-                NE_Bound[4] = simplified_ppval(nf5['pp_slope'], nf5['min_EGx'] ) * (EGx[4] - nf5['min_EGx']) 
-                NE_Bound[4] = simplified_ppval(nf5['pp'], nf5['min_EGx']) + np.abs(NE_Bound[4])
-            else:
-                if EGx[4] > nf5['max_EGx']:
-                    NE_Bound[4] = simplified_ppval(nf5['pp_slope'], nf5['max_EGx'] ) * (EGx[4] - nf5['max_EGx'])    
-                    NE_Bound[4] = simplified_ppval(nf5['pp'], nf5['max_EGx']) + np.abs(NE_Bound[4])
-                else:
-                    NE_Bound[4] = simplified_ppval(nf5['pp'], EGx[4] )
-
-            # G7(x) =  x / (1 + x**2)
-            EGx[6] = np.sum(y*inv_pabs_yy)/T    
-            if EGx[6] < nf7['min_EGx']: 
-                NE_Bound[6] = simplified_ppval(nf7['pp_slope'], nf7['min_EGx'] ) * (EGx[6] - nf7['min_EGx'])
-                NE_Bound[6] = simplified_ppval(nf7['pp'], nf7['min_EGx']) + np.abs(NE_Bound[6])
-            else:
-                if EGx[6] > nf7['max_EGx']:
-                    NE_Bound[6] = simplified_ppval(nf7['pp_slope'], nf7['max_EGx'] ) * (EGx[6] - nf7['max_EGx'])    
-                    NE_Bound[6] = simplified_ppval(nf7['pp'], nf7['max_EGx']) + np.abs(NE_Bound[6])
-                else:
-                    NE_Bound[6] = simplified_ppval(nf7['pp'], EGx[6] )
-
             # select the tightest upper bound
-            max_NE, max_i = np.max(NE_Bound), np.argmax(NE_Bound)   
+            max_NE, max_i = np.max(NE_Bound_all[:, n]), np.argmax(NE_Bound_all[:, n])
             Cost[iter] = np.copy(Cost[iter] - max_NE ) 
 
             if max_i == 0:
@@ -789,25 +463,25 @@ def ICA_EBM(X: np.ndarray) -> np.ndarray:
                 vEGx = 2 * (EGx[0] > nf1['critical_point']) - 1
                 grad = X.dot((4 * y * yy).T) / T
                 EGx[0] = np.maximum(np.minimum(EGx[0], nf1['max_EGx']), nf1['min_EGx'])
-                grad = (h / (h.T.dot(w))) + np.reshape(X.dot((4 * y * yy).T) * simplified_ppval(nf1['pp_slope'], EGx[0]) / T, (-1, 1))
+                grad = (h / (h.T.dot(w))) + np.reshape(X.dot((4 * y * yy).T) * ppval(nf1['pp_slope'], EGx[0]) / T, (-1, 1))
             elif max_i == 2:
                 # G3(x) = np.abs(x)/ (1 + np.abs(x))
                 vEGx = 2 * (EGx[2] > nf3['critical_point']) - 1
                 grad = X.dot((sign_y * inv_pabs_y * inv_pabs_y).T) / T
                 EGx[2] = np.maximum(np.minimum(EGx[2], nf3['max_EGx']), nf3['min_EGx'])
-                grad = (h / (h.T.dot(w))) + np.reshape(X.dot((sign_y * inv_pabs_y * inv_pabs_y).T) * simplified_ppval(nf3['pp_slope'], EGx[2]) / T, (-1, 1))
+                grad = (h / (h.T.dot(w))) + np.reshape(X.dot((sign_y * inv_pabs_y * inv_pabs_y).T) * ppval(nf3['pp_slope'], EGx[2]) / T, (-1, 1))
             elif max_i == 4:
                 # G5(x)  = x* np.abs(x) /(10 + np.abs(x))
                 vEGx = 2 * (EGx[4] > nf5['critical_point']) - 1
                 grad = X.dot((abs_y * (20 + abs_y) * inv_p10abs_y * inv_p10abs_y).T) / T
                 EGx[4] = np.maximum(np.minimum(EGx[4], nf5['max_EGx']), nf5['min_EGx'])
-                grad = (h / (h.T.dot(w))) + np.reshape(X.dot((abs_y * (20 + abs_y) * inv_p10abs_y * inv_p10abs_y).T) * simplified_ppval(nf5['pp_slope'], EGx[4]) / T, (-1, 1))
+                grad = (h / (h.T.dot(w))) + np.reshape(X.dot((abs_y * (20 + abs_y) * inv_p10abs_y * inv_p10abs_y).T) * ppval(nf5['pp_slope'], EGx[4]) / T, (-1, 1))
             elif max_i == 6:
                 # G7(x) =  x / (1 + x**2)
                 vEGx = 2 * (EGx[6] > nf7['critical_point']) - 1
                 grad = X.dot(((1 - yy) * inv_pabs_yy ** 2).T) / T
                 EGx[6] = np.maximum(np.minimum(EGx[6], nf7['max_EGx']), nf7['min_EGx'])
-                grad = (h / (h.T.dot(w))) + np.reshape(X.dot(((1 - yy) * inv_pabs_yy ** 2).T) * simplified_ppval(nf7['pp_slope'], EGx[6]) / T, (-1, 1))
+                grad = (h / (h.T.dot(w))) + np.reshape(X.dot(((1 - yy) * inv_pabs_yy ** 2).T) * ppval(nf7['pp_slope'], EGx[6]) / T, (-1, 1))
 
             w = np.reshape(w, (-1, 1 ))
             grad = grad - ((w.T).dot(grad)) * w 
@@ -895,6 +569,91 @@ def simplified_ppval(pp: dict, xs: float) -> float:
         v = v*xs + c[index, i]
     return v     
 
+
+@functools.lru_cache(maxsize=None)
+def load_measfunc_table() -> tuple[dict, ...]:
+    """Helper function for ICA EBM: load the 8 measuring functions.
+
+    The table is read from disk only once and shared by all calls.
+
+    Returns:
+        tuple of 8 dicts, each with the piecewise polynomials 'pp' and 'pp_slope' and
+        the scalars 'min_EGx', 'max_EGx' and 'critical_point'.
+    """
+    file_path = cedalion.data.get("measfunc_table.npy")
+    return tuple(np.load(file_path, allow_pickle=True))
+
+
+def ppval(pp: dict, xs: np.ndarray) -> np.ndarray:
+    """Helper function for ICA EBM: vectorized version of simplified_ppval.
+
+    Args:
+        pp (dict): a dictionary containing the piecewise polynomial representation of a function
+        xs (np.ndarray): the evaluation points
+
+    Returns:
+        v (np.ndarray): the values of the function at xs
+    """
+    b = pp['breaks'][0]
+    c = pp['coefs']
+    l = int(pp['pieces'])
+    k = 4
+    # find the piece of each evaluation point. Points outside of the breaks are
+    # evaluated with the first or last piece.
+    index = np.clip(np.searchsorted(b[:l], xs, side='right') - 1, 0, l - 1)
+    # now go to local coordinates
+    xs = xs - b[index]
+    # nested multiplication
+    v = c[index, 0]
+    for i in range(1, k):
+        v = v * xs + c[index, i]
+    return v
+
+
+def negentropy_bounds(Y: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Helper function for ICA EBM: evaluate the negentropy bounds of all components.
+
+    The measuring functions
+    x^4,  |x|/(1+|x|),    x|x|/(10+|x|),  and     x/(1+x^2)
+    correspond to rows 0, 2, 4 and 6 of the returned arrays. The remaining rows are zero.
+
+    Args:
+        Y (np.ndarray, (Components, Time Points)): the [N x T] components
+
+    Returns:
+        EGx (np.ndarray, (8, Components)): the expectations of the measuring functions
+        NE_Bound (np.ndarray, (8, Components)): the upper bounds of negentropy
+    """
+    nf = load_measfunc_table()
+    N, T = Y.shape
+
+    yy = Y * Y
+    abs_y = np.abs(Y)
+
+    EGx = np.zeros((8, N))
+    # G1(x) = x^4
+    EGx[0] = np.sum(yy * yy, axis=1) / T
+    # G3(x) = np.abs(x)/ (1 + np.abs(x))
+    EGx[2] = 1 - np.sum(1 / (1 + abs_y), axis=1) / T
+    # G5(x)  = x* np.abs(x) /(10 + np.abs(x))
+    EGx[4] = np.sum(Y * abs_y * (1 / (10 + abs_y)), axis=1) / T
+    # G7(x) =  x / (1 + x**2)
+    EGx[6] = np.sum(Y * (1 / (1 + yy)), axis=1) / T
+
+    # Outside of the tabulated range the bound is extrapolated linearly from the
+    # closest end of the range. Inside, the second term vanishes.
+    NE_Bound = np.zeros((8, N))
+    for i in [0, 2, 4, 6]:
+        x = np.clip(EGx[i], nf[i]['min_EGx'], nf[i]['max_EGx'])
+        NE_Bound[i] = ppval(nf[i]['pp'], x) + np.abs(
+            ppval(nf[i]['pp_slope'], x) * (EGx[i] - x)
+        )
+    # the bound of G1 is zero above the tabulated range
+    NE_Bound[0, EGx[0] > nf[0]['max_EGx']] = 0
+
+    return EGx, NE_Bound
+
+
 def inv_sqrtmH(B: np.ndarray) -> np.ndarray:    
     """Helper function for ICA EBM: computes the inverse square root of a matrix.
     
@@ -0,0 +1,295 @@
+"""Artifact removal by blind source separation."""
+
+from dataclasses import dataclass, replace
+
+import numpy as np
+import xarray as xr
+
+import cedalion.dataclasses as cdc
+import cedalion.typing as cdt
+from cedalion.sigdecomp import ERBM, ICA_EBM
+from cedalion.sigdecomp.dummy import split_frequency_bands
+
+BSS_METHODS = {
+    "ica_ebm": ICA_EBM.ICA_EBM,
+    "erbm": ERBM.ERBM,
+}
+
+
+@dataclass
+class UnmixingModel:
+    """Demixing matrix fitted to a multichannel time series.
+
+    The model maps the flattened non-time dimensions of a time series (e.g. channel and
+    wavelength) to independent components. Once fitted, it can be applied to other
+    time series with the same channels, e.g. the full-rate series or streaming blocks,
+    without running the decomposition again.
+
+    Attributes:
+        demixing (xr.DataArray): Demixing matrix with dims (component, *dims), where
+            dims are the non-time dimensions of the fitted time series.
+        mean (xr.DataArray): Temporal mean of the fitted time series with dims (*dims).
+        rejected (xr.DataArray): Boolean flag for each component. Rejected components
+            are removed by :meth:`apply`.
+        units (str): Units of the fitted time series.
+        method (str): Name of the decomposition method.
+    """
+
+    demixing: xr.DataArray
+    mean: xr.DataArray
+    rejected: xr.DataArray
+    units: str
+    method: str
+
+    @property
+    def dims(self) -> tuple[str, ...]:
+        return self.mean.dims
+
+    @property
+    def mixing(self) -> xr.DataArray:
+        """Pseudo-inverse of the demixing matrix with dims (*dims, component)."""
+        W = self.demixing.values.reshape(self.demixing.shape[0], -1)
+        A = np.linalg.pinv(W).reshape(self.mean.shape + (W.shape[0],))
+        return xr.DataArray(
+            A,
+            dims=self.dims + ("component",),
+            coords={**self.mean.coords, "component": self.demixing.component},
+        )
+
+    def _flatten(self, ts: xr.DataArray) -> tuple[np.ndarray, xr.DataArray]:
+        ts = ts.pint.to(self.units).pint.dequantify() if ts.pint.units else ts
+        ts = ts.sel({d: self.mean[d] for d in self.dims if d in self.mean.coords})
+        ts = ts.transpose(*self.dims, "time")
+        return ts.values.reshape(-1, ts.sizes["time"]), ts
+
+    def sources(self, ts: cdt.NDTimeSeries) -> xr.DataArray:
+        """Compute the independent components of a time series.
+
+        Args:
+            ts: Time series with the same non-time dimensions as the fitted one.
+
+        Returns:
+            The components with dims (component, time).
+        """
+
+        X, ts = self._flatten(ts)
+        W = self.demixing.values.reshape(self.demixing.shape[0], -1)
+        S = W @ (X - self.mean.values.reshape(-1, 1))
+
+        time_coords = {k: c for k, c in ts.coords.items() if c.dims == ("time",)}
+
+        return xr.DataArray(
+            S,
+            dims=["component", "time"],
+            coords={"component": self.demixing.component, **time_coords},
+        )
+
+    def apply(self, ts: cdt.NDTimeSeries) -> cdt.NDTimeSeries:
+        """Remove the rejected components from a time series.
+
+        The operation is linear and memoryless, so it can be applied to the whole
+        recording or to consecutive blocks of it with identical results.
+
+        Args:
+            ts: Time series with the same non-time dimensions as the fitted one.
+
+        Returns:
+            The cleaned time series.
+        """
+
+        X, ts_sel = self._flatten(ts)
+        W = self.demixing.values.reshape(self.demixing.shape[0], -1)
+        rejected = self.rejected.values
+
+        if rejected.any():
+            A = np.linalg.pinv(W)
+            S = W[rejected] @ (X - self.mean.values.reshape(-1, 1))
+            X = X - A[:, rejected] @ S
+
+        result = ts_sel.copy(data=X.reshape(ts_sel.shape))
+        result = result.transpose(*[d for d in ts.dims])
+        if ts.pint.units:
+            result = result.pint.quantify(self.units)
+
+        return result
+
+    def save(self, fn: str):
+        """Save the model to a netCDF file.
+
+        Args:
+            fn (str): File name to save the model to.
+        """
+
+        ds = xr.Dataset(
+            {
+                "demixing": self.demixing,
+                "mean": self.mean,
+                "rejected": self.rejected,
+            },
+            attrs={"units": self.units, "method": self.method},
+        )
+        ds.to_netcdf(fn)
+
+    @classmethod
+    def load(cls, fn: str) -> "UnmixingModel":
+        """Load a model that was saved with :meth:`save`.
+
+        Args:
+            fn (str): File name to load the model from.
+
+        Returns:
+            UnmixingModel: The loaded model.
+        """
+
+        with xr.open_dataset(fn) as ds:
+            ds = ds.load()
+
+        return cls(
+            demixing=ds["demixing"],
+            mean=ds["mean"],
+            rejected=ds["rejected"].astype(bool),
+            units=ds.attrs["units"],
+            method=ds.attrs["method"],
+        )
+
+
+@cdc.validate_schemas
+def fit_unmixing(
+    ts: cdt.NDTimeSeries,
+    method: str = "ica_ebm",
+    decimate: int = 1,
+    **kwargs,
+) -> UnmixingModel:
+    """Fit a demixing matrix to a time series.
+
+    Args:
+        ts: Time series with dims (channel, ..., time), e.g. (channel, wavelength, time).
+            All non-time dimensions are flattened into the observations.
+        method: Decomposition method. One of "ica_ebm" or "erbm".
+        decimate: Only every decimate-th sample is used for fitting. Because the mixing
+            is instantaneous, the demixing matrix can be estimated from a subset of the
+            samples and applied to the full-rate series afterwards.
+        kwargs: Additional arguments for the decomposition method, e.g. p or max_jobs
+            for ERBM.
+
+    Returns:
+        The fitted model. No components are rejected yet.
+    """
+
+    if method not in BSS_METHODS:
+        raise ValueError(
+            f"unknown method '{method}'. Choose one of {list(BSS_METHODS.keys())}."
+        )
+
+    units = str(ts.pint.units) if ts.pint.units else "1"
+    ts = ts.pint.dequantify() if ts.pint.units else ts
+
+    dims = tuple(d for d in ts.dims if d != "time")
+    ts = ts.transpose(*dims, "time")
+
+    X = ts.isel(time=slice(None, None, decimate)).values.reshape(
+        -1, len(ts.time[::decimate])
+    )
+    if not np.all(np.isfinite(X)):
+        raise ValueError("time series contains non-finite values.")
+
+    W = BSS_METHODS[method](X, **kwargs)
+
+    mean = ts.mean("time")
+    mean = mean.drop_vars([c for c in mean.coords if c not in mean.dims])
+
+    ncomponents = W.shape[0]
+    component = np.arange(ncomponents)
+    demixing = xr.DataArray(
+        W.reshape((ncomponents,) + mean.shape),
+        dims=("component",) + dims,
+        coords={"component": component, **mean.coords},
+    )
+
+    rejected = xr.DataArray(
+        np.zeros(ncomponents, dtype=bool),
+        dims="component",
+        coords={"component": component},
+    )
+
+    return UnmixingModel(demixing, mean, rejected, units, method)
+
+
+@cdc.validate_schemas
+def score_components(
+    model: UnmixingModel,
+    ts: cdt.NDTimeSeries,
+    ts_short: cdt.NDTimeSeries | None = None,
+) -> xr.Dataset:
+    """Score the components of a time series for physiological artifacts.
+
+    Args:
+        model: Fitted unmixing model.
+        ts: Time series to decompose.
+        ts_short: Short-separation channels recorded simultaneously with ts. If given,
+            the correlation of each component with the short channels is computed.
+
+    Returns:
+        Dataset with dimension component containing the variables:
+            - cardiac_power: fraction of the component's variance in the cardiac band
+              as defined by :func:`split_frequency_bands`.
+            - short_channel_corr: maximum absolute correlation with any of the short
+              channels (only if ts_short is given).
+    """
+
+    sources = model.sources(ts)
+
+    bands = split_frequency_bands(sources.rename(component="channel"))
+    cardiac_var = bands.sel(band="cardiac").var("time").values
+    cardiac_power = cardiac_var / sources.var("time").values
+
+    scores = xr.Dataset(
+        {"cardiac_power": ("component", cardiac_power)},
+        coords={"component": sources.component},
+    )
+
+    if ts_short is not None:
+        ts_short = ts_short.pint.dequantify() if ts_short.pint.units else ts_short
+        ts_short = ts_short.transpose(..., "time")
+        R = ts_short.values.reshape(-1, ts_short.sizes["time"])
+
+        def standardize(x):
+            x = x - x.mean(axis=1, keepdims=True)
+            return x / np.linalg.norm(x, axis=1, keepdims=True)
+
+        corr = standardize(sources.values) @ standardize(R).T
+        scores["short_channel_corr"] = ("component", np.abs(corr).max(axis=1))
+
+    return scores
+
+
+def reject_components(
+    model: UnmixingModel,
+    scores: xr.Dataset,
+    max_cardiac_power: float | None = 0.5,
+    max_short_channel_corr: float | None = 0.7,
+) -> UnmixingModel:
+    """Flag components whose artifact scores exceed the given thresholds.
+
+    Args:
+        model: Fitted unmixing model.
+        scores: Component scores as returned by :func:`score_components`.
+        max_cardiac_power: Components with a larger fraction of cardiac band power are
+            rejected. None disables this criterion.
+        max_short_channel_corr: Components with a larger correlation with any short
+            channel are rejected. None disables this criterion.
+
+    Returns:
+        A copy of the model in which the flagged components are marked as rejected.
+        Components that were already rejected remain rejected.
+    """
+
+    rejected = model.rejected.values.copy()
+
+    if max_cardiac_power is not None:
+        rejected |= scores["cardiac_power"].values > max_cardiac_power
+
+    if max_short_channel_corr is not None and "short_channel_corr" in scores:
+        rejected |= scores["short_channel_corr"].values > max_short_channel_corr
+
+    return replace(model, rejected=model.rejected.copy(data=rejected))
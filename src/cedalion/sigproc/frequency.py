@@ -4,6 +4,7 @@ import numpy as np
 import scipy.signal
 import xarray as xr
 import cedalion.typing as cdt
+import cedalion.xrutils as xrutils
 from cedalion import Quantity, units
 from cedalion.validators import check_dimensionality
 import cedalion.dataclasses as cdc
@@ -63,16 +64,11 @@ def freq_filter(
     else:
         sos = scipy.signal.butter(butter_order, [fmin, fmax], "bandpass", output="sos")
 
-    if (units := timeseries.pint.units) is not None:
-        timeseries = timeseries.pint.dequantify()
-
+    timeseries, units = xrutils.strip_units(timeseries)
 
     dims = timeseries.dims
     timeseries = timeseries.transpose(..., "time")
     result = xr.apply_ufunc(scipy.signal.sosfiltfilt, sos, timeseries)
     result = result.transpose(*dims)
 
-    if units is not None:
-        result = result.pint.quantify(units)
-
-    return result
+    return xrutils.restore_units(result, units)
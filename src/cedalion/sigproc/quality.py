@@ -218,7 +218,7 @@ def psp(
 
     amp = _extract_cardiac(amplitudes, cardiac_fmin, cardiac_fmax)
 
-    amp = amp.pint.dequantify()
+    amp, _ = xrutils.strip_units(amp)
 
     amp = (amp - amp.mean("time")) / amp.std("time")
 
@@ -685,7 +685,7 @@ def detect_outliers_std(
         Based on Homer3 v1.80.2 "hmrR_tInc_baselineshift_Ch_Nirs.m" (:cite:t:`Jahani2017`)
     """
 
-    ts = ts.pint.dequantify()
+    ts, _ = xrutils.strip_units(ts)
     fs = freq.sampling_rate(ts)
 
     window_size = int(np.round(fs * t_window))
@@ -730,7 +730,7 @@ def detect_outliers_grad(ts: cdt.NDTimeSeries, iqr_threshold=1.5):
         Based on Homer3 v1.80.2 "hmrR_tInc_baselineshift_Ch_Nirs.m" (:cite:t:`Jahani2017`)
     """
 
-    ts = ts.pint.dequantify()
+    ts, _ = xrutils.strip_units(ts)
 
     #ts_lowpass = ts.cd.freq_filter(0, 2, butter_order=4) # FIXME
     ts_lowpass = freq.freq_filter(ts, 0 * units.Hz, 2*units.Hz, butter_order=4)
@@ -892,7 +892,7 @@ def detect_baselineshift(ts: cdt.NDTimeSeries, outlier_mask: cdt.NDTimeSeries):
     References:
         Based on Homer3 v1.80.2 "hmrR_tInc_baselineshift_Ch_Nirs.m" (:cite:t:`Jahani2017`)
     """
-    ts = ts.pint.dequantify()
+    ts, _ = xrutils.strip_units(ts)
 
     #ts = ts.stack(measurement=["channel", "wavelength"]).sortby("wavelength")
     #outlier_mask = outlier_mask.stack(measurement=["channel", "wavelength"]).sortby(
@@ -1,8 +1,10 @@
 import random
+import weakref
 
 import numpy as np
 import pandas as pd
 import pyvista as pv
+import scipy.sparse
 import scipy.stats as stats
 import xarray as xr
 from scipy import signal
@@ -10,6 +12,8 @@ from scipy import signal
 import cedalion.dataclasses as cdc
 import cedalion.dataclasses.geometry as cdg
 import cedalion.imagereco.forward_model as cfm
+from cedalion.imagereco.sparse import SparseAdot
+import cedalion.nirs
 import cedalion.plots
 import cedalion.typing as cdt
 import cedalion.xrutils as xrutils
@@ -48,8 +52,8 @@ def generate_hrf(
 
     time_axis = time_axis - time_axis[0]
     stim_dur = (stim_dur / units.seconds).to_base_units().magnitude
-    scale[0] = (scale[0] / units.molar).to_base_units().magnitude
-    scale[1] = (scale[1] / units.molar).to_base_units().magnitude
+    # do not modify the default argument in place
+    scale = [(sc / units.molar).to_base_units().magnitude for sc in scale]
 
     n_conc = len(params_basis) // 2
     if scale is None:
@@ -109,6 +113,7 @@ def build_blob(
     landmark: str,
     scale: Quantity = 1 * units.cm,
     m: float = 10.0,
+    cache_dir: str | None = None,
 ):
     """Generates a blob of activity at a seed landmark.
 
@@ -122,6 +127,9 @@ def build_blob(
         m (float): Geodesic distance parameter. Larger values of m will smooth &
             regularize the distance computation. Smaller values of m will roughen and
             will usually increase error in the distance computation.
+        cache_dir (str | None): If given, the geodesic systems of the brain surface
+            are stored in this directory and reused across processes. Within a
+            process they are always reused for the same brain mesh.
 
     Returns:
         xr.DataArray: Blob image with activation values for each vertex.
@@ -138,7 +146,9 @@ def build_blob(
 
     cortex_surface = cdg.PycortexSurface.from_trimeshsurface(head_model.brain)
 
-    distances_from_seed = cortex_surface.geodesic_distance([seed_vertex], m=m)
+    distances_from_seed = cortex_surface.geodesic_distance(
+        [seed_vertex], m=m, cache_dir=cache_dir
+    )
     # distances can be distord due to mesh decimation or unsuitable m value
 
     norm_pdf = stats.norm(scale=scale).pdf
@@ -150,17 +160,172 @@ def build_blob(
     return blob_img
 
 
+class HRFSimulator:
+    """Maps activation blobs on the brain to HRFs in channel space.
+
+    An HRF image, i.e. the concentration change of each chromophore at each brain
+    vertex and time point, is the outer product of a spatial blob and a temporal HRF
+    model. The simulator keeps this low-rank factorization: each blob is projected once
+    into channel space and then combined with the HRF model,
+
+        HRF_chan[ch, wl, t] = sum_chromo E[chromo, wl] * (Adot_wl @ blob)[ch]
+                                         * hrf[chromo, t],
+
+    so the (time, nchromo * nvertex) image is never formed. The brain blocks of Adot
+    and the extinction coefficients are prepared once in the constructor. Use
+    :meth:`for_adot` to reuse a simulator for the same sensitivity matrix.
+
+    Args:
+        Adot (xr.DataArray | SparseAdot): Sensitivity matrix for the forward model.
+        ec (xr.DataArray | None): Extinction coefficients with dimensions (chromo,
+            wavelength). Defaults to the Prahl spectrum for HbO and HbR.
+    """
+
+    _instances: dict[int, "HRFSimulator"] = {}
+
+    def __init__(
+        self, Adot: xr.DataArray | SparseAdot, ec: xr.DataArray | None = None
+    ):
+        if isinstance(Adot, SparseAdot):
+            wavelengths = Adot.wavelength
+            self.channel = xr.DataArray(
+                Adot.channel, dims="channel", coords={"channel": Adot.channel}
+            )
+            is_brain = np.asarray(Adot.is_brain, dtype=bool)
+            self._blocks = [
+                scipy.sparse.csc_array(Adot.wavelength_block(wl))[:, is_brain]
+                for wl in wavelengths
+            ]
+        else:
+            Adot = Adot.transpose("channel", "vertex", "wavelength")
+            wavelengths = Adot.wavelength.values
+            self.channel = Adot.channel
+            is_brain = Adot.is_brain.values.astype(bool)
+            values = Adot.pint.dequantify().values
+            self._blocks = [
+                np.ascontiguousarray(values[:, is_brain, i_wl])
+                for i_wl in range(len(wavelengths))
+            ]
+
+        if ec is None:
+            ec = cedalion.nirs.get_extinction_coefficients("prahl", wavelengths)
+        if ec.pint.units is not None:
+            ec = ec.pint.dequantify()
+
+        self.wavelength = xr.DataArray(
+            wavelengths, dims="wavelength", coords={"wavelength": wavelengths}
+        )
+        self.ec = ec.sel(wavelength=wavelengths).transpose("chromo", "wavelength")
+        self.nbrain = int(is_brain.sum())
+
+    @classmethod
+    def for_adot(cls, Adot: xr.DataArray | SparseAdot) -> "HRFSimulator":
+        """Return the simulator for Adot with default extinction coefficients.
+
+        Simulators are kept as long as their sensitivity matrix is alive. Adot must
+        therefore not be modified in place after the first call.
+
+        Args:
+            Adot (xr.DataArray | SparseAdot): Sensitivity matrix for the forward model.
+
+        Returns:
+            HRFSimulator: The cached or newly created simulator.
+        """
+
+        key = id(Adot)
+        if key not in cls._instances:
+            cls._instances[key] = cls(Adot)
+            weakref.finalize(Adot, cls._instances.pop, key, None)
+
+        return cls._instances[key]
+
+    def channel_patterns(self, blobs: xr.DataArray) -> xr.DataArray:
+        """Project activation blobs into channel space.
+
+        Args:
+            blobs (xr.DataArray): Activation values for each brain vertex with
+                dimension "vertex" and optionally further dimensions, e.g. "blob".
+                Each blob is normalized to a maximum of 1.
+
+        Returns:
+            xr.DataArray: The optical density change per unit concentration change of
+            each chromophore, with dimensions (..., channel, wavelength, chromo).
+        """
+
+        if blobs.sizes["vertex"] != self.nbrain:
+            raise ValueError(
+                f"blobs have {blobs.sizes['vertex']} vertices but Adot has "
+                f"{self.nbrain} brain vertices."
+            )
+
+        if blobs.pint.units is not None:
+            blobs = blobs.pint.dequantify()
+        blobs = blobs / blobs.max("vertex")
+
+        batch_dims = [d for d in blobs.dims if d != "vertex"]
+        blobs = blobs.transpose("vertex", *batch_dims)
+        B = blobs.values.reshape(self.nbrain, -1)
+
+        # shape (nwavelength, nchannel, nbatch)
+        P = np.stack([np.asarray(block @ B) for block in self._blocks])
+        P = P.reshape(P.shape[:2] + blobs.shape[1:])
+
+        patterns = xr.DataArray(
+            P,
+            dims=["wavelength", "channel"] + batch_dims,
+            coords={
+                **{d: blobs.coords[d] for d in batch_dims if d in blobs.coords},
+                "channel": self.channel,
+                "wavelength": self.wavelength,
+            },
+        )
+        patterns = patterns * self.ec
+
+        return patterns.transpose(*batch_dims, "channel", "wavelength", "chromo")
+
+    def hrfs(self, blobs: xr.DataArray, hrf_model: xr.DataArray) -> xr.DataArray:
+        """Compute channel-space HRFs for all combinations of blobs and HRF models.
+
+        Args:
+            blobs (xr.DataArray): Activation values for each brain vertex with
+                dimension "vertex" and optionally further dimensions, e.g. "blob".
+            hrf_model (xr.DataArray): HRF model with dimensions "chromo" and "time"
+                and optionally further dimensions, e.g. "trial_type". The dimensions
+                must differ from the extra dimensions of blobs.
+
+        Returns:
+            xr.DataArray: HRFs in channel space with the extra dimensions of blobs and
+            hrf_model followed by (channel, wavelength, time).
+        """
+
+        hrf_model = hrf_model.pint.to(units.molar).pint.dequantify()
+
+        patterns = self.channel_patterns(blobs)
+        hrfs = xr.dot(patterns, hrf_model, dim="chromo")
+
+        batch_dims = [
+            d for d in patterns.dims + hrf_model.dims
+            if d not in ("channel", "wavelength", "chromo", "time")
+        ]  # fmt: skip
+        hrfs = hrfs.transpose(*batch_dims, "channel", "wavelength", "time")
+
+        return hrfs.assign_coords(samples=("time", np.arange(hrfs.sizes["time"])))
+
+
 def hrfs_from_image_reco(
     blob: xr.DataArray,
     hrf_model: xr.DataArray,
-    Adot: xr.DataArray,
+    Adot: xr.DataArray | SparseAdot,
 ):
     """Maps an activation blob on the brain to HRFs in channel space.
 
+    The stacked brain sensitivity is computed once per Adot and the HRF image is never
+    materialized (see :class:`HRFSimulator`).
+
     Args:
         blob (xr.DataArray): Activation values for each vertex.
         hrf_model (xr.DataArray): HRF model for HbO and HbR.
-        Adot (xr.DataArray): Sensitivity matrix for the forward model.
+        Adot (xr.DataArray | SparseAdot): Sensitivity matrix for the forward model.
 
     Returns:
         cdt.NDTimeseries: HRFs in channel space.
@@ -171,29 +336,7 @@ def hrfs_from_image_reco(
 
     """
 
-    hrf_model = hrf_model.pint.to(units.molar)
-    hrf_model = hrf_model.pint.dequantify()
-
-    n_channels = Adot.channel.size
-    n_v_brain = Adot.sel(vertex=Adot.is_brain).vertex.size
-
-    Adot_stacked = cfm.ForwardModel.compute_stacked_sensitivity(Adot)
-    # Adot should have units
-    Adot_is_brain_stack = xr.concat([Adot.is_brain, Adot.is_brain], dim="vertex")
-    Adot_is_brain_stack = Adot_is_brain_stack.rename({"vertex": "flat_vertex"})
-    Adot_brain_stacked = Adot_stacked.sel(flat_vertex=Adot_is_brain_stack)
-
-    HRF_image = add_hrf_to_vertices(hrf_model, n_v_brain, scale=blob)
-    HRF_chan = Adot_brain_stacked @ HRF_image
-
-    HRF_chan = np.stack([HRF_chan[:n_channels], HRF_chan[n_channels:]], axis=1)
-    HRF_chan = xr.DataArray(
-        HRF_chan,
-        coords=[Adot.channel, Adot.wavelength, hrf_model.time],
-        dims=["channel", "wavelength", "time"],
-    ).assign_coords(samples=("time", np.arange(len(hrf_model.time))))
-
-    return HRF_chan
+    return HRFSimulator.for_adot(Adot).hrfs(blob, hrf_model)
 
 
 def add_hrf_to_vertices(
@@ -1,6 +1,8 @@
 import functools
 from typing import Callable
 
+import cedalion.instrumentation
+
 task_registry = {}
 
 
@@ -14,7 +16,7 @@ def task(f: Callable):
 
     @functools.wraps(f)
     def wrapper(*args, **kwargs):
-        return f(*args, **kwargs)
+        return cedalion.instrumentation.call(name, "task", f, *args, **kwargs)
 
     task_registry[name] = wrapper
 
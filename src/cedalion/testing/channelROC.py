@@ -1,66 +1,319 @@
-import cedalion.testing.simData as simdata
-import cedalion.pipelines.modules.preproccessing as prep
-import cedalion.pipelines.modules.glm as stats
-import numpy as np
+"""Receiver operating characteristics of channel-space analysis pipelines.
+
+Data are simulated with a known ground truth (see :mod:`cedalion.testing.simData`),
+run through one or more pipelines and the resulting p-values are compared to the truth.
+Iterations are independent and can be distributed over a process pool. Each iteration
+draws its random numbers from its own child of a :class:`numpy.random.SeedSequence`,
+so that results do not depend on the number of workers.
+"""
+
+import copy
+import inspect
+import logging
+import random
+import time
+import tracemalloc
+
 import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+import xarray as xr
+from pqdm.processes import pqdm
+
+import cedalion.pipelines.modules.glm as stats
+import cedalion.pipelines.modules.preproccessing as prep
+import cedalion.testing.simData as simdata
+
+logger = logging.getLogger("cedalion")
+
 
 def PipelineList(steps):
     job = None
     for step in steps:
         job=step(job)
-    
+
     return job
 
+
+def pipeline_stages(pipeline) -> list:
+    """Return the modules of a pipeline in the order in which they are run."""
+    stages = []
+    while pipeline is not None:
+        stages.append(pipeline)
+        pipeline = pipeline.previous_job
+    return stages[::-1]
+
+
+def run_instrumented(pipeline, rec, track_memory: bool = True):
+    """Run a pipeline stage by stage and measure each stage.
+
+    Args:
+        pipeline: the last module of a pipeline
+        rec: the recording to process
+        track_memory: if True, the peak memory allocated by each stage is measured
+            with :mod:`tracemalloc`. This slows down stages that allocate many small
+            Python objects.
+
+    Returns:
+        the processed recording and a list of dicts with the keys "stage", "name",
+        "wall_time" in seconds and "peak_memory" in bytes (None if not tracked)
+    """
+    profile = []
+
+    for i_stage, stage in enumerate(pipeline_stages(pipeline)):
+        if track_memory:
+            tracemalloc.start()
+        t_start = time.perf_counter()
+
+        rec = stage._runlocal(rec)
+
+        wall_time = time.perf_counter() - t_start
+        peak_memory = None
+        if track_memory:
+            peak_memory = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+        profile.append(
+            {
+                "stage": i_stage,
+                "name": stage.name,
+                "wall_time": wall_time,
+                "peak_memory": peak_memory,
+            }
+        )
+
+    return rec, profile
+
+
+def _run_iteration(
+    simulation_function,
+    simulation_args: dict,
+    pipelines: dict,
+    seed: np.random.SeedSequence,
+    track_memory: bool,
+):
+    """Simulate one dataset and run all pipelines on it.
+
+    The global random states of numpy and the random module are seeded from seed for
+    simulation functions that do not accept a generator. Functions with an ``rng``
+    argument receive a generator spawned from seed.
+    """
+    np.random.seed(seed.generate_state(1)[0])
+    random.seed(int(seed.generate_state(1, np.uint64)[0]))
+
+    simulation_args = dict(simulation_args)
+    if "rng" in inspect.signature(simulation_function).parameters:
+        simulation_args.setdefault("rng", np.random.default_rng(seed))
+
+    rec, truth = simulation_function(**simulation_args)
+
+    pvals = {}
+    profiles = {}
+    for name, pipeline in pipelines.items():
+        result, profiles[name] = run_instrumented(
+            pipeline, copy.deepcopy(rec), track_memory
+        )
+        pvals[name] = (
+            result["stats"]
+            .pvalue["HRF A"]
+            .to_numpy()
+            .reshape((2, len(result["conc"].channel)))
+            .T
+        )
+
+    return truth.data, pvals, profiles
+
+
+def roc_curve(truth: np.ndarray, pval: np.ndarray):
+    """Compute the ROC curve of p-values at all thresholds.
+
+    Args:
+        truth: boolean ground truth. Samples where truth is NaN are ignored.
+        pval: p-values with the same shape as truth
+
+    Returns:
+        true positive rates, false positive rates and the sorted p-value thresholds
+    """
+    truth = np.asarray(truth, dtype=float).ravel()
+    pval = np.asarray(pval, dtype=float).ravel()
+
+    valid = ~np.isnan(truth)
+    truth = truth[valid].astype(bool)
+    pval = pval[valid]
+
+    th = np.sort(pval)
+    # number of positives and negatives with p-values <= each threshold
+    tp = np.searchsorted(np.sort(pval[truth]), th, side="right") / max(truth.sum(), 1)
+    fp = np.searchsorted(np.sort(pval[~truth]), th, side="right") / max(
+        (~truth).sum(), 1
+    )
+
+    return tp, fp, th
+
+
+def auc(tp: np.ndarray, fp: np.ndarray) -> float:
+    """Area under a ROC curve returned by :func:`roc_curve`."""
+    return float(np.trapz(np.r_[0.0, tp], np.r_[0.0, fp]))
+
+
 class ChannelROC:
-    def __init__(self):
+    """Channel-wise ROC analysis of one or more pipelines.
+
+    All pipelines are run on the same simulated datasets. Use :meth:`add_pipeline` to
+    compare several pipelines; the attribute ``pipeline`` gets and sets the pipeline
+    named "default". The options in ``pipeline_args`` are set on all pipelines.
+
+    Attributes:
+        data_simulation_function: function returning a recording and the ground truth
+        data_simulation_args: keyword arguments for the simulation function
+        pipelines: dict mapping pipeline names to the last module of each pipeline
+        pipeline_args: options set on all pipelines before running them
+        seed: entropy for the seed sequence of the iterations. None draws fresh
+            entropy; the drawn value is stored so that a run can be repeated.
+        track_memory: measure the peak memory of each pipeline stage
+    """
+
+    def __init__(self, seed: int | None = None):
         self.iterations=0
         self.data_simulation_function=simdata.Data
         self.data_simulation_args={'snr':5}
-        self.pipeline=PipelineList([prep.intensity_opticaldensity,
-                                    prep.mbll,
-                                    stats.GLM])
+        self.pipelines = {
+            "default": PipelineList(
+                [prep.intensity_opticaldensity, prep.mbll, stats.GLM]
+            )
+        }
         self.pipeline_args={'noise_model':'ar_irls'}
-        self._truth=[]
-        self._pvals=[]
-        return
-    
-    def run(self,num_iterations):
-        self.pipeline.set_all_options(self.pipeline_args)
-        for iter in range(num_iterations):
-            print(f"Interation {self.iterations}")
-            rec,truth=self.data_simulation_function(**self.data_simulation_args)
-            rec=self.pipeline.run(rec)
-            val=rec['stats'].pvalue['HRF A'].to_numpy().reshape((2,len(rec['conc'].channel))).T
-            self._pvals.append(val)
-            self._truth.append(truth.data)
+        self.seed = seed
+        self.track_memory = True
+        self._pipeline_options = {}
+        self.reset()
+
+    @property
+    def pipeline(self):
+        return self.pipelines["default"]
+
+    @pipeline.setter
+    def pipeline(self, pipeline):
+        self.pipelines["default"] = pipeline
+
+    def add_pipeline(self, name: str, pipeline, options: dict | None = None):
+        """Add a pipeline to the comparison.
+
+        Args:
+            name: name of the pipeline in the results
+            pipeline: the last module of the pipeline
+            options: options set on this pipeline after ``pipeline_args``
+        """
+        self.pipelines[name] = pipeline
+        self._pipeline_options[name] = options or {}
+
+    def run(self, num_iterations: int, max_jobs: int = 1):
+        """Simulate num_iterations datasets and run all pipelines on them.
+
+        Repeated calls continue the seed sequence, so that running 2x50 iterations
+        yields the same results as running 100 iterations at once.
+
+        Args:
+            num_iterations: number of simulated datasets
+            max_jobs: number of worker processes
+        """
+        if self._seed_sequence is None:
+            self._seed_sequence = np.random.SeedSequence(self.seed)
+            self.seed = self._seed_sequence.entropy
+
+        for name, pipeline in self.pipelines.items():
+            pipeline.set_all_options(self.pipeline_args)
+            pipeline.set_all_options(self._pipeline_options.get(name, {}))
+
+        seeds = self._seed_sequence.spawn(num_iterations)
+        args = [
+            (
+                self.data_simulation_function,
+                self.data_simulation_args,
+                self.pipelines,
+                seed,
+                self.track_memory,
+            )
+            for seed in seeds
+        ]
+
+        if max_jobs == 1:
+            results = [_run_iteration(*a) for a in args]
+        else:
+            results = pqdm(
+                args,
+                _run_iteration,
+                n_jobs=max_jobs,
+                argument_type="args",
+                exception_behaviour="immediate",
+                disable=True,
+            )
+
+        for truth, pvals, profiles in results:
+            self._truth.append(truth)
+            for name, val in pvals.items():
+                self._pvals.setdefault(name, []).append(val)
+            for name, profile in profiles.items():
+                for entry in profile:
+                    self._profiles.append(
+                        {"iteration": self.iterations, "pipeline": name, **entry}
+                    )
             self.iterations+=1
-        return
+
+        logger.info(f"completed {self.iterations} ROC iterations.")
 
     def reset(self):
         self._truth=[]
-        self._pvals=[]
+        self._pvals={}
+        self._profiles=[]
+        self._seed_sequence = None
         self.iterations=0
-        return
-    
-    def results(self):
-        rr=np.concat(self._pvals)
-        tt=np.concat(self._truth)
+
+    def results(self, pipeline: str = "default"):
+        """ROC curves of one pipeline for each chromophore.
+
+        Returns:
+            lists with the true positive rates, false positive rates and p-value
+            thresholds of each chromophore
+        """
+        rr=np.concatenate(self._pvals[pipeline])
+        tt=np.concatenate(self._truth)
 
         tp=[]
         fp=[]
         th=[]
         for i in range(rr.shape[1]):
-            t,f,h=self._roc_values(tt[:,i],rr[:,i])
+            t,f,h=roc_curve(tt[:,i],rr[:,i])
             tp.append(t)
             fp.append(f)
             th.append(h)
-        
-        
+
         return tp, fp, th
 
+    def auc(self) -> xr.DataArray:
+        """Area under the ROC curve of each pipeline and chromophore."""
+        values = []
+        for name in self._pvals:
+            tp, fp, _ = self.results(name)
+            values.append([auc(t, f) for t, f in zip(tp, fp)])
+
+        return xr.DataArray(
+            np.array(values),
+            dims=["pipeline", "chromo"],
+            coords={"pipeline": list(self._pvals), "chromo": ["HbO", "HbR"]},
+        )
 
-    def draw(self):
-        tp, fp, th = self.results()
+    def profiles(self) -> pd.DataFrame:
+        """Wall time and peak memory of each pipeline stage in each iteration."""
+        return pd.DataFrame(
+            self._profiles,
+            columns=[
+                "iteration", "pipeline", "stage", "name", "wall_time", "peak_memory"
+            ],
+        )
+
+    def draw(self, pipeline: str = "default"):
+        tp, fp, th = self.results(pipeline)
         plt.subplot(121)
         for i in range(len(tp)):
             plt.plot(fp[i],tp[i])
@@ -73,28 +326,3 @@ class ChannelROC:
         plt.title('Type-I error')
         plt.ylabel('False Positive Rate')
         plt.xlabel('Estimated FPR (p-value)')
-
-
-    def _roc_values(self,truth, pval):
-        nan_indices = np.isnan(truth)
-        pval = pval[~nan_indices]
-        truth = truth[~nan_indices]
-
-        lst = np.where(truth)[0]
-        lstN = np.where(~truth)[0]
-    
-        if len(lst) != len(lstN) and not np.all(truth == 0):
-            n = min(len(lst), len(lstN))
-            lst = np.random.choice(lst, n, replace=False)
-            lstN = np.random.choice(lstN, n, replace=False)
-            pval = np.concatenate((pval[lst], pval[lstN]))
-            truth = np.concatenate((truth[lst], truth[lstN]))
-
-        th, I = np.sort(pval), np.argsort(pval)
-        tp = np.cumsum(truth[I]) / np.sum(truth)
-        fp = np.cumsum(~truth[I]) / np.sum(~truth)
-
-        return tp, fp, th
-    
-    
-
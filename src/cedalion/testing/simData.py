@@ -6,32 +6,81 @@ import cedalion.testing.simData
 import numpy as np
 import xarray as xr
 from scipy.linalg import toeplitz
-import random
+import functools
 import scipy.signal
 import cedalion.models.glm as glm
 import cedalion.math
 import cedalion.math.ar_model
+import cedalion.nirs
 import cedalion.pipelines
 import cedalion.pipelines.modules.preproccessing as prep
 import cedalion.testing.simEvents 
+from cedalion.testing.simEvents import _get_rng, _integers
 import copy
 
 units = cedalion.units
 
-def randAR( P=5):
+def randAR( P=5, size=None, rng=None):
     """
     Function to generate random P-th order AR coef for generating data with serial-correlations   
     Inputs: 
         P: int {default=5}
+        size: number of coefficient sets to draw {default None, a single set}
+        rng: seed or numpy.random.Generator {default None, numpy's global state}
     Outputs:
-        a: numpy array of ar coefficients 
+        a: numpy array of ar coefficients. Shape (P,) or (size, P)
     """ 
-    a = [random.random() for _ in range(P)]
-    a=np.flipud(np.cumsum(a))
-    a=a / a.sum() * 0.99
-    return a
+    rng = _get_rng(rng)
+    a = rng.random((1 if size is None else size, P))
+    a = np.flip(np.cumsum(a, axis=1), axis=1)
+    a = a / a.sum(axis=1, keepdims=True) * 0.99
+    return a[0] if size is None else a
 
 
+@functools.lru_cache(maxsize=32)
+def _spatial_cholesky(numchan, sigma):
+    """Cholesky factor of the spatial noise covariance toeplitz([1, sigma, ...])."""
+    S = toeplitz([1]+ [sigma]*(numchan-1))
+    return np.linalg.cholesky(S)
+
+
+# below this number of channels a loop over scipy.signal.lfilter is faster than the
+# time-stepped recursion over all channels
+_MIN_BATCHED_CHANNELS = 256
+
+
+def _ar_filter(e, a):
+    """
+    Applies the IIR filters lfilter(ones(P+1), [1, -a[i]]) to each column of e.
+
+    Inputs:
+        e: np.array (time, N)
+        a: np.array (N, P) AR coefficients of each column
+    Outputs:
+        filtered np.array (time, N)
+    """
+    nsamples, N = e.shape
+    P = a.shape[1]
+
+    if N < _MIN_BATCHED_CHANNELS:
+        y = np.empty_like(e)
+        for i in range(N):
+            y[:,i] = scipy.signal.lfilter(np.ones(P+1), np.append(1,-a[i]), e[:,i])
+        return y
+
+    y = np.zeros((nsamples+P, N))
+
+    # the moving sum over P+1 samples is shared by all columns
+    u = y[P:]
+    u[:] = e
+    for j in range(1, P+1):
+        u[j:] += e[:-j]
+
+    # y[t] = u[t] + sum_k a[k] y[t-1-k], vectorized over all columns
+    a_rev = np.ascontiguousarray(a[:, ::-1].T)
+    for t in range(P, nsamples+P):
+        y[t] += np.einsum('kn,kn->n', a_rev, y[t-P:t])
+    return y[P:]
 
 
 def defaultProbe2D():
@@ -123,8 +172,52 @@ def defaultProbe2D():
 
 
 
-def ARnoise(geo2D=defaultProbe2D()[0],measList=defaultProbe2D()[1],
-            t=np.round([(j+1)*.1 for j in range(0,3000)],3), P=10, sigma=0.33):
+@functools.lru_cache(maxsize=None)
+def _shared_default_probe2D():
+    """defaultProbe2D() built once and shared by all ARnoise calls."""
+    return defaultProbe2D()
+
+
+def ARnoise_batch(num_realizations=1, nsamples=3000, numchannels=16,
+                  numwavelengths=2, P=10, sigma=0.33, rng=None):
+    """ This function simulates many independent fNIRS CW raw amp recordings with AR noise
+
+    The spatially correlated innovations are drawn with a Cholesky factor of the
+    spatial covariance that is computed once per (number of channels, sigma). All
+    channels of all realizations are then filtered with their own random AR filter in
+    one batched recursion.
+
+    Inputs:
+        num_realizations: number of independent recordings {default 1}
+        nsamples:       number of time points {default 3000}
+        numchannels:    number of channels {default 16, as defaultProbe2D()}
+        numwavelengths: number of wavelengths {default 2}
+        P:      AR model order (calls randAR(P) to generate) {default 10}
+        sigma:  Spatial covariance noise prior {default 0.33}
+        rng:    seed or numpy.random.Generator {default None, numpy's global state}
+
+    Outputs:
+        data:   np.array (realization, time, channel, wavelength) of raw amplitudes
+    """
+    rng = _get_rng(rng)
+    numchan = numchannels*numwavelengths
+
+    # noise with spatial covariance (set by sigma) but no temporal correlation yet
+    L = _spatial_cholesky(numchan, float(sigma))
+    e = rng.standard_normal((num_realizations, nsamples, numchan)) @ L.T
+
+    # add temporal covariance with a random AR filter per channel and realization
+    a = randAR(P, size=num_realizations*numchan, rng=rng)
+    e = e.transpose(1, 0, 2).reshape(nsamples, -1)
+    e = _ar_filter(e, a)
+    e = e.reshape(nsamples, num_realizations, numchan).transpose(1, 0, 2)
+
+    # Convert to raw signal
+    data = 100*np.exp(-e*0.005)
+    return data.reshape(num_realizations, nsamples, numchannels, numwavelengths)
+
+
+def ARnoise(geo2D=None,measList=None,t=None, P=10, sigma=0.33, rng=None):
     """ This function will simulate fNIRS CW raw amp data with AR noise
     This matches the defaults for the nirs toolbox nirs.modules.simARNoise
     
@@ -136,6 +229,7 @@ def ARnoise(geo2D=defaultProbe2D()[0],measList=defaultProbe2D()[1],
         t:      time variable.  np.array {Default 0-300s @ 10Hz}
         P:      AR model order (calls randAR(P) to generate) {default 10}
         sigma:  Spatial covariance noise prior {default 0.33}
+        rng:    seed or numpy.random.Generator {default None, numpy's global state}
 
     Outputs:
         rec:    Cedalion recording structure 
@@ -146,36 +240,28 @@ def ARnoise(geo2D=defaultProbe2D()[0],measList=defaultProbe2D()[1],
 
     """
  
+    if geo2D is None or measList is None:
+        default_geo2D, default_measList = _shared_default_probe2D()
+        geo2D = default_geo2D if geo2D is None else geo2D
+        measList = default_measList if measList is None else measList
+    if t is None:
+        t = np.round([(j+1)*.1 for j in range(0,3000)],3)
 
-    numchan = len(measList['channel'])*len(measList['wavelength'])
-    
     nsamples = len(t)
 
     # Create the time dataarray
     t = xr.DataArray(data=t,dims=['time'],coords={'time':t})
     t.assign_coords(samples=('time',np.arange(nsamples)))
 
-    # noise mean and spatial covariance
-    mu = np.zeros(numchan);
-    S = toeplitz([1]+ [sigma]*(numchan-1))
-    e =  np.random.multivariate_normal(mu, S, nsamples)
-    # This noise has spatial covariance (set by sigma) but no temporal correlation yet
-
-    # add temporal covariance
-    for i in range(numchan):
-        a = randAR( P )  # This generates a random set of AR coeffients to smooth the data
-        e[:,i] = scipy.signal.lfilter(np.ones(P+1), np.append(1,-a), e[:,i])
-    
-    # Convert to raw signal
-    data = 100*np.exp(-e*0.005)
-    data = np.reshape(data,(nsamples,len(measList['channel']),len(measList['wavelength'])))
+    data = ARnoise_batch(1, nsamples, len(measList['channel']),
+                         len(measList['wavelength']), P, sigma, rng)[0]
   
     # Create the recording class
     rec=cedalion.dataclasses.recording.Recording()
     rec.geo2d = geo2D
 
     # Make a fake 3D geom
-    rec.geo3d = xr.DataArray(data=np.concat((geo2D.data,np.zeros((geo2D.data.shape[0],1))),axis=1),
+    rec.geo3d = xr.DataArray(data=np.concatenate((geo2D.data,np.zeros((geo2D.data.shape[0],1))),axis=1),
                              dims=geo2D.dims,coords=geo2D.coords,attrs=geo2D.attrs)
     #TODO generate a real 3D probe to use
 
@@ -310,19 +396,121 @@ def Data(noise=None,stim=None,snr=0.5,
 
 
 
-def simMotionArtifact(data,spikes_per_minute=2, shifts_per_minute=0.5, motionMask=None):
-    
-    if(hasattr(data,'wavelength')):
-        data=data.transpose('time','channel','wavelength')
+def Data_fast(noise=None,stim=None,snr=0.5,
+              channels=None,basis=glm.Gamma(tau=0 * units.s, sigma=3 * units.s, T=3 * units.s),
+              modifiers=None,dpf=(6,6),spectrum="prahl",rng=None):
+    """
+        Fast variant of Data() that adds the simulated HRF directly to the raw amplitudes
+
+        Data() converts the recording to concentrations, fits an AR model per channel
+        and a GLM, and converts the predicted HRF back to raw amplitudes. Since these
+        conversions are linear in optical density, the HRF can instead be added
+        analytically: its optical density change is E * dist * dpf times the
+        concentration change. The SNR is scaled with innovation_std(), a vectorized
+        AR innovation estimate, instead of ar_filter(). The result matches Data() up
+        to the differences in the AR innovation estimates.
+
+        Inputs:
+            noise, stim, snr, channels, basis, modifiers: as in Data()
+            dpf:    differential pathlength factor per wavelength {default (6,6)}
+            spectrum: extinction coefficient spectrum {default "prahl"}
+            rng:    seed or numpy.random.Generator {default None, numpy's global state}
+
+        Outputs:
+            rec:    recording with the HRF added to the amp (raw) timecourse 
+            truth:  xr.DataArray indicating (binary) where the simulated HRF was added
+    """
+    rng = _get_rng(rng)
+
+    if(noise is None):
+        noise=ARnoise(rng=rng)
+    if(stim  is None):
+        stim=cedalion.testing.simEvents.rand_stim_design(rng=rng)
+
+    amp=noise['amp'].transpose('time','channel','wavelength')
+    amp_units=amp.pint.units
+    amp=amp.pint.dequantify()
+    numchannels=len(amp.channel)
+
+    # optical density change per molar concentration change: K[channel,wavelength,chromo]
+    E=cedalion.nirs.get_extinction_coefficients(spectrum, amp.wavelength.values)
+    E=E.pint.to('1/mm/M').pint.dequantify().transpose('chromo','wavelength').values
+    dpf=np.asarray(dpf,dtype=float)
+    if dpf[0] != 1:
+        geo3d=noise.geo3d.pint.to('mm').pint.dequantify()
+        index={label:i for i,label in enumerate(geo3d.label.values)}
+        pos=geo3d.values
+        src=[index[label] for label in amp.source.values]
+        det=[index[label] for label in amp.detector.values]
+        dists=np.linalg.norm(pos[src]-pos[det],axis=1)
     else:
-        data=data.transpose('time','channel','chromo')
+        dists=np.ones(numchannels)
+    K=dists[:,None,None]*(dpf[:,None]*E.T)[None,:,:]
 
-    shp=data.shape
-    dd=np.reshape(data.as_numpy().data,(shp[0],shp[1]*shp[2]))
-    time=data.time.to_numpy()
+    # noise in optical density and concentration (micromolar) space
+    od=-np.log(amp.values/amp.values.mean(axis=0))
+    conc=np.einsum('nkw,tnw->tnk',np.linalg.pinv(K),od)*1e6
+
+    # If no channels were defined as "truth", then randomly select 1/2 the data to add
+    if(channels is None):
+        perm = rng.permutation(numchannels)
+        channels=np.zeros((numchannels,2))
+        channels[perm[:int(np.round(numchannels/2))],:]=1
+
+    # beta amplitudes to use per channel based on provided SNR 
+    b=snr*cedalion.math.ar_model.innovation_std(conc,pmax=10)
+    betas=np.stack([b[:,0],-b[:,1]],axis=1)*(channels==1)
+
+    # the HRF regressor of the first condition
+    ts=xr.DataArray(np.zeros((len(amp.time),1,2)),dims=['time','channel','chromo'],
+                    coords={'time':amp.time.values,'channel':amp.channel.values[:1],
+                            'chromo':['HbO','HbR']})
+    ts=ts.assign_coords(samples=('time',np.arange(len(amp.time))))
+    ts.time.attrs['units']=noise['amp'].time.attrs.get('units','s')
+    regressors=glm.design_matrix.make_hrf_regressors(ts,stim,basis)
+    hrf=regressors.isel(regressor=0).transpose('time','chromo').values
+
+    # concentration change (micromolar) to optical density change
+    dod=np.einsum('nwk,tk,nk->tnw',K,hrf,betas)*1e-6
+
+    data=amp.copy(data=100*np.exp(-(od+dod)))
+    if amp_units is not None:
+        data=data.pint.quantify(amp_units)
+
+    if(modifiers is not None):
+        for mod in modifiers:
+            data=mod(data)
+
+    noise['amp']=data
+    noise.stim=stim
+
+    # Create the truth table denoting where the HRF was added
+    truth=(channels==1)
+    truth=xr.DataArray(data=truth,dims=['channel','chromo'],
+                       coords={'channel':amp.channel,
+                               'chromo':['HbO','HbR']})
+
+    return noise,truth
+
+
+
+def _motion_artifacts(dd, time, spikes_per_minute=2, shifts_per_minute=0.5,
+                      motionMask=None, rng=None):
+    """
+    Adds spikes and baseline shifts to a batch of recordings.
+
+    Inputs:
+        dd:     np.array (recording, time, channel) time courses. Modified in place.
+        time:   np.array (time,) time axis in seconds
+        spikes_per_minute, shifts_per_minute, motionMask, rng: see simMotionArtifact()
+    Outputs:
+        dd
+    """
+    rng = _get_rng(rng)
+    nrec, nsamples, nchan = dd.shape
 
     if motionMask is None:
-        motionMask = np.ones(len(time), dtype=bool)
+        motionMask = np.ones(nsamples, dtype=bool)
 
     num_spikes = np.int64(spikes_per_minute * (time[-1] - time[0]) / 60)
     num_shifts = np.int64(shifts_per_minute * (time[-1] - time[0]) / 60)
@@ -330,46 +518,121 @@ def simMotionArtifact(data,spikes_per_minute=2, shifts_per_minute=0.5, motionMas
     lst = np.where(motionMask)[0]
     nsamp = len(lst)
 
-    spike_inds = np.random.randint(1, nsamp - 1, size=num_spikes)
-    shift_inds = np.random.randint(1, nsamp - 1, size=num_shifts)
+    spike_inds = lst[_integers(rng, 1, nsamp - 1, size=(nrec, num_spikes))]
+    shift_inds = lst[_integers(rng, 1, nsamp - 1, size=(nrec, num_shifts))]
+
+    spike_amp_Z = 10 * rng.standard_normal((nrec, num_spikes))
+    shift_amp_Z = 10 * rng.standard_normal((nrec, num_shifts))
+
+    mu = np.mean(dd, axis=1)
+    stds = np.std(dd, axis=1)
+
+    # Spikes rise from t_start to t_peak and fall symmetrically. Each spike covers the
+    # samples in (t_start, t_peak] and their mirror images after t_peak.
+    width = 9.9 * rng.random((nrec, num_spikes)) + 0.1  # Spike duration of 0.1-10 seconds
+    t_peak = time[spike_inds]
+    t_start = t_peak - width / 2
+    first = np.searchsorted(time, t_start, side="right")
+    npeak = spike_inds - first + 1
+    length = 2 * npeak - 1
+
+    amp = np.abs(spike_amp_Z)[..., None]
+    amp = amp + 0.25 * amp * rng.standard_normal((nrec, num_spikes, nchan))
+    amp *= stds[:, None, :]
+
+    # one entry per spike sample
+    spike_id = np.repeat(np.arange(nrec * num_spikes), length.ravel())
+    offsets = np.arange(len(spike_id)) - np.repeat(
+        np.cumsum(length.ravel()) - length.ravel(), length.ravel()
+    )
+    rec_id = spike_id // max(num_spikes, 1)
+    first_s = first.ravel()[spike_id]
+    mirrored = np.minimum(offsets, 2 * npeak.ravel()[spike_id] - 2 - offsets)
+    exponent = (time[first_s + mirrored] - t_start.ravel()[spike_id]) / (
+        width.ravel()[spike_id] / 2
+    )
+
+    amp = amp.reshape(-1, nchan)[spike_id]
+    amp = amp + (2 * rng.random(amp.shape) - 1) * 0.5 * amp
+    spike_dd = amp ** exponent[:, None]
+
+    target = first_s + offsets
+    valid = target < nsamples
+    np.add.at(dd, (rec_id[valid], target[valid]), spike_dd[valid])
+
+    # Baseline shifts persist until the end of the recording
+    shifts = np.zeros((nrec, nsamples))
+    np.add.at(
+        shifts, (np.repeat(np.arange(nrec), num_shifts), shift_inds.ravel()),
+        shift_amp_Z.ravel(),
+    )
+    dd += np.cumsum(shifts, axis=1)[..., None] * stds[:, None, :]
 
-    spike_amp_Z = 10 * np.random.randn(num_spikes)
-    shift_amp_Z = 10 * np.random.randn(num_shifts)
+    # Restore original mean intensity
+    dd += (mu - np.mean(dd, axis=1))[:, None, :]
 
-    mu = np.mean(dd, axis=0)
-    stds = np.std(dd, axis=0)
+    # Prevent negative intensities by lifting affected channels above zero
+    dd_min = np.min(dd, axis=1)
+    has_neg = dd_min <= 0
+    lift = np.where(has_neg, -dd_min + 0.5 * np.std(dd, axis=1), 0)
+    dd += lift[:, None, :]
 
-    for i in range(num_spikes):
-        width = 9.9 * np.random.rand() + 0.1  # Spike duration of 0.1-10 seconds
+    return dd
 
-        t_peak = time[spike_inds[i]]
-        t_start = t_peak - width / 2
-        t_inds = np.where((time > t_start) & (time <= t_peak))[0]
-        spike_time = np.concatenate((time[t_inds], time[t_inds[-2::-1]])) - t_start
 
-        amp=np.abs(spike_amp_Z[i])
-        amp = amp+0.25 * np.abs(amp) * np.random.randn(len(stds))
-        amp *= stds
-        amp = amp+(2 * np.random.rand(len(spike_time), len(stds)) - 1) * 0.5 * amp
+def simMotionArtifact(data,spikes_per_minute=2, shifts_per_minute=0.5, motionMask=None,
+                      rng=None):
+    """
+    Adds simulated motion artifacts (spikes and baseline shifts) to a time course
 
-        tau = width / 2
-        spike_dd = amp ** np.expand_dims((spike_time / tau),axis=1)*np.ones((1,amp.shape[1]))
+    Inputs:
+        data:   xr.DataArray with dims time, channel and wavelength or chromo
+        spikes_per_minute: average number of spikes per minute {default 2}
+        shifts_per_minute: average number of baseline shifts per minute {default 0.5}
+        motionMask: boolean np.array (time,) of samples at which artifacts may occur
+            {default None, all samples}
+        rng:    seed or numpy.random.Generator {default None, numpy's global state}
 
-        t_inds = np.arange(t_inds[0], min(t_inds[0] + spike_dd.shape[0], dd.shape[0]))
+    Outputs:
+        data:   xr.DataArray with dims (time, channel, wavelength|chromo)
+    """
+    
+    if(hasattr(data,'wavelength')):
+        data=data.transpose('time','channel','wavelength')
+    else:
+        data=data.transpose('time','channel','chromo')
+
+    data_units = data.pint.units
+    data = data.pint.dequantify()
 
-        dd[t_inds, :] += spike_dd[:len(t_inds), :]
+    shp=data.shape
+    dd=np.reshape(data.values.astype(float),(1,shp[0],shp[1]*shp[2]))
+    time=data.time.to_numpy()
 
-    for i in range(num_shifts):
-        shift_amt = shift_amp_Z[i] * stds
-        dd[shift_inds[i]:, :] += shift_amt
+    dd = _motion_artifacts(dd, time, spikes_per_minute, shifts_per_minute,
+                           motionMask, rng)
 
-    # Restore original mean intensity
-    dd += (mu - np.mean(dd, axis=0))
+    data = data.copy(data=np.reshape(dd,shp))
+    if data_units is not None:
+        data = data.pint.quantify(data_units)
+    return data
 
-    # Prevent negative intensities
-    while np.any(dd <= 0):
-        has_neg = np.any(dd < 0, axis=0)
-        dd[:, has_neg] += np.random.rand(1, np.sum(has_neg)) * np.std(dd[:, has_neg], axis=0)
 
-    data.data=np.reshape(dd,shp)
-    return data
\ No newline at end of file
+def simMotionArtifact_batch(data, time, spikes_per_minute=2, shifts_per_minute=0.5,
+                            motionMask=None, rng=None):
+    """
+    Adds simulated motion artifacts to many recordings at once
+
+    Inputs:
+        data:   np.array (realization, time, ...), e.g. as returned by ARnoise_batch()
+        time:   np.array (time,) time axis in seconds
+        spikes_per_minute, shifts_per_minute, motionMask, rng: see simMotionArtifact()
+
+    Outputs:
+        data:   np.array with the same shape as data
+    """
+    data = np.asarray(data, dtype=float)
+    dd = data.reshape(data.shape[0], data.shape[1], -1).copy()
+    dd = _motion_artifacts(dd, np.asarray(time), spikes_per_minute, shifts_per_minute,
+                           motionMask, rng)
+    return dd.reshape(data.shape)
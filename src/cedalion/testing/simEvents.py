@@ -9,8 +9,28 @@ This is a collection of functions for generating stimulus stiming information us
 
 """
 
+def _get_rng(rng=None):
+    """
+    Returns a numpy.random.Generator for rng (seed, SeedSequence or Generator).
+    RandomState instances are passed through. If rng is None, numpy's global
+    random state is used, so that np.random.seed still controls the simulation.
+    """
+    if rng is None:
+        return np.random.mtrand._rand
+    if isinstance(rng, np.random.RandomState):
+        return rng
+    return np.random.default_rng(rng)
+
+
+def _integers(rng, low, high, size=None):
+    """Random integers in [low, high) for Generators and RandomState instances."""
+    if isinstance(rng, np.random.RandomState):
+        return rng.randint(low, high, size=size)
+    return rng.integers(low, high, size=size)
+
+
 def rand_stim_design(t=np.round([(j+1)*.1 for j in range(0,3000)],3), 
-                     stim_dur=2, stim_space=7, ncond=1):
+                     stim_dur=2, stim_space=7, ncond=1, rng=None):
     """
         This function generates a random event-related design
         
@@ -19,11 +39,14 @@ def rand_stim_design(t=np.round([(j+1)*.1 for j in range(0,3000)],3),
             stim_dur: duration of events (float; seconds) {default 2s}
             stim_space: (float seconds) {default 7s}.  This is the average time between the onsets of events
             ncond:  Number of conditions to simulate {default 1}. Events are named "A","B",...
+            rng: seed or numpy.random.Generator {default None, numpy's global state}
 
         Outputs:
             stim design: pandas.DataFrame
     """
     
+    rng = _get_rng(rng)
+
     # min max times
     tmin = np.min(t) + 1 * stim_dur
     tmax = np.max(t) - 2 * stim_dur
@@ -32,7 +55,7 @@ def rand_stim_design(t=np.round([(j+1)*.1 for j in range(0,3000)],3),
     nrnd = round(2 * (tmax - tmin) / stim_space)
 
     # random times between tasks
-    dt = stim_space / 2 + np.random.exponential(stim_space / 2, nrnd)
+    dt = stim_space / 2 + rng.exponential(stim_space / 2, nrnd)
 
     # onsets
     onset = tmin + np.cumsum(np.concatenate(([0], dt)))
@@ -46,7 +69,7 @@ def rand_stim_design(t=np.round([(j+1)*.1 for j in range(0,3000)],3),
 
     # output
     stim = {}
-    r = np.random.randint(1, ncond + 1)
+    r = int(rng.random() * ncond) + 1
 
     stim=pd.DataFrame()
     for i in range(1, ncond + 1):
@@ -1,7 +1,7 @@
 """Plots an fNIRS probe's sensitivity profile on a 3D brain surface.
 
     Args:
-        sensitivity: 
+        sensitivity: Sensitivity matrix Adot, either dense or a SparseAdot.
         brain_surface:
         head_surface:
         labeled_points: 
@@ -20,6 +20,7 @@ import pyvista as pv
 
 import cedalion
 import cedalion.dataclasses as cdc
+from cedalion.imagereco.sparse import SparseAdot
 
 class Main():
     def __init__(self, sensitivity, brain_surface, 
@@ -46,8 +47,13 @@ class Main():
         b = cdc.VTKSurface.from_trimeshsurface(self.brain)
         b = pv.wrap(b.mesh)
 
-        sensitivity_matrix = self.sensitivity.where(self.sensitivity['is_brain'], drop=True)
-        sensitivity_matrix = sensitivity_matrix.sel(wavelength = self.wavelength).sum(dim='channel').values
+        if isinstance(self.sensitivity, SparseAdot):
+            sensitivity_matrix = self.sensitivity.wavelength_block(self.wavelength)
+            sensitivity_matrix = sensitivity_matrix[:, self.sensitivity.is_brain]
+            sensitivity_matrix = np.asarray(sensitivity_matrix.sum(axis=0)).ravel()
+        else:
+            sensitivity_matrix = self.sensitivity.where(self.sensitivity['is_brain'], drop=True)
+            sensitivity_matrix = sensitivity_matrix.sel(wavelength = self.wavelength).sum(dim='channel').values
 
 
         sensitivity_matrix[sensitivity_matrix<=0] = sensitivity_matrix[sensitivity_matrix>0].min()
@@ -1,9 +1,73 @@
 """Utility functions for xarray objects."""
 
 import numpy as np
+import pint
 import xarray as xr
 
 
+def strip_units(array: xr.DataArray) -> tuple[xr.DataArray, pint.Unit | None]:
+    """Remove the units of a quantified DataArray without copying its data.
+
+    Unlike ``array.pint.dequantify()``, which copies the data and rebuilds all
+    coordinates, only the pint wrapper around the data is removed. The returned array
+    shares its buffer with the input, so it must not be modified in place.
+
+    Args:
+        array: quantified or unitless DataArray
+
+    Returns:
+        the unitless array and its units (None if array was not quantified)
+    """
+    data = array.data
+    if not isinstance(data, pint.Quantity):
+        return array, None
+
+    if any(isinstance(c.data, pint.Quantity) for c in array.coords.values()):
+        # quantified coordinates must be converted, too
+        units = array.pint.units
+        return array.pint.dequantify(), units
+
+    return array.copy(deep=False, data=data.magnitude), data.units
+
+
+def restore_units(array: xr.DataArray, units: pint.Unit | None) -> xr.DataArray:
+    """Attach units removed by :func:`strip_units` without copying the data.
+
+    Args:
+        array: unitless DataArray
+        units: the units to attach. If None, array is returned unchanged.
+
+    Returns:
+        the quantified array
+    """
+    if units is None:
+        return array
+
+    result = array.copy(deep=False, data=pint.Quantity(array.data, units))
+    result.attrs.pop("units", None)
+    return result
+
+
+def apply_unitless(array: xr.DataArray, *funcs) -> xr.DataArray:
+    """Apply a chain of unit-preserving functions to a quantified array.
+
+    The units are stripped once before the first and restored once after the last
+    function, so that the functions operate on unitless data and skip their own unit
+    conversions.
+
+    Args:
+        array: quantified or unitless DataArray
+        funcs: functions that map a DataArray to a DataArray with the same units
+
+    Returns:
+        the result of the last function with the units of array
+    """
+    array, units = strip_units(array)
+    for func in funcs:
+        array = func(array)
+    return restore_units(array, units)
+
+
 def pinv(array: xr.DataArray) -> xr.DataArray:
     """Calculate the pseudoinverse of a 2D xr.DataArray.
 
@@ -23,14 +87,13 @@ def pinv(array: xr.DataArray) -> xr.DataArray:
     dims = list(array.dims)
     transposed_dims = dims[::-1]
 
-    units = array.pint.units
+    array, units = strip_units(array)
     inv_units = None
 
-    # determine inverted units and dequantify
+    # determine inverted units
     if units is not None:
         q = 1 / units
         inv_units = q.units
-        array = array.pint.dequantify()
 
     # apply numpy's pinv
     array_inv = xr.apply_ufunc(
@@ -40,11 +103,7 @@ def pinv(array: xr.DataArray) -> xr.DataArray:
         output_core_dims=[transposed_dims],
     )
 
-    # quantify if necessary
-    if inv_units is not None:
-        array_inv = array_inv.pint.quantify(inv_units)
-
-    return array_inv
+    return restore_units(array_inv, inv_units)
 
 
 def norm(array: xr.DataArray, dim: str) -> xr.DataArray:
@@ -62,17 +121,13 @@ def norm(array: xr.DataArray, dim: str) -> xr.DataArray:
     if dim not in array.dims:
         raise ValueError(f"array does not have dimension '{dim}'")
 
-    if (units := array.pint.units) is not None:
-        array = array.pint.dequantify()
+    array, units = strip_units(array)
 
     normed = xr.apply_ufunc(
         np.linalg.norm, array, input_core_dims=[[dim]], kwargs={"axis": -1}
     )
 
-    if units is not None:
-        normed = normed.pint.quantify(units)
-
-    return normed
+    return restore_units(normed, units)
 
 
 def mask(array: xr.DataArray, initval: bool) -> xr.DataArray:
@@ -144,8 +199,7 @@ def convolve(data_array: xr.DataArray, kernel: np.ndarray, dim: str) -> xr.DataA
     if dim not in data_array.dims:
         raise ValueError(f"array does not have dimension '{dim}'")
 
-    if (units := data_array.pint.units) is not None:
-        data_array = data_array.pint.dequantify()
+    data_array, units = strip_units(data_array)
 
     convolved = xr.apply_ufunc(
         lambda x: np.convolve(x, kernel, mode="same"),
@@ -155,10 +209,7 @@ def convolve(data_array: xr.DataArray, kernel: np.ndarray, dim: str) -> xr.DataA
         vectorize=True,
     )
 
-    if units is not None:
-        convolved = convolved.pint.quantify(units)
-
-    return convolved
+    return restore_units(convolved, units)
 
 
 def other_dim(data_array: xr.DataArray, *dims: str) -> str:
@@ -1,7 +1,12 @@
+import os
+import tempfile
+
 from cedalion.dataclasses.geometry import PycortexSurface, TrimeshSurface
+from cedalion.geometry import geodesics
 import trimesh.creation
 from cedalion import units
 import numpy as np
+import scipy.sparse.csgraph
 from numpy.testing import assert_allclose
 
 
@@ -39,3 +44,81 @@ def test_pycortex_geodesic_distance_on_sphere():
     # Absolute tolerance of 0.1 at a radius of 10 works, too.
 
     assert_allclose(distances, expected_distances, atol=0.1)
+
+
+def test_geodesic_engine_batched_and_cached():
+    s = trimesh.creation.icosphere(subdivisions=3, radius=10)
+    ts = TrimeshSurface(s, "some_crs", units.cm)
+    ps = PycortexSurface.from_trimeshsurface(ts)
+
+    geodesics.clear_cache()
+    engine = geodesics.GeodesicEngine.for_surface(ps, m=10)
+
+    # a second instance of the same mesh shares the engine
+    ps2 = PycortexSurface.from_trimeshsurface(ts)
+    assert geodesics.GeodesicEngine.for_surface(ps2, m=10) is engine
+
+    source_sets = [[0], [5], [7, 100], [200]]
+    batched = engine.distances(source_sets, batch_size=3)
+    assert batched.shape == (4, ps.nvertices)
+    for verts, d in zip(source_sets, batched):
+        assert_allclose(d, ps2.geodesic_distance(verts, m=10), atol=1e-10)
+
+    vertices = [0, 5, 200]
+    table = engine.pairwise_distances(vertices, symmetric=False)
+    assert_allclose(table, batched[[0, 1, 3]][:, vertices], atol=1e-10)
+    table = engine.pairwise_distances(vertices)
+    assert_allclose(table, table.T)
+    assert_allclose(np.diag(table), 0)
+
+    with tempfile.TemporaryDirectory() as dirpath:
+        geodesics.clear_cache()
+        geodesics.GeodesicEngine.for_surface(ps, m=10, cache_dir=dirpath)
+        assert len(os.listdir(dirpath)) == 1
+
+        # a new process would load the systems from disk and factorize them
+        geodesics.clear_cache()
+        loaded = geodesics.GeodesicEngine.for_surface(ps, m=10, cache_dir=dirpath)
+        assert_allclose(loaded.distances(source_sets), batched, atol=1e-10)
+
+
+def test_geodesic_paths(monkeypatch):
+    s = trimesh.creation.icosphere(subdivisions=3, radius=10)
+    ps = PycortexSurface.from_trimeshsurface(TrimeshSurface(s, "some_crs", units.cm))
+    engine = geodesics.GeodesicEngine.for_surface(ps, m=1)
+    graph = engine.edge_graph
+
+    def path_length(path):
+        return sum(graph[path[i], path[i + 1]] for i in range(len(path) - 1))
+
+    pairs = [(0, 100), (5, 100), (17, 300), (300, 300)]
+    paths = ps.geodesic_paths(pairs, m=1)
+    exact = ps.geodesic_paths(pairs, method="dijkstra", m=1)
+
+    for (a, b), path, exact_path in zip(pairs, paths, exact):
+        assert path[0] == a and path[-1] == b
+        assert all(graph[path[i], path[i + 1]] > 0 for i in range(len(path) - 1))
+        assert path_length(path) <= 1.1 * path_length(exact_path) + 1e-12
+        assert_allclose(
+            path_length(exact_path),
+            scipy.sparse.csgraph.dijkstra(graph, indices=a)[b],
+        )
+
+    assert ps.geodesic_path(0, 100, m=1) == paths[0].tolist()
+
+    # a local minimum in the distance field traps the descent in a cycle
+    d = engine.distances([[100]])[0]
+    sink = paths[0][len(paths[0]) // 2]
+    d[sink] = -1.0
+    traced, reached = engine.trace_paths(d, [0, 100], 100)
+    assert reached.tolist() == [False, True]
+    assert traced[0][-1] == sink
+    assert len(traced[0]) == len(set(traced[0]))
+    assert traced[1].tolist() == [100]
+
+    # noisy distances fall back to exact paths
+    monkeypatch.setattr(engine, "distances", lambda *args, **kwargs: d[None, :])
+    paths = engine.geodesic_paths([(0, 100)])
+    assert paths[0].tolist() == exact[0].tolist()
+    paths = engine.geodesic_paths([(0, 100)], fallback=False)
+    assert paths[0][-1] == sink
@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+import trimesh.creation
+import xarray as xr
+
+import cedalion.geometry.landmarks as landmarks
+from cedalion import units
+from cedalion.dataclasses import PointType, TrimeshSurface
+
+
+@pytest.fixture
+def ellipsoid_head():
+    mesh = trimesh.creation.icosphere(subdivisions=5, radius=1.0)
+    mesh.apply_scale([75, 95, 85])
+    scalp = TrimeshSurface(mesh, "ras", units.mm)
+
+    lm = xr.DataArray(
+        np.array([[0, 95, 0], [0, -95, 0], [-75, 0, 0], [75, 0, 0]], dtype=float),
+        dims=["label", "ras"],
+        coords={
+            "label": ["Nz", "Iz", "LPA", "RPA"],
+            "type": ("label", [PointType.LANDMARK] * 4),
+        },
+    ).pint.quantify("mm")
+
+    return scalp, lm
+
+
+def test_landmarks_builder_matches_vtk_builder(ellipsoid_head):
+    scalp, lm = ellipsoid_head
+
+    expected = landmarks.LandmarksBuilder1010(scalp, lm).build()
+    result = landmarks.LandmarksBuilder(scalp, lm).build()
+
+    assert result.label.values.tolist() == expected.label.values.tolist()
+    diff = (result - expected).pint.to("mm").pint.dequantify().values
+    assert np.linalg.norm(diff, axis=1).max() < 1.5
+
+    # the ellipsoid is symmetric, so are the positions
+    result = result.pint.dequantify()
+    np.testing.assert_allclose(result.sel(label="Cz"), [0, 0, 85], atol=1e-6)
+    for left, right in [("T7", "T8"), ("C3", "C4"), ("F7", "F8"), ("PO5", "PO6")]:
+        mirrored = result.sel(label=left).values * [-1, 1, 1]
+        np.testing.assert_allclose(mirrored, result.sel(label=right), atol=1e-2)
+
+
+def test_build_landmarks_1005(ellipsoid_head):
+    scalp, lm = ellipsoid_head
+
+    result = landmarks.build_landmarks(
+        [scalp, scalp], [lm, lm], density="10-5", subjects=["a", "b"]
+    )
+    assert result.dims == ("subject", "label", "ras")
+    assert result.subject.values.tolist() == ["a", "b"]
+    assert len(set(result.label.values)) == result.sizes["label"] == 270
+
+    for label in ["AFp7h", "FFC5h", "C1h", "O1h", "OIz", "POO8", "T8h"]:
+        assert label in result.label
+
+    lm1010 = landmarks.LandmarksBuilder(scalp, lm).build()
+    np.testing.assert_allclose(
+        result.sel(subject="a", label=lm1010.label).pint.dequantify(),
+        lm1010.pint.dequantify(),
+    )
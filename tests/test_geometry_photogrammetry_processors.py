@@ -0,0 +1,117 @@
+import colorsys
+
+import numpy as np
+import pytest
+import trimesh.creation
+
+import cedalion.dataclasses as cdc
+import cedalion.geometry.photogrammetry.processors as processors
+from cedalion import units
+
+
+def test_rgb_to_hsv():
+    rng = np.random.default_rng(0)
+    rgb = rng.integers(0, 256, size=(1000, 3)).astype(float)
+    # gray values and colors with equal maximum channels
+    rgb[:10] = rgb[:10, :1]
+    rgb[10:20, 1] = rgb[10:20, 0]
+    rgb[20:30, 2] = rgb[20:30, 1]
+
+    h, s, v = processors.rgb_to_hsv(rgb)
+    expected = np.array([colorsys.rgb_to_hsv(*c) for c in rgb])
+
+    np.testing.assert_array_equal(h, expected[:, 0])
+    np.testing.assert_array_equal(s, expected[:, 1])
+    np.testing.assert_array_equal(v, expected[:, 2])
+
+
+def test_voxel_downsample():
+    rng = np.random.default_rng(0)
+    vertices = rng.uniform(0, 10, size=(500, 3))
+
+    centroids, counts, inverse = processors.voxel_downsample(vertices, 2.0)
+
+    assert counts.sum() == len(vertices)
+    assert len(centroids) == len(counts) <= 5**3
+    for i in range(len(centroids)):
+        np.testing.assert_allclose(centroids[i], vertices[inverse == i].mean(axis=0))
+    # all vertices of a cell share the same grid indices
+    cells = np.floor(vertices / 2.0)
+    for i in range(len(centroids)):
+        assert len(np.unique(cells[inverse == i], axis=0)) == 1
+
+
+def test_batched_pca():
+    rng = np.random.default_rng(0)
+    nclusters = 5
+    cluster = rng.integers(0, nclusters, size=400)
+    scales = rng.uniform(0.1, 5, size=(nclusters, 3))
+    vertices = rng.normal(size=(400, 3)) * scales[cluster] + cluster[:, None]
+
+    eigenvalues, eigenvecs = processors.batched_pca(vertices, cluster, nclusters)
+
+    for i in range(nclusters):
+        expected_values, expected_vecs = processors.pca(vertices[cluster == i])
+        np.testing.assert_allclose(eigenvalues[i], expected_values)
+        # eigenvectors are determined up to their sign
+        signs = np.sign(np.sum(eigenvecs[i] * expected_vecs, axis=0))
+        np.testing.assert_allclose(eigenvecs[i] * signs, expected_vecs, atol=1e-10)
+
+
+def sticker_scan(centers, radius=6.5):
+    """Gray sphere with red circular stickers around the given directions."""
+    mesh = trimesh.creation.icosphere(subdivisions=7, radius=80.0)
+    vertices = np.asarray(mesh.vertices)
+
+    colors = np.full((len(vertices), 4), [128, 128, 128, 255], dtype=np.uint8)
+    for center in centers:
+        in_sticker = np.linalg.norm(vertices - center, axis=1) < radius
+        colors[in_sticker] = [230, 20, 20, 255]
+    mesh.visual.vertex_colors = colors
+
+    return cdc.TrimeshSurface(mesh, "ras", units.mm)
+
+
+def sticker_centers():
+    directions = np.array(
+        [[0, 0, 1], [1, 0, 1], [-1, 0, 1], [0, 1, 1], [0, -1, 1], [1, 1, 0.2]]
+    )
+    return 80.0 * directions / np.linalg.norm(directions, axis=1, keepdims=True)
+
+
+def test_cluster_voxel_downsampling():
+    surface = sticker_scan(sticker_centers())
+    vertices = np.asarray(surface.mesh.vertices)
+    red = surface.mesh.visual.vertex_colors[:, 0] > 200
+    vertices = vertices[red]
+
+    colors = {"O": (0.0, 0.05, 0.5, 1.0)}
+    dense = processors.ColoredStickerProcessor(colors)
+    assert dense.voxel_size is None
+    downsampled = processors.ColoredStickerProcessor(colors, voxel_size=0.5 * units.mm)
+
+    labels_dense = dense._cluster(vertices)
+    labels_downsampled = downsampled._cluster(vertices)
+
+    # both find one cluster per sticker and partition the vertices identically
+    assert len(set(labels_dense) - {-1}) == len(sticker_centers())
+    pairs = set(zip(labels_dense, labels_downsampled))
+    assert len(pairs) == len(set(labels_dense)) == len(set(labels_downsampled))
+
+
+def test_colored_sticker_processor_voxel_downsampling():
+    pytest.importorskip("cv2")
+
+    expected = sticker_centers()
+    surface = sticker_scan(expected)
+    colors = {"O": (0.0, 0.05, 0.5, 1.0)}
+
+    for voxel_size in [None, 0.5 * units.mm]:
+        processor = processors.ColoredStickerProcessor(colors, voxel_size=voxel_size)
+        centers, normals = processor.process(surface)
+
+        assert centers.sizes["label"] == len(expected)
+        found = centers.pint.dequantify().values
+        dists = np.linalg.norm(found[:, None, :] - expected[None, :, :], axis=2)
+        assert np.all(dists.min(axis=1) < 1.5)
+        assert np.all(dists.min(axis=0) < 1.5)
@@ -0,0 +1,104 @@
+import numpy as np
+import pytest
+import trimesh.creation
+import xarray as xr
+from scipy.spatial import KDTree
+
+import cedalion.geometry.registration as reg
+from cedalion import units
+from cedalion.dataclasses import PointType, TrimeshSurface
+from cedalion.geometry.utils import m_rot, m_scale1, m_scale3, m_trans
+
+
+@pytest.mark.parametrize(
+    "scaling,m_scale",
+    [
+        (None, m_scale1([1.0])),
+        ("iso", m_scale1([1.1])),
+        ("aniso", m_scale3([1.05, 0.95, 1.1])),
+    ],
+)
+def test_register_icp_svd(scaling, m_scale):
+    rng = np.random.default_rng(0)
+
+    mesh = trimesh.creation.icosphere(subdivisions=5, radius=1.0)
+    mesh.apply_scale([75, 95, 85])
+    mesh.vertices[:, 2] += 0.002 * mesh.vertices[:, 1] ** 2  # break the symmetry
+    surface = TrimeshSurface(mesh, "ras", units.mm)
+
+    lm_labels = ["Nz", "Iz", "LPA", "RPA"]
+    lm_coords = np.array([[0, 95, 0], [0, -95, 0], [-75, 0, 0], [75, 0, 0]], float)
+    lm_coords[:, 2] += 0.002 * lm_coords[:, 1] ** 2
+    landmarks = xr.DataArray(
+        lm_coords,
+        dims=["label", "ras"],
+        coords={"label": lm_labels, "type": ("label", [PointType.LANDMARK] * 4)},
+    ).pint.quantify("mm")
+
+    upper = mesh.vertices[mesh.vertices[:, 2] > 10]
+    optodes = upper[rng.choice(len(upper), 200, replace=False)]
+    expected = np.vstack((lm_coords, optodes))
+
+    # digitized points in cm in a rotated, shifted and scaled coordinate system
+    trafo = m_trans([5, -3, 10]) @ m_rot([0.1, -0.05, 0.08]) @ m_scale
+    inv = np.linalg.inv(trafo)
+    coords = expected @ inv[:3, :3].T + inv[:3, 3]
+    coords[4:] += rng.normal(scale=0.3, size=coords[4:].shape)
+
+    labels = lm_labels + [f"S{i}" for i in range(len(optodes))]
+    types = [PointType.LANDMARK] * 4 + [PointType.SOURCE] * len(optodes)
+    geo3d = xr.DataArray(
+        coords / 10,
+        dims=["label", "digitized"],
+        coords={"label": labels, "type": ("label", types)},
+    ).pint.quantify("cm")
+
+    result, rms = reg.register_icp_svd(
+        surface, landmarks, geo3d, scaling=scaling, seed=0, max_jobs=2
+    )
+    assert result.dims == ("ras", "digitized")
+    assert rms < 1.0
+
+    mapped = geo3d.points.apply_transform(result).pint.to("mm").pint.dequantify()
+    assert np.abs(mapped.values - expected).max() < 1.5
+
+    # the result does not depend on the number of jobs
+    result1, rms1 = reg.register_icp_svd(
+        surface, landmarks, geo3d, scaling=scaling, seed=0, max_jobs=1
+    )
+    np.testing.assert_allclose(result1.values, result.values)
+    assert rms1 == rms
+
+
+def test_icp_refines_initial_transform():
+    mesh = trimesh.creation.icosphere(subdivisions=5, radius=1.0)
+    mesh.apply_scale([75, 95, 85])
+    mesh.vertices[:, 2] += 0.002 * mesh.vertices[:, 1] ** 2  # break the symmetry
+    kdtree = KDTree(mesh.vertices)
+
+    rng = np.random.default_rng(0)
+    upper = mesh.vertices[mesh.vertices[:, 2] > 10]
+    points = upper[rng.choice(len(upper), 200, replace=False)]
+    no_landmarks = np.zeros((0, 3))
+
+    # start away from the optimum, which is the identity
+    M0 = m_trans([3, 2, 1])
+    M, mse, iterations = reg._icp(
+        kdtree, mesh.vertices, no_landmarks, no_landmarks, points, M0,
+        landmark_weight=1.0, scaling=None, max_iterations=100, tolerance=1e-6,
+    )
+
+    mse0 = np.mean(kdtree.query(points + [3, 2, 1])[0] ** 2)
+    assert iterations > 1
+    # the remaining error stems from matching points to the closest vertex
+    assert mse < 0.2 * mse0
+    assert np.linalg.norm(M[:3, 3]) < 0.5
+
+    # without iterations the initial transformation is returned unchanged
+    M, mse, iterations = reg._icp(
+        kdtree, mesh.vertices, no_landmarks, no_landmarks, points, M0,
+        landmark_weight=1.0, scaling=None, max_iterations=0, tolerance=1e-6,
+    )
+    assert iterations == 0
+    np.testing.assert_array_equal(M, M0)
+    np.testing.assert_allclose(mse, mse0)
@@ -2,9 +2,11 @@ import os
 import tempfile
 
 import numpy as np
+import pytest
 from scipy.sparse import find
 
 import cedalion.datasets
+import cedalion.io
 import cedalion.imagereco.forward_model as fw
 
 
@@ -54,3 +56,213 @@ def test_TwoSurfaceHeadModel():
         assert (head.t_ras2ijk.values == head2.t_ras2ijk.values).all()
         assert allclose(head.voxel_to_vertex_brain, head2.voxel_to_vertex_brain)
         assert allclose(head.voxel_to_vertex_scalp, head2.voxel_to_vertex_scalp)
+
+
+def write_synthetic_segmentation(dirpath):
+    """Write nested spherical tissue masks as NIfTI files."""
+    import nibabel
+
+    ii, jj, kk = np.meshgrid(*[np.arange(40)] * 3, indexing="ij")
+    r = np.sqrt((ii - 19.5) ** 2 + (jj - 19.5) ** 2 + (kk - 19.5) ** 2)
+
+    shells = {"wm": (0, 8), "gm": (8, 10), "csf": (10, 11), "skull": (11, 13),
+              "scalp": (13, 15)}
+    affine = np.diag([2.0, 2.0, 2.0, 1.0])
+    affine[:3, 3] = [-40, -40, -40]
+
+    mask_files = {}
+    for seg_type, (rmin, rmax) in shells.items():
+        volume = ((r >= rmin) & (r < rmax)).astype(np.uint8)
+        img = nibabel.Nifti1Image(volume, affine)
+        img.set_sform(affine, code=1)
+        fname = f"{seg_type}.nii"
+        nibabel.save(img, os.path.join(dirpath, fname))
+        mask_files[seg_type] = fname
+
+    return mask_files
+
+
+def test_map_segmentation_mask_to_surface():
+    import cedalion.geometry.segmentation as segm
+    from cedalion.imagereco.utils import map_segmentation_mask_to_surface
+
+    with tempfile.TemporaryDirectory() as dirpath:
+        mask_files = write_synthetic_segmentation(dirpath)
+        masks, t_ijk2ras = cedalion.io.read_segmentation_masks(dirpath, mask_files)
+
+    scalp_mask = masks.sel(segmentation_type="scalp")
+    surface = segm.surface_from_segmentation(masks, masks.segmentation_type.values)
+    surface = surface.apply_transform(t_ijk2ras)
+
+    m = map_segmentation_mask_to_surface(scalp_mask, t_ijk2ras, surface)
+
+    # reference: transform all voxel coordinates, then select the masked ones
+    coords = segm.cell_coordinates(scalp_mask, flat=True)
+    coords = coords.points.apply_transform(t_ijk2ras).pint.dequantify().values
+    cell_indices = np.flatnonzero(scalp_mask.values)
+    _, vertex_indices = surface.kdtree.query(coords[cell_indices])
+
+    assert m.shape == (scalp_mask.size, surface.nvertices)
+    np.testing.assert_array_equal(m.row, cell_indices)
+    np.testing.assert_array_equal(m.col, vertex_indices)
+
+
+def test_TwoSurfaceHeadModel_bundle_cache():
+    with tempfile.TemporaryDirectory() as dirpath:
+        mask_files = write_synthetic_segmentation(dirpath)
+        cache_dir = os.path.join(dirpath, "cache")
+
+        kwargs = dict(
+            segmentation_dir=dirpath,
+            mask_files=mask_files,
+            brain_seg_types=["gm", "wm"],
+            smoothing=0,
+            brain_face_count=None,
+            scalp_face_count=None,
+        )
+
+        head = fw.TwoSurfaceHeadModel.from_segmentation(cache_dir=cache_dir, **kwargs)
+        assert len(os.listdir(cache_dir)) == 1
+
+        head2 = fw.TwoSurfaceHeadModel.from_segmentation(cache_dir=cache_dir, **kwargs)
+        assert len(os.listdir(cache_dir)) == 1
+
+        # a parameter change results in a new cache entry
+        kwargs["smoothing"] = 0.5
+        fw.TwoSurfaceHeadModel.from_segmentation(cache_dir=cache_dir, **kwargs)
+        assert len(os.listdir(cache_dir)) == 2
+
+        # memory-mapped read-only
+        assert not head2.segmentation_masks.values.flags.writeable
+        assert (head.segmentation_masks.values == head2.segmentation_masks.values).all()
+        assert (
+            head.segmentation_masks.segmentation_type.values
+            == head2.segmentation_masks.segmentation_type.values
+        ).all()
+        assert (head.brain.mesh.vertices == head2.brain.mesh.vertices).all()
+        assert (head.brain.mesh.faces == head2.brain.mesh.faces).all()
+        assert (head.scalp.mesh.vertex_normals == head2.scalp.mesh.vertex_normals).all()
+        assert head.brain.crs == head2.brain.crs
+        assert head.brain.units == head2.brain.units
+        assert head.t_ijk2ras.dims == head2.t_ijk2ras.dims
+        assert (head.t_ijk2ras.values == head2.t_ijk2ras.values).all()
+        assert head.t_ijk2ras.pint.units == head2.t_ijk2ras.pint.units
+        assert allclose(head.voxel_to_vertex_brain, head2.voxel_to_vertex_brain)
+        assert allclose(head.voxel_to_vertex_scalp, head2.voxel_to_vertex_scalp)
+        del head2
+
+
+def test_snap_to_scalp_voxels():
+    import cedalion.dataclasses as cdc
+
+    with tempfile.TemporaryDirectory() as dirpath:
+        mask_files = write_synthetic_segmentation(dirpath)
+        head = fw.TwoSurfaceHeadModel.from_segmentation(
+            segmentation_dir=dirpath,
+            mask_files=mask_files,
+            brain_seg_types=["gm", "wm"],
+            smoothing=0,
+            brain_face_count=None,
+            scalp_face_count=None,
+        )
+
+    rng = np.random.default_rng(42)
+    vertices = head.scalp.mesh.vertices
+    sel = rng.choice(len(vertices), 50, replace=False)
+    pos = vertices[sel] + rng.normal(scale=0.5, size=(50, 3))
+    points = cdc.build_labeled_points(pos, crs=head.scalp.crs, units="1")
+
+    # reference: the original per-point search
+    v2v = head.voxel_to_vertex_scalp.tocsc()
+    shape = head.segmentation_masks.shape[1:]
+    scalp_voxels = np.argwhere(
+        head.segmentation_masks.sel(segmentation_type="scalp").values
+    )
+    _, vertex_indices = head.scalp.kdtree.query(pos)
+    expected = np.zeros_like(pos)
+    for i, iv in enumerate(vertex_indices):
+        a = vertices[iv]
+        voxel_idx = v2v[:, [iv]].nonzero()[0]
+        if len(voxel_idx) > 0:
+            voxels = np.column_stack(np.unravel_index(voxel_idx, shape))
+        else:
+            voxels = scalp_voxels
+        expected[i] = voxels[np.argmin(np.linalg.norm(voxels - a, axis=1))]
+
+    snapped = head.snap_to_scalp_voxels(points)
+    np.testing.assert_array_equal(snapped.pint.dequantify().values, expected)
+
+    # points in another coordinate system or with other units are rejected
+    with pytest.raises(ValueError, match="CRS mismatch"):
+        head.snap_to_scalp_voxels(
+            cdc.build_labeled_points(pos, crs="ras", units="1")
+        )
+    with pytest.raises(ValueError, match="units mismatch"):
+        head.snap_to_scalp_voxels(
+            cdc.build_labeled_points(pos, crs=head.scalp.crs, units="mm")
+        )
+
+
+def test_fluence_library(monkeypatch):
+    import pandas as pd
+
+    import cedalion.dataclasses as cdc
+    from cedalion.imagereco.fluence_library import FluenceLibrary
+
+    with tempfile.TemporaryDirectory() as dirpath:
+        mask_files = write_synthetic_segmentation(dirpath)
+        head = fw.TwoSurfaceHeadModel.from_segmentation(
+            segmentation_dir=dirpath,
+            mask_files=mask_files,
+            brain_seg_types=["gm", "wm"],
+            smoothing=0,
+            brain_face_count=None,
+            scalp_face_count=None,
+        )
+
+    vertices = head.scalp.mesh.vertices
+    vertices = vertices[vertices[:, 2] > 30]  # top of the head
+
+    def make_probe(indices, labels, types):
+        geo3d = cdc.build_labeled_points(
+            vertices[indices], crs="ijk", units="1", labels=labels, types=types
+        )
+        measurement_list = pd.DataFrame({"wavelength": [760.0, 850.0]})
+        return fw.ForwardModel(head, geo3d, measurement_list)
+
+    S, D = cdc.PointType.SOURCE, cdc.PointType.DETECTOR
+    fwm1 = make_probe([0, 10, 20], ["S1", "D1", "D2"], [S, D, D])
+    # the second probe shares S1 and D1 but places D2 elsewhere
+    fwm2 = make_probe([0, 10, 30], ["S1", "D1", "D2"], [S, D, D])
+
+    simulated = []
+
+    def fake_mcx(self, i_optode, nphoton):
+        simulated.append(self.optode_pos.label.values[i_optode])
+        fluence = np.zeros(self.volume.shape, dtype=np.float32)
+        i, j, k = self.optode_pos.values[i_optode].astype(int)
+        fluence[i, j, k] = 1.0
+        fluence[(self.volume > 0)] += 1e-3 * (i_optode + 1)
+        return fluence
+
+    monkeypatch.setattr(fw.ForwardModel, "_get_fluence_from_mcx", fake_mcx)
+
+    with tempfile.TemporaryDirectory() as dirpath:
+        library = FluenceLibrary(dirpath)
+
+        fluence_all1, _ = fwm1.compute_fluence_mcx(nphoton=1e3, fluence_library=library)
+        assert simulated == ["S1", "D1", "D2"]
+        assert len(library) == 3
+
+        fluence_all2, _ = fwm2.compute_fluence_mcx(nphoton=1e3, fluence_library=library)
+        assert simulated == ["S1", "D1", "D2", "D2"]
+        assert len(library) == 4
+
+        np.testing.assert_array_equal(
+            fluence_all1.sel(label=["S1", "D1"]).values,
+            fluence_all2.sel(label=["S1", "D1"]).values,
+        )
+
+        # a different photon count must not reuse any simulation
+        fwm1.compute_fluence_mcx(nphoton=1e4, fluence_library=library)
+        assert len(simulated) == 7
@@ -0,0 +1,84 @@
+import numpy as np
+import pytest
+import xarray as xr
+
+import cedalion.imagereco.forward_model as fw
+import cedalion.nirs
+from cedalion.imagereco.solver import pseudo_inverse_stacked
+from cedalion.imagereco.sparse import SparseAdot
+
+
+def create_Adot(wavelengths, nchannel=12, nvertex=150):
+    rng = np.random.default_rng(1)
+    return xr.DataArray(
+        rng.random((nchannel, nvertex, len(wavelengths))),
+        dims=["channel", "vertex", "wavelength"],
+        coords={
+            "channel": ("channel", [f"S{i}D1" for i in range(nchannel)]),
+            "wavelength": ("wavelength", wavelengths),
+            "is_brain": ("vertex", np.arange(nvertex) < 100),
+        },
+    )
+
+
+def expected_stacked(Adot):
+    ec = cedalion.nirs.get_extinction_coefficients("prahl", Adot.wavelength.values)
+    E = ec.pint.dequantify().transpose("chromo", "wavelength").values
+    A = np.einsum("kw,cvw->wckv", E, Adot.values)
+    nw, nc, nk, nv = A.shape
+    return A.reshape(nw * nc, nk * nv)
+
+
+def test_stacked_sensitivity_two_wavelengths():
+    Adot = create_Adot([760.0, 850.0])
+    A = fw.ForwardModel.compute_stacked_sensitivity(Adot)
+
+    ec = cedalion.nirs.get_extinction_coefficients("prahl", [760.0, 850.0])
+    ec = ec.pint.dequantify()
+    nchannel, nvertex = Adot.sizes["channel"], Adot.sizes["vertex"]
+    A_760 = Adot.sel(wavelength=760.0).values
+    A_850 = Adot.sel(wavelength=850.0).values
+
+    assert A.dims == ("flat_channel", "flat_vertex")
+    np.testing.assert_allclose(
+        A.values[:nchannel, :nvertex], ec.sel(chromo="HbO", wavelength=760.0).item() * A_760
+    )
+    np.testing.assert_allclose(
+        A.values[nchannel:, nvertex:], ec.sel(chromo="HbR", wavelength=850.0).item() * A_850
+    )
+
+
+@pytest.mark.parametrize("wavelengths", [[760.0, 850.0], [690.0, 760.0, 830.0, 850.0]])
+def test_stacked_sensitivity_operator(wavelengths):
+    Adot = create_Adot(wavelengths)
+    A = expected_stacked(Adot)
+
+    np.testing.assert_allclose(
+        fw.ForwardModel.compute_stacked_sensitivity(Adot).values, A
+    )
+
+    for sensitivity in [Adot, SparseAdot.from_dense(Adot, rtol=0.0)]:
+        op = fw.ForwardModel.stacked_sensitivity_operator(sensitivity)
+        assert op.shape == A.shape
+
+        rng = np.random.default_rng(2)
+        x = rng.random(A.shape[1])
+        X = rng.random((A.shape[1], 3))
+        y = rng.random(A.shape[0])
+
+        np.testing.assert_allclose(op @ x, A @ x)
+        np.testing.assert_allclose(op @ X, A @ X)
+        np.testing.assert_allclose(op.T @ y, A.T @ y)
+        np.testing.assert_allclose(op.gram(), A @ A.T)
+
+
+def test_pseudo_inverse_operator():
+    Adot = create_Adot([690.0, 760.0, 850.0])
+    A = fw.ForwardModel.compute_stacked_sensitivity(Adot)
+    op = fw.ForwardModel.stacked_sensitivity_operator(Adot)
+
+    B = pseudo_inverse_stacked(A)
+    B_op = pseudo_inverse_stacked(op)
+
+    assert B_op.dims == B.dims
+    np.testing.assert_allclose(B_op.values, B.values, atol=1e-8 * np.abs(B.values).max())
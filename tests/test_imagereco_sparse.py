@@ -0,0 +1,111 @@
+import numpy as np
+import pytest
+import xarray as xr
+
+import cedalion.imagereco.forward_model as fw
+import cedalion.sim.synthetic_hrf as syn
+from cedalion.imagereco.solver import pseudo_inverse_stacked
+from cedalion.imagereco.sparse import SparseAdot
+
+
+@pytest.fixture
+def Adot():
+    rng = np.random.default_rng(42)
+    nchannel, nvertex = 20, 400
+    # banana-like sensitivity: each channel is sensitive to a few vertices only
+    centers = rng.uniform(0, nvertex, nchannel)
+    vertex = np.arange(nvertex)
+    values = np.exp(-((vertex[None, :] - centers[:, None]) ** 2) / 200.0)
+    values = np.stack([values, 0.8 * values], axis=-1)
+
+    is_brain = np.zeros(nvertex, dtype=bool)
+    is_brain[:300] = True
+
+    return xr.DataArray(
+        values,
+        dims=["channel", "vertex", "wavelength"],
+        coords={
+            "channel": ("channel", [f"S{i}D1" for i in range(nchannel)]),
+            "wavelength": ("wavelength", [760.0, 850.0]),
+            "is_brain": ("vertex", is_brain),
+        },
+    )
+
+
+@pytest.mark.parametrize("rtol", [0.0, 1e-3, 0.05])
+def test_sparse_adot_error_bound(Adot, rtol):
+    sparse_Adot = SparseAdot.from_dense(Adot, rtol=rtol)
+
+    assert sparse_Adot.nnz < np.prod(Adot.shape) or rtol == 0.0
+
+    # per row the discarded L1 mass stays below rtol times the row's L1 norm
+    l1 = np.abs(Adot).sum("vertex").transpose("wavelength", "channel").values
+    assert np.all(sparse_Adot.dropped_l1 <= rtol * l1 + 1e-12)
+
+    rng = np.random.default_rng(0)
+    x = rng.uniform(-1, 1, Adot.sizes["vertex"])
+    error = np.abs(Adot.values.transpose(2, 0, 1) @ x - (
+        sparse_Adot.to_dense().values.transpose(2, 0, 1) @ x
+    ))
+    bound = sparse_Adot.error_bound(image_max=1.0).transpose("wavelength", "channel")
+    assert np.all(error <= bound.values + 1e-12)
+
+
+def test_sparse_adot_lossless(Adot):
+    sparse_Adot = SparseAdot.from_dense(Adot, rtol=0.0)
+    np.testing.assert_allclose(sparse_Adot.to_dense().values, Adot.values)
+
+
+def test_sparse_adot_from_row_generator(Adot):
+    values = Adot.transpose("wavelength", "channel", "vertex").values
+    consumed = []
+
+    def rows():
+        # rows are produced in arbitrary order and one at a time
+        for i_ch in range(Adot.sizes["channel"]):
+            for i_wl in range(Adot.sizes["wavelength"]):
+                consumed.append((i_wl, i_ch))
+                yield (i_wl, i_ch), values[i_wl, i_ch].copy()
+
+    sparse_Adot = SparseAdot.from_rows(
+        rows(), Adot.channel.values, Adot.wavelength.values, Adot.is_brain.values, 1e-3
+    )
+    expected = SparseAdot.from_dense(Adot, rtol=1e-3)
+
+    assert len(consumed) == Adot.sizes["channel"] * Adot.sizes["wavelength"]
+    np.testing.assert_allclose(sparse_Adot.matrix.toarray(), expected.matrix.toarray())
+    np.testing.assert_allclose(sparse_Adot.dropped_l1, expected.dropped_l1)
+
+
+def test_sparse_stacked_sensitivity(Adot):
+    sparse_Adot = SparseAdot.from_dense(Adot, rtol=0.0)
+
+    A = fw.ForwardModel.compute_stacked_sensitivity(Adot)
+    A_sparse = fw.ForwardModel.compute_stacked_sensitivity(sparse_Adot)
+
+    assert A_sparse.shape == A.shape
+    np.testing.assert_allclose(A_sparse.toarray(), A.values)
+
+    B = pseudo_inverse_stacked(A)
+    B_sparse = pseudo_inverse_stacked(A_sparse)
+    np.testing.assert_allclose(
+        B_sparse.values, B.values, atol=1e-8 * np.abs(B.values).max()
+    )
+
+
+def test_hrfs_from_image_reco_sparse(Adot):
+    time = np.linspace(0, 20, 201)
+    hrf_model = syn.generate_hrf(
+        xr.DataArray(time, dims=["time"], coords={"time": time})
+    )
+    blob = xr.DataArray(
+        np.random.random(int(Adot.is_brain.sum())), dims=["vertex"]
+    )
+
+    hrfs = syn.hrfs_from_image_reco(blob, hrf_model, Adot)
+    hrfs_sparse = syn.hrfs_from_image_reco(
+        blob, hrf_model, SparseAdot.from_dense(Adot, rtol=0.0)
+    )
+
+    assert hrfs_sparse.dims == hrfs.dims
+    np.testing.assert_allclose(hrfs_sparse.values, hrfs.values)
@@ -0,0 +1,30 @@
+import subprocess
+import sys
+
+import pytest
+
+HEAVY_MODULES = ["trimesh", "vtk", "pyvista", "mne", "h5py", "nibabel", "statsmodels"]
+
+
+@pytest.mark.parametrize("module", ["cedalion", "cedalion.models.glm"])
+def test_import_is_lazy(module):
+    code = (
+        f"import sys, {module}; "
+        f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code], check=True, capture_output=True, text=True
+    )
+    assert result.stdout.strip() == ""
+
+
+def test_lazy_attributes():
+    import cedalion
+    import cedalion.io
+
+    assert callable(cedalion.io.read_snirf)
+    assert callable(cedalion.nirs.int2od)
+    assert "read_snirf" in dir(cedalion.io)
+
+    with pytest.raises(AttributeError):
+        cedalion.io.does_not_exist
@@ -0,0 +1,52 @@
+import json
+
+import numpy as np
+
+import cedalion.instrumentation as instrumentation
+import cedalion.pipelines.modules.preproccessing as prep
+import cedalion.pipelines.pipeline as pipeline
+import cedalion.sigproc.tasks  # noqa: F401
+import cedalion.tasks
+import cedalion.testing.simData as simdata
+
+
+def test_profile_pipeline(tmp_path):
+    rec = simdata.ARnoise(rng=0)
+    job = pipeline.PipelineList([prep.intensity_opticaldensity, prep.mbll])
+
+    with instrumentation.profile() as prof:
+        job.run(rec)
+
+    df = prof.to_dataframe()
+    assert list(df.name) == [
+        "Calculate Optical Density",
+        "Calculate Modified Beer-Lambert",
+    ]
+    assert np.all(df.wall_time > 0)
+
+    od_event = prof.events[0]
+    nsamples = rec["amp"].sizes["time"]
+    assert od_event["inputs"]["0.amp"]["shape"][0] == nsamples
+    assert list(od_event["outputs"]) == ["0.od"]
+    assert od_event["bytes_copied"] == rec["od"].pint.dequantify().values.nbytes
+
+    prof.save_trace_events(tmp_path / "trace.json")
+    with open(tmp_path / "trace.json") as fin:
+        trace = json.load(fin)
+    assert len(trace["traceEvents"]) == 2
+    assert trace["traceEvents"][0]["ph"] == "X"
+
+
+def test_profile_task():
+    rec = simdata.ARnoise(rng=0)
+
+    cedalion.tasks.task_registry["int2od"](rec)  # not recorded
+
+    with instrumentation.profile() as prof:
+        cedalion.tasks.task_registry["int2od"](rec, ts_input="amp", ts_output="od2")
+
+    assert not instrumentation.is_active()
+    assert len(prof.events) == 1
+    assert prof.events[0]["kind"] == "task"
+    assert list(prof.events[0]["outputs"]) == ["0.od2"]
+    assert len(prof.summary()) == 1
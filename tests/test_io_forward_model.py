@@ -3,6 +3,7 @@ import numpy as np
 import xarray as xr
 import cedalion
 import cedalion.io as cio
+from cedalion.imagereco.sparse import SparseAdot
 
 def create_dummy_Adot():
     """Create a dummy Adot matrix for testing."""
@@ -48,3 +49,19 @@ def test_load_Adot():
     assert np.all(Adot.wavelength.values == Adot2.wavelength.values)
 
 
+
+def test_save_load_sparse_Adot():
+    Adot = create_dummy_Adot()
+    sparse_Adot = SparseAdot.from_dense(Adot, rtol=0.1)
+    dirpath = tempfile.mkdtemp()
+    tmp_fn = os.path.join(dirpath, "test_sparse_Adot.nc")
+    cio.save_Adot(tmp_fn, sparse_Adot)
+    sparse_Adot2 = cio.load_Adot(tmp_fn)
+
+    assert isinstance(sparse_Adot2, SparseAdot)
+    assert (sparse_Adot.matrix != sparse_Adot2.matrix).nnz == 0
+    assert np.all(sparse_Adot.channel == sparse_Adot2.channel)
+    assert np.all(sparse_Adot.wavelength == sparse_Adot2.wavelength)
+    assert np.all(sparse_Adot.is_brain == sparse_Adot2.is_brain)
+    assert np.all(sparse_Adot.dropped_l1 == sparse_Adot2.dropped_l1)
+    assert sparse_Adot.rtol == sparse_Adot2.rtol
@@ -1,7 +1,11 @@
+import numpy as np
+import pint
 import pytest
+import xarray as xr
 
 import cedalion.nirs
-import pint
+import cedalion.testing.simData as simData
+import cedalion.xrutils
 
 
 def test_get_extinction_coefficients_notexistant():
@@ -20,3 +24,32 @@ def test_get_extinction_coefficients_prahl():
     assert E.pint.units == pint.Unit("mm^-1 / M")
 
     assert (E.wavelength.values == wavelengths).all()
+
+
+def test_mbll_operator_roundtrip_and_blocks():
+    rec = simData.ARnoise(t=np.arange(500) * 0.1, rng=0)
+    od = cedalion.nirs.int2od(rec["amp"])
+    dpf = xr.DataArray(
+        [6.0, 5.5], dims="wavelength", coords={"wavelength": od.wavelength}
+    )
+
+    conc = cedalion.nirs.od2conc(od, rec.geo3d, dpf)
+    assert conc.dims == ("chromo", "time", "channel")
+    assert conc.pint.units == pint.Unit("micromolar")
+    assert conc.time.attrs == od.time.attrs
+
+    od2 = cedalion.nirs.conc2od(conc, rec.geo3d, dpf)
+    assert np.allclose(od2.transpose(*od.dims).values, od.pint.dequantify().values)
+
+    # the operator is cached and gives the same results for consecutive blocks
+    op = cedalion.nirs.MBLLOperator.for_probe(od, rec.geo3d, dpf)
+    assert cedalion.nirs.MBLLOperator.for_probe(od, rec.geo3d, dpf) is op
+    blocks = [op.od2conc(od.isel(time=slice(i, i + 100))) for i in range(0, 500, 100)]
+    assert np.allclose(xr.concat(blocks, dim="time").values, conc.values)
+
+    # compare with the explicit product E^-1 @ (od / (dists * dpf))
+    E = cedalion.nirs.get_extinction_coefficients("prahl", od.wavelength)
+    dists = cedalion.nirs.channel_distances(od, rec.geo3d).pint.to("mm")
+    expected = xr.dot(cedalion.xrutils.pinv(E), od / (dists * dpf), dims="wavelength")
+    expected = expected.pint.to("micromolar").transpose(*conc.dims)
+    assert np.allclose(conc.pint.dequantify(), expected.pint.dequantify())
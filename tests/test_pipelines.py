@@ -0,0 +1,157 @@
+import copy
+
+import numpy as np
+import pytest
+
+import cedalion.pipelines.modules.glm as stats
+import cedalion.pipelines.modules.preproccessing as prep
+import cedalion.pipelines.pipeline as pipeline
+import cedalion.testing.simData as simdata
+import cedalion.testing.simEvents as simEvents
+
+
+class scale(pipeline.cedalion_module):
+    calls = 0
+
+    def __init__(self, previous_job=None):
+        self.name = "Scale"
+        self._cite = None
+        self.options = {"factor": 2}
+        self.inputName = "amp"
+        self.outputName = "amp"
+
+        self.previous_job = previous_job
+
+    def _runlocal(self, rec):
+        scale.calls += 1
+        rec[self.outputName] = rec[self.inputName] * self.options["factor"]
+        return rec
+
+
+class offset(scale):
+    calls = 0
+
+    def __init__(self, previous_job=None):
+        super().__init__(previous_job)
+        self.name = "Offset"
+        self.options = {"offset": 0}
+
+    def _runlocal(self, rec):
+        offset.calls += 1
+        ts = rec[self.inputName]
+        rec[self.outputName] = ts + self.options["offset"] * ts.pint.units
+        return rec
+
+
+def test_cached_pipeline(tmp_path):
+    rec = simdata.ARnoise(rng=0)
+    job = pipeline.PipelineList([scale, offset])
+    expected = job.run(copy.deepcopy(rec))["amp"]
+
+    cache = job.enable_cache(pipeline.StepCache(directory=str(tmp_path)))
+    scale.calls = offset.calls = 0
+
+    result = job.run(rec)
+    assert (scale.calls, offset.calls) == (1, 1)
+    assert np.allclose(result["amp"].values, expected.values)
+
+    # identical input and options: nothing is recomputed
+    job.run(rec)
+    assert (scale.calls, offset.calls) == (1, 1)
+
+    # changing the last step's options only reruns the last step
+    job.set_all_options({"offset": 1})
+    job.run(rec)
+    assert (scale.calls, offset.calls) == (1, 2)
+
+    # a new in-memory cache picks up the results stored on disk
+    job.enable_cache(pipeline.StepCache(directory=str(tmp_path)))
+    job.run(rec)
+    assert (scale.calls, offset.calls) == (1, 2)
+
+    # different input data invalidates all steps
+    job.run(simdata.ARnoise(rng=1))
+    assert (scale.calls, offset.calls) == (2, 3)
+
+    cache.clear()
+    assert not list(tmp_path.iterdir())
+
+
+def test_step_cache_lru():
+    cache = pipeline.StepCache(maxsize=2)
+    for key in "abc":
+        cache.put(key, key)
+
+    assert cache.get("a") is None
+    assert cache.get("b") == "b"
+    cache.put("d", "d")
+    assert cache.get("c") is None
+    assert cache.get("b") == "b"
+
+
+def test_step_cache_disk(tmp_path):
+    cache = pipeline.StepCache(directory=str(tmp_path))
+    cache.put("a", "a")
+
+    # only the complete pickle is left behind
+    assert [f.name for f in tmp_path.iterdir()] == ["a.pkl"]
+    assert pipeline.StepCache(directory=str(tmp_path)).get("a") == "a"
+
+
+def test_cached_glm_pipeline():
+    rec, _ = simdata.Data_fast(
+        simdata.ARnoise(rng=0), simEvents.rand_stim_design(rng=0), snr=5
+    )
+    job = pipeline.PipelineList([prep.intensity_opticaldensity, prep.mbll, stats.GLM])
+    job.set_all_options({"verbose": False})
+    job.enable_cache()
+
+    stats1 = job.run(rec)["stats"]
+    job.set_all_options({"drift_order": 1})
+    stats2 = job.run(rec)["stats"]
+
+    assert "conc" in job.run(rec).timeseries
+    assert not np.allclose(stats1.pvalue["HRF A"], stats2.pvalue["HRF A"])
+
+
+def test_hash_callable_options():
+    def key(options):
+        job = scale()
+        job.options = options
+        return job.step_key("")
+
+    assert key({"f": lambda a: a}) != key({"f": lambda a: 2 * a})
+    assert key({"f": lambda a: a}) == key({"f": lambda a: a})
+
+    def make(factor):
+        return lambda a: factor * a
+
+    assert key({"f": make(1)}) != key({"f": make(2)})
+    assert key({"f": np.mean}) != key({"f": np.median})
+
+
+def test_unhashable_options_are_not_cached():
+    rec = simdata.ARnoise(rng=0)
+    job = pipeline.PipelineList([scale, offset])
+    job.options["unhashable"] = iter([])
+    cache = job.enable_cache()
+    scale.calls = offset.calls = 0
+
+    job.run(rec)
+    job.run(rec)
+    # scale is cached, offset has an option that cannot be hashed by content
+    assert (scale.calls, offset.calls) == (1, 2)
+    assert len(cache._entries) == 1
+
+
+def test_self_referencing_options_are_not_hashed():
+    class Node:
+        pass
+
+    node = Node()
+    node.parent = node
+    job = scale()
+    job.options = {"node": node}
+
+    with pytest.raises(TypeError):
+        job.step_key("")
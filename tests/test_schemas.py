@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+
+import cedalion.dataclasses as cdc
+import cedalion.typing as cdt
+from cedalion.dataclasses.schemas import ValidationError
+
+
+@cdc.validate_schemas
+def identity(ts: cdt.NDTimeSeries, scale: float = 1.0, *, other: cdt.NDTimeSeries):
+    return ts
+
+
+@pytest.fixture
+def ts():
+    return cdc.build_timeseries(
+        np.zeros((3, 10)),
+        dims=["channel", "time"],
+        time=np.arange(10),
+        channel=["S1D1", "S1D2", "S2D1"],
+        value_units="V",
+        time_units="s",
+    )
+
+
+def test_validate_schemas(ts):
+    assert identity(ts, other=ts) is ts
+    assert identity(ts=ts, other=ts) is ts
+
+    with pytest.raises(ValidationError, match="dimension 'channel'"):
+        identity(ts.rename(channel="chan"), other=ts)
+
+    with pytest.raises(ValidationError, match="coordinate 'samples'"):
+        identity(ts, other=ts.drop_vars("samples"))
+
+    with pytest.raises(ValidationError, match="not a xr.DataArray"):
+        identity(ts.values, other=ts)
+
+    with pytest.raises(TypeError):
+        identity(ts)
+
+
+def test_validation_disabled(ts):
+    invalid = ts.drop_vars("samples")
+
+    with cdc.validation_disabled():
+        assert identity(invalid, other=invalid) is invalid
+
+    with pytest.raises(ValidationError):
+        identity(invalid, other=invalid)
+
+    cdc.set_validation_enabled(False)
+    try:
+        assert identity(invalid, other=invalid) is invalid
+    finally:
+        cdc.set_validation_enabled(True)
@@ -1 +1,83 @@
+import numpy as np
+import pytest
+
 from cedalion.sigdecomp import ERBM, ICA_EBM
+
+
+def test_ppval():
+    nf = ICA_EBM.load_measfunc_table()
+    for i in [0, 2, 4, 6]:
+        for pp in [nf[i]["pp"], nf[i]["pp_slope"]]:
+            b = pp["breaks"][0]
+            xs = np.linspace(b[0] - 0.1, b[-1] + 0.1, 201)
+            expected = [ICA_EBM.simplified_ppval(pp, x) for x in xs]
+            np.testing.assert_allclose(ICA_EBM.ppval(pp, xs), expected)
+
+
+def test_ICA_EBM_separates_sources():
+    rng = np.random.default_rng(0)
+    T = 2000
+    S = np.vstack(
+        [rng.laplace(size=T), rng.uniform(-1, 1, T), np.sign(rng.normal(size=T))]
+    )
+    A = rng.normal(size=(3, 3))
+
+    np.random.seed(0)
+    W = ICA_EBM.ICA_EBM(A @ S)
+
+    # each estimated component correlates with exactly one source
+    C = np.abs(np.corrcoef(W @ A @ S, S)[:3, 3:])
+    assert np.all(np.sort(C, axis=1)[:, -1] > 0.95)
+    assert np.all(np.sort(C, axis=1)[:, -2] < 0.2)
+
+
+def test_lagged_covariances():
+    import scipy.signal
+
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(4, 200))
+    a = rng.normal(size=5)
+
+    S = ERBM.lagged_covariances(X, 5)
+    Z = scipy.signal.lfilter(a, 1, X, axis=1)
+    np.testing.assert_allclose(np.einsum("k,l,klij->ij", a, a, S), Z @ Z.T)
+
+    g = rng.normal(size=(1, 200))
+    np.testing.assert_allclose(ERBM.filtered_dot(X, a, g), Z @ g.T)
+
+
+def test_ERBM_separates_sources():
+    import scipy.signal
+
+    rng = np.random.default_rng(0)
+    T = 1000
+    S = np.vstack(
+        [
+            scipy.signal.lfilter([1], [1, -0.5], rng.laplace(size=T)),
+            scipy.signal.lfilter([1], [1, 0.3], rng.uniform(-1, 1, T)),
+            rng.laplace(size=T),
+        ]
+    )
+    A = rng.normal(size=(3, 3))
+
+    for method in ERBM.ERBM_METHODS:
+        np.random.seed(0)
+        W = ERBM.ERBM(A @ S, p=4, max_jobs=2, method=method)
+
+        C = np.abs(np.corrcoef(W @ A @ S, S)[:3, 3:])
+        assert np.all(np.sort(C, axis=1)[:, -1] > 0.95)
+
+    with pytest.raises(ValueError):
+        ERBM.ERBM(A @ S, p=4, method="unknown")
+
+
+def test_estimate_filters_raises_worker_errors(monkeypatch):
+    def failing_lfc(*args, **kwargs):
+        raise RuntimeError("lfc failed")
+
+    monkeypatch.setattr(ERBM, "lfc", failing_lfc)
+    Y = np.random.default_rng(0).normal(size=(3, 200))
+    a = np.zeros((4, 3))
+
+    with pytest.raises(RuntimeError, match="lfc failed"):
+        ERBM.estimate_filters(Y, 4, a, full=False, max_jobs=2)
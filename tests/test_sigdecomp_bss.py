@@ -0,0 +1,98 @@
+import os
+import tempfile
+
+import numpy as np
+import pytest
+
+from cedalion.dataclasses import build_timeseries
+import cedalion.sigdecomp.bss as bss
+
+
+@pytest.fixture
+def mixed_timeseries():
+    rng = np.random.default_rng(0)
+    fs = 10.0
+    t = np.arange(3000) / fs
+
+    # three sources: a cardiac oscillation, a systemic signal that is also seen by
+    # a short channel, and a neuronal-like signal
+    cardiac = np.sign(np.sin(2 * np.pi * 1.1 * t)) + 0.1 * rng.laplace(size=len(t))
+    systemic = np.cumsum(rng.laplace(size=len(t)))
+    systemic = (systemic - systemic.mean()) / systemic.std()
+    neuronal = rng.uniform(-1, 1, len(t))
+    S = np.vstack([cardiac, systemic, neuronal])
+
+    A = rng.normal(size=(3, 2, 3))  # (channel, wavelength, source)
+    data = np.einsum("cws,st->cwt", A, S) + 0.01 * rng.normal(size=(3, 2, len(t)))
+    # keep 6 observations for 3 sources: add a weak independent component per row
+    data += 0.05 * rng.laplace(size=data.shape)
+
+    ts = build_timeseries(
+        data,
+        dims=["channel", "wavelength", "time"],
+        time=t,
+        channel=["S1D1", "S1D2", "S2D1"],
+        value_units="1",
+        time_units="s",
+        other_coords={"wavelength": [760.0, 850.0]},
+    )
+
+    ts_short = build_timeseries(
+        (systemic + 0.1 * rng.normal(size=len(t)))[None, :],
+        dims=["channel", "time"],
+        time=t,
+        channel=["S1D9"],
+        value_units="1",
+        time_units="s",
+    )
+
+    return ts, ts_short, S
+
+
+def test_unmixing_model(mixed_timeseries):
+    ts, ts_short, S = mixed_timeseries
+
+    np.random.seed(0)
+    model = bss.fit_unmixing(ts, decimate=2)
+    assert model.demixing.dims == ("component", "channel", "wavelength")
+    assert model.demixing.shape == (6, 3, 2)
+    assert not model.rejected.any()
+
+    # without rejected components the series is reconstructed
+    np.testing.assert_allclose(
+        model.apply(ts).pint.dequantify().values,
+        ts.pint.dequantify().values,
+        atol=1e-8,
+    )
+
+    scores = bss.score_components(model, ts, ts_short)
+    model = bss.reject_components(model, scores)
+
+    sources = model.sources(ts).values
+    corr = np.abs(np.corrcoef(sources, S)[:6, 6:])
+    rejected = model.rejected.values
+    # the cardiac and the systemic components were identified
+    assert corr[rejected, 0].max() > 0.9
+    assert corr[rejected, 1].max() > 0.9
+    assert corr[rejected, 2].max() < 0.2
+
+    cleaned = model.apply(ts)
+    assert cleaned.dims == ts.dims
+    assert cleaned.pint.units == ts.pint.units
+
+    # cleaning consecutive blocks gives the same result
+    blocks = [model.apply(ts.isel(time=slice(i, i + 500))) for i in range(0, 3000, 500)]
+    np.testing.assert_allclose(
+        np.concatenate([b.pint.dequantify().values for b in blocks], axis=-1),
+        cleaned.pint.dequantify().values,
+    )
+
+    with tempfile.TemporaryDirectory() as dirpath:
+        fn = os.path.join(dirpath, "model.nc")
+        model.save(fn)
+        model2 = bss.UnmixingModel.load(fn)
+
+    np.testing.assert_array_equal(model2.rejected.values, model.rejected.values)
+    np.testing.assert_allclose(
+        model2.apply(ts).pint.dequantify().values, cleaned.pint.dequantify().values
+    )
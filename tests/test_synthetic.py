@@ -4,6 +4,7 @@ import pandas as pd
 import xarray as xr
 import cedalion
 import cedalion.datasets
+import cedalion.imagereco.forward_model as cfm
 from cedalion import units
 import cedalion.sim.synthetic_hrf as syn
 
@@ -116,6 +117,40 @@ def test_hrfs_from_image_reco(head_model, od, time_axis_hrf):
     assert "time" in hrfs.dims
 
 
+def test_hrf_simulator(time_axis_hrf):
+    n_brain, n_scalp, n_channels = 50, 20, 4
+    is_brain = np.r_[np.ones(n_brain, dtype=bool), np.zeros(n_scalp, dtype=bool)]
+    Adot = xr.DataArray(
+        np.random.random((n_channels, n_brain + n_scalp, 2)),
+        dims=["channel", "vertex", "wavelength"],
+        coords={
+            "channel": np.arange(n_channels),
+            "wavelength": [760.0, 850.0],
+            "is_brain": ("vertex", is_brain),
+        },
+    )
+    blobs = xr.DataArray(np.random.random((3, n_brain)), dims=["blob", "vertex"])
+    hrf_model = syn.generate_hrf(time_axis_hrf)
+    hrf_models = xr.concat([hrf_model, 2 * hrf_model], dim="trial_type")
+
+    simulator = syn.HRFSimulator.for_adot(Adot)
+    assert syn.HRFSimulator.for_adot(Adot) is simulator
+
+    hrfs = simulator.hrfs(blobs, hrf_models)
+    assert hrfs.dims == ("blob", "trial_type", "channel", "wavelength", "time")
+
+    # compare to the dense HRF image
+    Adot_stacked = cfm.ForwardModel.compute_stacked_sensitivity(Adot)
+    is_brain_stacked = np.r_[is_brain, is_brain]
+    for i_blob in range(3):
+        image = syn.add_hrf_to_vertices(hrf_model, n_brain, scale=blobs[i_blob])
+        expected = Adot_stacked.values[:, is_brain_stacked] @ image.values.T
+        expected = expected.reshape(2, n_channels, -1).transpose(1, 0, 2)
+
+        assert np.allclose(hrfs.isel(blob=i_blob, trial_type=0).values, expected)
+        assert np.allclose(hrfs.isel(blob=i_blob, trial_type=1).values, 2 * expected)
+
+
 def test_add_hrf_to_vertices():
     num_vertices = 100
     time_axis = xr.DataArray(
@@ -0,0 +1,32 @@
+import numpy as np
+
+import cedalion.testing.channelROC as roc
+
+
+def test_roc_curve():
+    rng = np.random.default_rng(0)
+    truth = rng.random(200) < 0.5
+    pval = np.where(truth, rng.random(200) * 0.5, rng.random(200))
+
+    tp, fp, th = roc.roc_curve(truth, pval)
+
+    assert np.all(np.diff(th) >= 0)
+    assert tp[-1] == 1.0 and fp[-1] == 1.0
+    for i in [0, 50, 199]:
+        assert tp[i] == np.mean(pval[truth] <= th[i])
+        assert fp[i] == np.mean(pval[~truth] <= th[i])
+
+    # the AUC equals the probability that a positive has a smaller p-value
+    expected = np.mean(pval[truth][:, None] < pval[~truth][None, :])
+    assert np.isclose(roc.auc(tp, fp), expected)
+
+
+def test_roc_curve_ignores_nan():
+    truth = np.array([1.0, 0.0, np.nan, 1.0])
+    pval = np.array([0.1, 0.5, 0.0, 0.2])
+
+    tp, fp, th = roc.roc_curve(truth, pval)
+
+    assert np.array_equal(th, [0.1, 0.2, 0.5])
+    assert np.array_equal(tp, [0.5, 1.0, 1.0])
+    assert np.array_equal(fp, [0.0, 0.0, 1.0])
@@ -0,0 +1,128 @@
+import copy
+
+import numpy as np
+import pytest
+import scipy.signal
+import xarray as xr
+
+import cedalion.math.ar_model
+import cedalion.testing.simData as simdata
+import cedalion.testing.simEvents as simEvents
+
+
+@pytest.mark.parametrize("ncols", [8, 300])
+def test_ar_filter(ncols):
+    rng = np.random.default_rng(0)
+    e = rng.standard_normal((500, ncols))
+    a = simdata.randAR(10, size=ncols, rng=rng)
+
+    y = simdata._ar_filter(e, a)
+
+    for i in [0, ncols - 1]:
+        expected = scipy.signal.lfilter(np.ones(11), np.append(1, -a[i]), e[:, i])
+        assert np.allclose(y[:, i], expected)
+
+
+def test_ARnoise_seed():
+    rec1 = simdata.ARnoise(rng=1)
+    rec2 = simdata.ARnoise(rng=1)
+    rec3 = simdata.ARnoise(rng=2)
+
+    assert rec1["amp"].dims == ("time", "channel", "wavelength")
+    assert np.array_equal(rec1["amp"].values, rec2["amp"].values)
+    assert not np.array_equal(rec1["amp"].values, rec3["amp"].values)
+
+
+def test_ARnoise_batch():
+    data = simdata.ARnoise_batch(
+        num_realizations=5, nsamples=200, numchannels=4, numwavelengths=2, rng=0
+    )
+
+    assert data.shape == (5, 200, 4, 2)
+    assert np.all(data > 0)
+    # realizations are independent
+    assert not np.allclose(data[0], data[1])
+
+
+def test_innovation_std():
+    rng = np.random.default_rng(0)
+    e = 2 * rng.standard_normal((5000, 3, 2))
+    x = scipy.signal.lfilter([1], [1, -0.6, 0.2], e, axis=0)
+
+    std = cedalion.math.ar_model.innovation_std(x, pmax=10)
+
+    assert std.shape == (3, 2)
+    assert np.allclose(std, 2, rtol=0.05)
+
+
+def test_Data_fast(monkeypatch):
+    noise = simdata.ARnoise(rng=0)
+    stim = simEvents.rand_stim_design(rng=0)
+    channels = np.zeros((16, 2))
+    channels[::2] = 1
+
+    rec_slow, truth_slow = simdata.Data(
+        copy.deepcopy(noise), stim.copy(), snr=5, channels=channels.copy()
+    )
+
+    # use the same innovation estimate as Data()
+    def ar_filter_std(conc, pmax):
+        conc = xr.DataArray(conc, dims=["time", "channel", "chromo"])
+        innovations = cedalion.math.ar_model.ar_filter(
+            conc.pint.quantify("micromolar"), pmax
+        )
+        return innovations.pint.dequantify().std("time").values
+
+    monkeypatch.setattr(cedalion.math.ar_model, "innovation_std", ar_filter_std)
+    rec_fast, truth_fast = simdata.Data_fast(
+        copy.deepcopy(noise), stim.copy(), snr=5, channels=channels.copy()
+    )
+
+    assert truth_fast.equals(truth_slow)
+    amp_slow = rec_slow["amp"].transpose("time", "channel", "wavelength")
+    amp_fast = rec_fast["amp"]
+    assert np.allclose(amp_fast.pint.dequantify(), amp_slow.pint.dequantify())
+
+
+def test_simMotionArtifact():
+    amp = simdata.ARnoise(t=np.arange(6000) * 0.1, rng=0)["amp"]
+
+    art1 = simdata.simMotionArtifact(amp, rng=1)
+    art2 = simdata.simMotionArtifact(amp, rng=1)
+
+    assert art1.dims == ("time", "channel", "wavelength")
+    assert art1.pint.units == amp.pint.units
+    assert np.array_equal(art1.values, art2.values)
+    assert np.all(art1.pint.dequantify() > 0)
+    assert not np.allclose(art1.values, amp.transpose(*art1.dims).values)
+
+
+def test_simMotionArtifact_default_rng():
+    amp = simdata.ARnoise(t=np.arange(600) * 0.1, rng=0)["amp"]
+
+    # without rng numpy's global random state is used
+    np.random.seed(0)
+    art1 = simdata.simMotionArtifact(amp)
+    np.random.seed(0)
+    art2 = simdata.simMotionArtifact(amp)
+    assert np.array_equal(art1.values, art2.values)
+
+    data = amp.transpose("time", "channel", "wavelength").values[None]
+    art = simdata.simMotionArtifact_batch(data, amp.time.values)
+    assert art.shape == data.shape
+
+
+def test_simMotionArtifact_mask():
+    t = np.arange(6000) * 0.1
+    data = 1 + 0.01 * np.random.default_rng(0).standard_normal((1, len(t), 4, 2))
+    mask = np.zeros(len(t), dtype=bool)
+    mask[3000:] = True
+
+    art = simdata.simMotionArtifact_batch(
+        data, t, spikes_per_minute=0, shifts_per_minute=5, motionMask=mask, rng=0
+    )
+
+    # before the first allowed sample the data only differ by a constant offset
+    diff = art - data
+    assert np.allclose(diff[0, :3000], diff[0, 0])
+    assert not np.allclose(diff[0, 3000:], diff[0, 0])
@@ -28,3 +28,33 @@ def test_pinv():
     # matrix product of DataArrays contracts over
     # both dimensions:
     assert Ainv @ A == pytest.approx(2.0)
+
+
+def test_strip_restore_units():
+    A = xr.DataArray(
+        np.arange(6.0).reshape(2, 3),
+        dims=["x", "time"],
+        coords={"time": [0.0, 1.0, 2.0]},
+    )
+    A = A.pint.quantify("mV")
+    A = A.pint.quantify({"time": "s"})
+
+    stripped, units = xrutils.strip_units(A)
+
+    assert units == pint.Unit("mV")
+    assert stripped.pint.units is None
+    assert np.shares_memory(stripped.values, A.data.magnitude)
+    assert stripped.time.attrs == A.time.attrs
+
+    restored = xrutils.restore_units(stripped, units)
+    assert restored.pint.units == pint.Unit("mV")
+    assert np.shares_memory(restored.data.magnitude, A.data.magnitude)
+    xr.testing.assert_identical(restored.pint.dequantify(), A.pint.dequantify())
+
+    # unitless arrays pass through
+    assert xrutils.strip_units(stripped) == (stripped, None)
+    assert xrutils.restore_units(stripped, None) is stripped
+
+    result = xrutils.apply_unitless(A, lambda a: a * 2, lambda a: a + 1)
+    assert result.pint.units == pint.Unit("mV")
+    assert np.allclose(result.pint.dequantify(), 2 * np.arange(6).reshape(2, 3) + 1)